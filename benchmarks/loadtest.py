@@ -0,0 +1,377 @@
+import sys
+import json
+import time
+import shutil
+import socket
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from bisect import bisect_left
+from datetime import date, datetime, timezone
+from pathlib import Path
+import httpx
+import numpy as np
+from metrics import LATENCY_BUCKETS_SECONDS
+from benchmarks.payloads import generate_payloads, TAGS
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+NUDGES_PATH = "/generate-social-nudges"
+TAGS_PATH = "/update-popular-tags"
+HEALTH_PATH = "/health"
+
+# Short names for --mix
+ENDPOINTS = {"nudges": NUDGES_PATH, "tags": TAGS_PATH, "health": HEALTH_PATH}
+
+# Share of requests per endpoint
+DEFAULT_MIX = {"nudges": 90, "tags": 2, "health": 8}
+
+# (min buddies, max buddies, share of users): mostly small circles with a long tail of large ones
+DEFAULT_BUDDY_BUCKETS = ((0, 2, 25), (3, 10, 55), (11, 40, 15), (41, 150, 5))
+
+# Extra tags followed by tag-heavy users, on top of every tag in benchmarks/payloads.py
+EXTRA_TAGS = [f"topic-{number}" for number in range(60)]
+
+# A request sent this much after its slot in the schedule counts as late: the client or the service fell behind the rate
+LATE_AFTER_SECONDS = 0.01
+
+# Fewer successful responses than this make p99 little more than the slowest one, so it is not compared
+MIN_P99_SAMPLES = 100
+
+# Settings a run must share with the baseline for the comparison to mean anything
+SCENARIO_KEYS = ("model", "rate", "concurrency", "users", "seed", "mix", "buddy_buckets", "cooldown_rate", "tag_heavy_rate")
+
+# Seeded /generate-social-nudges bodies for users distinct user ids. Buddy counts are drawn per bucket of buddy_buckets,
+# cooldown_rate of the users are inside both cooldown windows (so the cooldown check answers them before any scoring),
+# and tag_heavy_rate of them follow 20 to 60 tags.
+def build_user_payloads(users, seed=0, buddy_buckets=DEFAULT_BUDDY_BUCKETS, cooldown_rate=0.2, tag_heavy_rate=0.1, today=None):
+    rng = random.Random(seed)
+    today = today or date.today()
+    total_share = sum(share for _, _, share in buddy_buckets)
+    payloads = []
+    cumulative = 0
+    for number, (low, high, share) in enumerate(buddy_buckets):
+        cumulative += share
+        count = round(users * cumulative / total_share) - len(payloads)
+        payloads.extend(generate_payloads(count, seed=seed * 1000 + number, buddies=(low, high), today=today))
+    rng.shuffle(payloads)
+    for number, payload in enumerate(payloads):
+        payload["user_id"] = f"load_{seed}_{number}"
+        if rng.random() < cooldown_rate:
+            payload["history"] = {"last_compliment_generated": today.isoformat(), "last_buddy_nudge": today.isoformat()}
+        if rng.random() < tag_heavy_rate:
+            payload["social_metrics"]["tags_followed"] = TAGS + rng.sample(EXTRA_TAGS, rng.randint(10, 50))
+    return payloads
+
+def build_tag_updates(count, seed=0):
+    rng = random.Random(seed)
+    return [{"popular_tags": {tag: rng.randint(1, 10) for tag in rng.sample(TAGS, 5)}} for _ in range(count)]
+
+# Endless (path, body) pairs: the endpoint is drawn by mix, users are cycled in order so each comes back
+# once per pass, as a user polling for nudges would. Bodies are encoded once up front.
+def request_stream(mix, payloads, tag_updates, seed=0):
+    rng = random.Random(seed)
+    paths = [ENDPOINTS[name] for name in mix]
+    weights = list(mix.values())
+    bodies = {
+        NUDGES_PATH: [json.dumps(payload).encode() for payload in payloads],
+        TAGS_PATH: [json.dumps(update).encode() for update in tag_updates],
+    }
+    positions = {path: 0 for path in bodies}
+    while True:
+        path = rng.choices(paths, weights)[0]
+        if path not in bodies:
+            yield path, None
+            continue
+        yield path, bodies[path][positions[path] % len(bodies[path])]
+        positions[path] += 1
+
+# Latencies of successful responses, and errors by status, per endpoint. Responses of 400 and above and
+# transport errors (reported by exception name) are errors and are left out of the latencies.
+class LatencyRecorder:
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.late = 0
+
+    def record(self, path, seconds, status):
+        statuses = self.statuses.setdefault(path, {})
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        if isinstance(status, int) and status < 400:
+            self.latencies.setdefault(path, []).append(seconds)
+
+    def summary(self, seconds):
+        endpoints = {path: summarize(self.latencies.get(path, []), statuses, seconds) for path, statuses in sorted(self.statuses.items())}
+        statuses = {}
+        for endpoint_statuses in self.statuses.values():
+            for status, count in endpoint_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+        latencies = [value for values in self.latencies.values() for value in values]
+        return {"overall": summarize(latencies, statuses, seconds), "endpoints": endpoints, "late_requests": self.late}
+
+# Request counts, error rate, throughput, percentiles in milliseconds and a latency histogram over
+# LATENCY_BUCKETS_SECONDS (counts per bucket, the last one open-ended)
+def summarize(latencies, statuses, seconds):
+    requests = sum(statuses.values())
+    errors = requests - len(latencies)
+    values = np.array(latencies) * 1000
+    counts = [0] * (len(LATENCY_BUCKETS_SECONDS) + 1)
+    for value in latencies:
+        counts[bisect_left(LATENCY_BUCKETS_SECONDS, value)] += 1
+
+    def percentile(q):
+        return round(float(np.percentile(values, q)), 3) if values.size else None
+
+    return {
+        "requests": requests,
+        "errors": errors,
+        "error_rate": round(errors / requests, 6) if requests else 0.0,
+        "throughput_rps": round(requests / seconds, 2) if seconds else 0.0,
+        "statuses": dict(sorted(statuses.items())),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": round(float(values.max()), 3) if values.size else None,
+        "histogram": {"le_ms": [round(float(bound) * 1000, 3) for bound in LATENCY_BUCKETS_SECONDS] + ["inf"], "counts": counts},
+    }
+
+# Closed loop: concurrency clients each send a request, wait for the answer and take the next slot of a schedule
+# spaced 1/rate apart (rate 0 sends back to back). When all clients are busy the schedule slips instead of
+# queueing more requests, and the slipped requests are counted as late. Only requests sent after warmup seconds
+# are recorded, for duration seconds.
+async def run_load(base_url, requests, rate, concurrency, duration, warmup=0.0, timeout=10.0, transport=None):
+    loop = asyncio.get_running_loop()
+    recorder = LatencyRecorder()
+    interval = 1.0 / rate if rate > 0 else 0.0
+    started = loop.time()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+    slot = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits, transport=transport) as client:
+        async def client_loop():
+            nonlocal slot
+            while True:
+                due = started + slot * interval
+                slot += 1
+                now = loop.time()
+                if max(due, now) >= stop_at:
+                    return
+                if due > now:
+                    await asyncio.sleep(due - now)
+                path, body = next(requests)
+                sent = loop.time()
+                try:
+                    if body is None:
+                        response = await client.get(path)
+                    else:
+                        response = await client.post(path, content=body, headers={"content-type": "application/json"})
+                    status = response.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                if sent >= measure_from:
+                    recorder.record(path, loop.time() - sent, status)
+                    if interval and sent - due > LATE_AFTER_SECONDS:
+                        recorder.late += 1
+
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return recorder.summary(duration)
+
+# Reasons the result regressed against baseline: p99 (overall and per endpoint, where both runs have MIN_P99_SAMPLES
+# successful responses) above the baseline's by more than p99_tolerance, throughput below it by more than
+# throughput_tolerance, an error rate above max_error_rate, or a scenario that differs from the one the baseline
+# was recorded with. Empty when the run passes.
+def compare_to_baseline(result, baseline, p99_tolerance=0.2, throughput_tolerance=0.1, max_error_rate=0.01):
+    failures = []
+    for key in SCENARIO_KEYS:
+        if result["meta"].get(key) != baseline["meta"].get(key):
+            failures.append(f"{key} is {result['meta'].get(key)!r} but the baseline was recorded with {baseline['meta'].get(key)!r}")
+    if failures:
+        return failures
+    sections = {"overall": (result["overall"], baseline["overall"])}
+    for path, summary in result["endpoints"].items():
+        if path in baseline["endpoints"]:
+            sections[path] = (summary, baseline["endpoints"][path])
+    for name, (summary, expected) in sections.items():
+        enough_samples = min(summary["requests"] - summary["errors"], expected["requests"] - expected["errors"]) >= MIN_P99_SAMPLES
+        if enough_samples and summary["p99_ms"] > expected["p99_ms"] * (1 + p99_tolerance):
+            failures.append(f"{name} p99 {summary['p99_ms']} ms is more than {p99_tolerance:.0%} above the baseline's {expected['p99_ms']} ms")
+        if summary["error_rate"] > max_error_rate:
+            failures.append(f"{name} error rate {summary['error_rate']:.2%} is above {max_error_rate:.2%}")
+    throughput, expected_throughput = result["overall"]["throughput_rps"], baseline["overall"]["throughput_rps"]
+    if throughput < expected_throughput * (1 - throughput_tolerance):
+        failures.append(f"throughput {throughput} req/s is more than {throughput_tolerance:.0%} below the baseline's {expected_throughput} req/s")
+    return failures
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+# Body of the app process started by start_local_app: the app on 127.0.0.1, reading and writing the config.json
+# in work_dir so /update-popular-tags leaves the repo's files alone
+def serve_local_app(port, work_dir, force_stand_in=False):
+    from config_store import config_store
+    from logging_pipeline import setup_logging
+    config_store.path = Path(work_dir) / "config.json"
+    import uvicorn
+    import main
+    # main sets up logging at INFO on import; the copied config.json keeps it at WARNING once loaded
+    setup_logging("WARNING")
+    import nudge_engine
+    import compliment_generator
+    from benchmarks.run import load_benchmark_model
+    compliment_generator.load_templates()
+    compliment_generator.load_settings()
+    nudge_engine.load_settings()
+    # Loaded before the app starts, so the warm-up keeps it instead of loading model.pkl again
+    model = load_benchmark_model(force_stand_in)
+    (Path(work_dir) / "model").write_text(model)
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning", log_config=None)
+
+# Start the app in a child process on a free port and wait until /health/ready and /health both answer 200.
+# Returns the process, the base URL, the work directory and the model it loaded.
+def start_local_app(force_stand_in=False, startup_timeout=120.0):
+    work_dir = Path(tempfile.mkdtemp(prefix="social-vibe-loadtest-"))
+    with open(REPO_ROOT / "config.json", "r") as f:
+        settings = json.load(f)
+    settings.update({
+        "profiling_dir": str(work_dir / "profiles"),
+        "log_level": "WARNING",
+    })
+    with open(work_dir / "config.json", "w") as f:
+        json.dump(settings, f, indent=4)
+    port = free_port()
+    command = [sys.executable, "-m", "benchmarks.loadtest", "--serve-port", str(port), "--serve-dir", str(work_dir)]
+    process = subprocess.Popen(command + (["--stand-in-model"] if force_stand_in else []), cwd=REPO_ROOT)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + startup_timeout
+    while True:
+        if process.poll() is not None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise RuntimeError(f"App process exited with code {process.returncode} during startup")
+        try:
+            if all(httpx.get(base_url + path, timeout=1).status_code == 200 for path in ("/health/ready", HEALTH_PATH)):
+                return process, base_url, work_dir, (work_dir / "model").read_text()
+        except httpx.HTTPError:
+            pass
+        if time.monotonic() > deadline:
+            stop_local_app(process, work_dir)
+            raise RuntimeError(f"App did not become healthy within {startup_timeout} s")
+        time.sleep(0.2)
+
+def stop_local_app(process, work_dir):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, weight = part.split("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint {name}, expected one of {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight)
+    return mix
+
+def parse_buddy_buckets(text):
+    buckets = []
+    for part in text.split(","):
+        bounds, share = part.split("=")
+        low, high = bounds.split(":")
+        buckets.append((int(low), int(high), float(share)))
+    return tuple(buckets)
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Closed-loop load test of the service, with latency histograms and baseline gating")
+    parser.add_argument("--url", help="Base URL of a running service (default: start the app locally on a free port)")
+    parser.add_argument("--stand-in-model", action="store_true", help="Serve the synthetic model even if model.pkl loads (local app only)")
+    parser.add_argument("--rate", type=float, default=100.0, help="Target requests per second (0: as fast as the clients go)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Clients with one request in flight each")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds of load before measuring starts")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout in seconds")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="Endpoint weights as nudges=90,tags=2,health=8")
+    parser.add_argument("--buddies", type=parse_buddy_buckets, default=DEFAULT_BUDDY_BUCKETS,
+                        help="Buddy count buckets as min:max=share,... (default 0:2=25,3:10=55,11:40=15,41:150=5)")
+    parser.add_argument("--cooldown-rate", type=float, default=0.2, help="Share of users inside both cooldown windows")
+    parser.add_argument("--tag-heavy-rate", type=float, default=0.1, help="Share of users following 20 to 60 tags")
+    parser.add_argument("--users", type=int, default=2000, help="Distinct synthetic users, cycled through")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write results here instead of stdout")
+    parser.add_argument("--baseline", help="Fail when the run regresses against this earlier result")
+    parser.add_argument("--save-baseline", help="Also write the results here, to compare later runs against")
+    parser.add_argument("--p99-tolerance", type=float, default=0.2, help="Allowed p99 increase over the baseline, as a fraction")
+    parser.add_argument("--throughput-tolerance", type=float, default=0.1, help="Allowed throughput drop below the baseline, as a fraction")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Allowed share of failed requests per endpoint")
+    parser.add_argument("--serve-port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--serve-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve_port:
+        serve_local_app(args.serve_port, args.serve_dir, args.stand_in_model)
+        return 0
+
+    payloads = build_user_payloads(args.users, args.seed, args.buddies, args.cooldown_rate, args.tag_heavy_rate)
+    requests = request_stream(args.mix, payloads, build_tag_updates(50, args.seed), args.seed)
+    process = None
+    if args.url:
+        base_url, model = args.url.rstrip("/"), "external"
+    else:
+        process, base_url, work_dir, model = start_local_app(args.stand_in_model)
+    try:
+        summary = asyncio.run(run_load(base_url, requests, args.rate, args.concurrency, args.duration, args.warmup, args.timeout))
+    finally:
+        if process is not None:
+            stop_local_app(process, work_dir)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "url": args.url,
+            "model": model,
+            "rate": args.rate,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "users": args.users,
+            "seed": args.seed,
+            "mix": args.mix,
+            "buddy_buckets": [list(bucket) for bucket in args.buddies],
+            "cooldown_rate": args.cooldown_rate,
+            "tag_heavy_rate": args.tag_heavy_rate,
+        },
+        **summary,
+    }
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(output + "\n")
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        failures = compare_to_baseline(results, baseline, args.p99_tolerance, args.throughput_tolerance, args.max_error_rate)
+        for failure in failures:
+            print(f"REGRESSION: {failure}", file=sys.stderr)
+        if failures:
+            return 1
+        print(f"No regression against {args.baseline}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,57 @@
+import random
+from datetime import date, timedelta
+from student_model import FEATURE_RANGES
+
+# (low, mode, high) of a triangular distribution per field, centred on the sample users in the README
+DEFAULT_METRICS = {
+    **FEATURE_RANGES,
+    "profile_completeness": (20, 80, 100),
+}
+
+DEFAULT_BUDDY_METRICS = {
+    "last_interaction_days": (0, 6, 30),
+    "messages_sent": (0, 3, 20),
+    "karma_change_7d": (-30, -5, 30),
+    "quizzes_attempted": (0, 1, 6),
+}
+
+TAGS = ["python", "internship", "ml", "hackathon", "opencv", "AR-VR", "dsa", "webdev", "cloud", "resume"]
+
+def _draw(rng, low, mode, high):
+    return int(round(rng.triangular(low, high, mode)))
+
+def _days_ago(rng, today, low, high):
+    return (today - timedelta(days=rng.randint(low, high))).isoformat()
+
+# Seeded SocialNudgeRequest payloads (plain dicts, as sent over HTTP).
+# buddies is an inclusive (min, max) range of buddies per user; metrics/buddy_metrics override DEFAULT_* entries.
+def generate_payloads(count, seed=0, buddies=(2, 8), metrics=None, buddy_metrics=None, today=None):
+    rng = random.Random(seed)
+    today = today or date.today()
+    metric_ranges = {**DEFAULT_METRICS, **(metrics or {})}
+    buddy_ranges = {**DEFAULT_BUDDY_METRICS, **(buddy_metrics or {})}
+    payloads = []
+    for user_number in range(count):
+        profile_completeness = _draw(rng, *metric_ranges["profile_completeness"])
+        payloads.append({
+            "user_id": f"stu_{10000 + user_number}",
+            "buddies": [
+                {
+                    "buddy_id": f"stu_{20000 + user_number * 100 + buddy_number}",
+                    **{name: _draw(rng, *ranges) for name, ranges in buddy_ranges.items()},
+                }
+                for buddy_number in range(rng.randint(*buddies))
+            ],
+            "social_metrics": {
+                **{name: _draw(rng, *ranges) for name, ranges in metric_ranges.items() if name != "profile_completeness"},
+                "tags_followed": rng.sample(TAGS, rng.randint(0, 4)),
+                "profile_completeness": profile_completeness,
+                "previous_profile_completeness": max(0, profile_completeness - rng.choice((0, 0, 3, 10, 40))),
+            },
+            # Mostly outside the cooldown windows so the full rule set runs
+            "history": {
+                "last_compliment_generated": _days_ago(rng, today, 0, 30),
+                "last_buddy_nudge": _days_ago(rng, today, 0, 10),
+            },
+        })
+    return payloads
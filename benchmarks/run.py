@@ -0,0 +1,166 @@
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import compliment_generator
+import nudge_engine
+from compliment_generator import (
+    SocialNudgeRequest,
+    FEATURE_COLUMNS,
+    extract_feature_values,
+    build_feature_matrix,
+    override_prediction_if_important_feature_high,
+    identify_compliment_feature,
+)
+from nudge_engine import BuddyPayload, process_buddies, nudge_generator
+from benchmarks.payloads import generate_payloads, DEFAULT_METRICS
+from benchmarks.stand_in_model import train_stand_in_model
+
+# Triggers rendered by the template stage, with the tag used for helpful_answers
+COMPLIMENT_TRIGGERS = ["karma_growth", "helpful_answers", "quizzes_attempted", "upvotes", "consecutive_active_days", "profile_completeness"]
+NUDGE_TRIGGERS = ["last_interaction_days", "karma_drop", "score", "quizzes_attempted"]
+
+def summarize(samples):
+    values = np.array(samples) * 1e6
+    return {
+        "count": int(values.size),
+        "mean_us": round(float(values.mean()), 2),
+        "p50_us": round(float(np.percentile(values, 50)), 2),
+        "p95_us": round(float(np.percentile(values, 95)), 2),
+        "p99_us": round(float(np.percentile(values, 99)), 2),
+        "min_us": round(float(values.min()), 2),
+        "max_us": round(float(values.max()), 2),
+    }
+
+# Per-call wall time of function over every input, repeat times
+def time_stage(function, inputs, repeat):
+    samples = []
+    for _ in range(repeat):
+        for item in inputs:
+            started = time.perf_counter()
+            function(item)
+            samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+# The Git LFS model when it can be loaded, otherwise (or with force_stand_in) a small synthetic forest
+def load_benchmark_model(force_stand_in=False, seed=0):
+    if not force_stand_in:
+        try:
+            compliment_generator.load_model()
+            return compliment_generator.compliment_settings.config.get("model_engine", "pickle")
+        except RuntimeError as e:
+            print(f"Model unavailable ({e}), using the stand-in model", file=sys.stderr)
+    model = train_stand_in_model(seed)
+    compliment_generator.loaded_model = model
+    compliment_generator.model_feature_order = tuple(model.feature_names_in_)
+    compliment_generator.prediction_cache.clear()
+    return "stand-in"
+
+def run_stages(payloads, repeat, include_endpoint=True):
+    requests = [SocialNudgeRequest(**payload) for payload in payloads]
+    feature_values = [extract_feature_values(request.social_metrics) for request in requests]
+    frames = [pd.DataFrame([values], columns=FEATURE_COLUMNS) for values in feature_values]
+    matrices = [build_feature_matrix([values]) for values in feature_values]
+    buddy_payloads = [BuddyPayload(**payload) for payload in payloads]
+    rng = random.Random(0)
+    renders = [(rng.choice(COMPLIMENT_TRIGGERS), rng.choice(NUDGE_TRIGGERS), payload["user_id"]) for payload in payloads]
+
+    def render(item):
+        compliment_trigger, nudge_trigger, user_id = item
+        compliment_generator.compliment_generator(compliment_trigger, tag="python")
+        nudge_generator(nudge_trigger, user_id)
+
+    stages = {
+        "validation": time_stage(lambda payload: SocialNudgeRequest(**payload), payloads, repeat),
+        "dataframe_build": time_stage(lambda values: pd.DataFrame([values], columns=FEATURE_COLUMNS), feature_values, repeat),
+        "feature_matrix_build": time_stage(lambda values: build_feature_matrix([values]), feature_values, repeat),
+        "predict": time_stage(
+            lambda matrix: compliment_generator.loaded_model.predict(compliment_generator.model_input(matrix)), matrices, repeat
+        ),
+        "override_prediction_if_important_feature_high": time_stage(
+            lambda frame: override_prediction_if_important_feature_high(frame, 0), frames, repeat
+        ),
+        "identify_compliment_feature": time_stage(
+            lambda frame: identify_compliment_feature(
+                frame,
+                compliment_generator.compliment_settings.compliment_averages,
+                compliment_generator.compliment_settings.feature_base_factors,
+                compliment_generator.compliment_settings.feature_importances,
+            ),
+            frames,
+            repeat,
+        ),
+        "template_rendering": time_stage(render, renders, repeat),
+        "process_buddies": time_stage(process_buddies, buddy_payloads, repeat),
+    }
+    if include_endpoint:
+        from fastapi.testclient import TestClient
+        from startup import warm_up
+        import main
+        with TestClient(main.app) as client:
+            warm_up.wait(30)
+            stages["endpoint"] = time_stage(
+                lambda payload: client.post("/generate-social-nudges", json=payload).raise_for_status(), payloads, repeat
+            )
+    return stages
+
+def parse_range(text):
+    low, high = text.split(":")
+    return int(low), int(high)
+
+def parse_metric(text):
+    name, ranges = text.split("=")
+    if name not in DEFAULT_METRICS:
+        raise argparse.ArgumentTypeError(f"Unknown metric {name}, expected one of {', '.join(DEFAULT_METRICS)}")
+    low, mode, high = (int(value) for value in ranges.split(":"))
+    return name, (low, mode, high)
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Per-stage timings of the compliment and nudge pipeline, as JSON")
+    parser.add_argument("--users", type=int, default=200, help="Synthetic users to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--buddies", type=parse_range, default=(2, 8), help="Buddies per user as min:max")
+    parser.add_argument("--metric", type=parse_metric, action="append", default=[], help="Override a metric distribution as name=low:mode:high")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the payloads per stage")
+    parser.add_argument("--stand-in-model", action="store_true", help="Use the synthetic model even if model.pkl loads")
+    parser.add_argument("--skip-endpoint", action="store_true", help="Do not time the full endpoint through TestClient")
+    parser.add_argument("--out", help="Write results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    random.seed(args.seed)
+    compliment_generator.load_templates()
+    compliment_generator.load_settings()
+    nudge_engine.load_settings()
+    model = load_benchmark_model(args.stand_in_model, args.seed)
+
+    payloads = generate_payloads(args.users, seed=args.seed, buddies=args.buddies, metrics=dict(args.metric))
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "model": model,
+            "users": args.users,
+            "seed": args.seed,
+            "buddies": list(args.buddies),
+            "metric_overrides": {name: list(ranges) for name, ranges in args.metric},
+            "repeat": args.repeat,
+        },
+        "stages": run_stages(payloads, args.repeat, include_endpoint=not args.skip_endpoint),
+    }
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from compliment_generator import FEATURE_COLUMNS
+
+# Small forest with the same feature names as the production model, for runs without the Git LFS model.pkl.
+# Its predictions are synthetic; only the shape of the work (a forest over five integer features) matches.
+def train_stand_in_model(seed=0, rows=2000, trees=50):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({
+        "karma_growth": rng.integers(0, 400, rows),
+        "helpful_answers": rng.integers(0, 30, rows),
+        "quizzes_attempted": rng.integers(0, 25, rows),
+        "upvotes": rng.integers(0, 250, rows),
+        "consecutive_active_days": rng.integers(0, 40, rows),
+    })[FEATURE_COLUMNS]
+    y = (((X.karma_growth > 100) & (X.upvotes > 60)) | (X.helpful_answers > 15)).astype(int)
+    return RandomForestClassifier(n_estimators=trees, max_depth=8, random_state=seed).fit(X, y)
@@ -0,0 +1,223 @@
+import os
+import sys
+import csv
+import json
+import time
+import logging
+import argparse
+import itertools
+import multiprocessing
+from collections import deque
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import compliment_generator
+import nudge_engine
+from compliment_generator import SocialNudgeRequest, UserHistory, social_metrics, generate_compliments_batch
+from nudge_engine import process_buddies
+from logging_pipeline import setup_logging
+
+logger = logging.getLogger(__name__)
+
+INPUT_FORMATS = {".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv", ".parquet": "parquet", ".pq": "parquet"}
+
+# Columns of a flat CSV/Parquet row that belong under social_metrics and history
+SOCIAL_METRIC_FIELDS = tuple(social_metrics.model_fields)
+HISTORY_FIELDS = tuple(UserHistory.model_fields)
+# Columns that hold JSON text in CSV files (Parquet may store them as native lists/structs instead)
+JSON_FIELDS = ("buddies", "social_metrics", "history", "tags_followed")
+
+def detect_format(path):
+    input_format = INPUT_FORMATS.get(Path(path).suffix.lower())
+    if input_format is None:
+        raise ValueError(f"Cannot tell the format of {path}, pass --format ({', '.join(sorted(set(INPUT_FORMATS.values())))})")
+    return input_format
+
+def read_jsonl(path):
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield line
+
+def read_csv(path):
+    with open(path, "r", newline="") as f:
+        yield from csv.DictReader(f)
+
+def read_parquet(path, batch_size):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Reading Parquet needs pyarrow: pip install pyarrow")
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield from batch.to_pylist()
+
+# One item per user, streamed: raw JSON lines for JSONL, row dicts for CSV and Parquet
+def iter_records(path, input_format, batch_size=10000):
+    if input_format == "jsonl":
+        return read_jsonl(path)
+    if input_format == "csv":
+        return read_csv(path)
+    if input_format == "parquet":
+        return read_parquet(path, batch_size)
+    raise ValueError(f"Unknown input format: {input_format}")
+
+# Request payload from a flat row: social metric and history columns are nested, JSON text columns decoded, empty cells dropped
+def row_to_payload(row):
+    payload = {name: value for name, value in row.items() if value is not None and value != ""}
+    for name in JSON_FIELDS:
+        if isinstance(payload.get(name), str):
+            payload[name] = json.loads(payload[name])
+    if "social_metrics" not in payload:
+        payload["social_metrics"] = {name: payload.pop(name) for name in SOCIAL_METRIC_FIELDS if name in payload}
+    if "history" not in payload:
+        payload["history"] = {name: payload.pop(name) for name in HISTORY_FIELDS if name in payload}
+    return payload
+
+def decode_record(item):
+    if isinstance(item, str):
+        return SocialNudgeRequest.model_validate_json(item)
+    return SocialNudgeRequest.model_validate(row_to_payload(item))
+
+# Score one chunk the way /generate-social-nudges scores a user, with one predict call for the whole chunk.
+# Returns the output lines in input order and the number of records that failed validation.
+def score_chunk(items):
+    lines = [None] * len(items)
+    requests_data = []
+    positions = []
+    for position, item in enumerate(items):
+        try:
+            requests_data.append(decode_record(item))
+            positions.append(position)
+        except ValueError as e:
+            user_id = item.get("user_id") if isinstance(item, dict) else None
+            lines[position] = json.dumps({"user_id": user_id, "status": "invalid", "error": str(e)})
+    compliments = generate_compliments_batch(requests_data)
+    for position, request_data, compliment_output in zip(positions, requests_data, compliments):
+        user_id, buddy_nudges = process_buddies(request_data)
+        lines[position] = json.dumps({
+            "user_id": request_data.user_id,
+            "buddy_nudges": buddy_nudges,
+            "compliment": compliment_output.get("compliment", {}),
+            "status": "generated",
+        })
+    return lines, len(items) - len(positions)
+
+# Runs in each pool process; forked children inherit the parent's model, spawned ones load their own
+def _init_worker():
+    if compliment_generator.loaded_model is None:
+        nudge_engine.load_resources()
+        compliment_generator.load_resources()
+
+# (record count, score_chunk result) per chunk, in input order. At most max_pending chunks are queued
+# on the pool at once, so memory does not grow with the input.
+def scored_chunks(chunks, executor, max_pending):
+    if executor is None:
+        for chunk in chunks:
+            yield len(chunk), score_chunk(chunk)
+        return
+    pending = deque()
+    for chunk in chunks:
+        pending.append((len(chunk), executor.submit(score_chunk, chunk)))
+        if len(pending) >= max_pending:
+            count, future = pending.popleft()
+            yield count, future.result()
+    while pending:
+        count, future = pending.popleft()
+        yield count, future.result()
+
+def load_checkpoint(path, input_path):
+    try:
+        with open(path, "r") as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return None
+    if checkpoint.get("input") != str(input_path):
+        raise ValueError(f"Checkpoint {path} belongs to {checkpoint.get('input')}, not {input_path}")
+    return checkpoint
+
+def save_checkpoint(path, checkpoint):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_path, path)
+
+# Score every user in input_path into output_path as JSON lines, one per input record and in input order.
+# After each chunk the output is fsynced and the checkpoint records how many records and bytes are done;
+# with resume, output past that point is cut off and scoring continues from the next record.
+def score_file(input_path, output_path, input_format=None, chunk_size=5000, workers=0, checkpoint_path=None,
+               resume=False, progress_interval=10.0, progress=None):
+    input_format = input_format or detect_format(input_path)
+    checkpoint_path = checkpoint_path or f"{output_path}.checkpoint"
+    checkpoint = load_checkpoint(checkpoint_path, input_path) if resume else None
+    done = checkpoint["records_done"] if checkpoint else 0
+    invalid = checkpoint["invalid"] if checkpoint else 0
+    if checkpoint and checkpoint.get("complete"):
+        return {**checkpoint, "records_scored": 0, "seconds": 0.0, "users_per_second": 0.0}
+    if checkpoint and (not os.path.exists(output_path) or os.path.getsize(output_path) < checkpoint["output_bytes"]):
+        raise ValueError(f"{output_path} is shorter than checkpoint {checkpoint_path} says; start over without --resume")
+
+    records = itertools.islice(iter_records(input_path, input_format, chunk_size), done, None)
+    chunks = iter(lambda: list(itertools.islice(records, chunk_size)), [])
+    executor = None
+    if workers > 0:
+        # fork shares the already loaded model pages with the pool processes copy-on-write
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method), initializer=_init_worker)
+
+    started = time.perf_counter()
+    last_report = started
+    scored = 0
+    try:
+        with open(output_path, "ab" if checkpoint else "wb") as output:
+            if checkpoint:
+                output.truncate(checkpoint["output_bytes"])
+            for count, (lines, chunk_invalid) in scored_chunks(chunks, executor, max(2 * workers, 1)):
+                output.write(("\n".join(lines) + "\n").encode())
+                output.flush()
+                os.fsync(output.fileno())
+                done += count
+                scored += count
+                invalid += chunk_invalid
+                save_checkpoint(checkpoint_path, {
+                    "input": str(input_path), "records_done": done, "invalid": invalid, "output_bytes": output.tell(),
+                })
+                now = time.perf_counter()
+                if progress and now - last_report >= progress_interval:
+                    progress(done, scored / (now - started))
+                    last_report = now
+            output_bytes = output.tell()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    seconds = time.perf_counter() - started
+    summary = {"input": str(input_path), "records_done": done, "invalid": invalid, "output_bytes": output_bytes, "complete": True}
+    save_checkpoint(checkpoint_path, summary)
+    return {**summary, "records_scored": scored, "seconds": round(seconds, 3), "users_per_second": round(scored / seconds, 1) if seconds else 0.0}
+
+def report_progress(done, users_per_second):
+    print(f"{done} users scored, {users_per_second:.0f} users/s", file=sys.stderr)
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Score compliments and buddy nudges for every user in a file, as JSON lines")
+    parser.add_argument("input", help="Users as JSONL (one request body per line), CSV or Parquet")
+    parser.add_argument("output", help="JSON lines file to write, one result per input user")
+    parser.add_argument("--format", choices=sorted(set(INPUT_FORMATS.values())), help="Input format (default: from the file extension)")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Users scored per predict call and per checkpoint")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Scoring processes (0 scores in this process)")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint instead of starting over")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between progress lines on stderr")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    setup_logging(args.log_level.upper())
+    nudge_engine.load_resources()
+    compliment_generator.load_resources()
+    summary = score_file(
+        args.input, args.output, args.format, args.chunk_size, args.workers, args.checkpoint, args.resume,
+        args.progress_interval, report_progress,
+    )
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main_cli()
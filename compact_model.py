@@ -0,0 +1,132 @@
+import json
+import pickle
+import logging
+import argparse
+import numpy as np
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "meta.json"
+ARRAY_FILES = {
+    "feature": "feature.npy",
+    "threshold": "threshold.npy",
+    "children_left": "children_left.npy",
+    "children_right": "children_right.npy",
+    "leaf_value": "leaf_value.npy",
+    "tree_offsets": "tree_offsets.npy",
+}
+
+# Flatten a fitted sklearn tree classifier or forest into contiguous arrays under out_dir
+def export_model(model, out_dir):
+    estimators = getattr(model, "estimators_", None)
+    if estimators is None:
+        estimators = [model]
+    trees = [getattr(estimator, "tree_", None) for estimator in estimators]
+    if not trees or any(tree is None for tree in trees):
+        raise ValueError(f"Unsupported model type for export: {type(model).__name__}")
+    if any(tree.n_outputs != 1 for tree in trees):
+        raise ValueError("Only single-output tree models can be exported")
+
+    node_counts = [tree.node_count for tree in trees]
+    tree_offsets = np.cumsum([0] + node_counts[:-1]).astype(np.int64)
+    features, thresholds, lefts, rights, leaf_values = [], [], [], [], []
+    for offset, tree in zip(tree_offsets, trees):
+        node_ids = np.arange(tree.node_count, dtype=np.int64) + offset
+        is_leaf = tree.children_left == -1
+        # Leaves point back at themselves so every row can walk max_depth steps without branching
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold).astype(np.float64))
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset).astype(np.int64))
+        rights.append(np.where(is_leaf, node_ids, tree.children_right + offset).astype(np.int64))
+        value = tree.value[:, 0, :].astype(np.float64)
+        normalizer = value.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+        leaf_values.append(value / normalizer)
+
+    arrays = {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "children_left": np.concatenate(lefts),
+        "children_right": np.concatenate(rights),
+        "leaf_value": np.ascontiguousarray(np.concatenate(leaf_values)),
+        "tree_offsets": tree_offsets,
+    }
+    feature_names = getattr(model, "feature_names_in_", None)
+    meta = {
+        "model_type": type(model).__name__,
+        "n_trees": len(trees),
+        "max_depth": int(max(tree.max_depth for tree in trees)),
+        "classes": np.asarray(model.classes_).tolist(),
+        "feature_names": [str(name) for name in feature_names] if feature_names is not None else None,
+        "n_features": int(model.n_features_in_),
+    }
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name, file_name in ARRAY_FILES.items():
+        np.save(out_dir / file_name, arrays[name])
+    with open(out_dir / META_FILE, "w") as f:
+        json.dump(meta, f, indent=4)
+    logger.info("Exported %s trees (%s nodes) to %s", meta['n_trees'], len(arrays['feature']), out_dir)
+    return meta
+
+# Tree ensemble evaluated straight from memory-mapped arrays, mirroring the sklearn predict API
+class CompactForest:
+    def __init__(self, arrays, meta):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.children_left = arrays["children_left"]
+        self.children_right = arrays["children_right"]
+        self.leaf_value = arrays["leaf_value"]
+        self.tree_offsets = np.asarray(arrays["tree_offsets"])
+        self.meta = meta
+        self.max_depth = meta["max_depth"]
+        self.classes_ = np.asarray(meta["classes"])
+        self.n_features_in_ = meta["n_features"]
+        if meta.get("feature_names") is not None:
+            self.feature_names_in_ = np.asarray(meta["feature_names"], dtype=object)
+
+    @classmethod
+    def load(cls, model_dir, mmap=True):
+        model_dir = Path(model_dir)
+        with open(model_dir / META_FILE, "r") as f:
+            meta = json.load(f)
+        mmap_mode = "r" if mmap else None
+        arrays = {name: np.load(model_dir / file_name, mmap_mode=mmap_mode) for name, file_name in ARRAY_FILES.items()}
+        return cls(arrays, meta)
+
+    # Leaf node reached by every row in every tree (or only the trees selected by the trees slice), shape (n_rows, n_trees)
+    def apply(self, X, trees=slice(None)):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected input with {self.n_features_in_} features, got shape {X.shape}")
+        rows = np.arange(X.shape[0])[:, None]
+        offsets = self.tree_offsets[trees]
+        nodes = np.broadcast_to(offsets, (X.shape[0], len(offsets))).copy()
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.children_left[nodes], self.children_right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        # Accumulate tree by tree like sklearn's forest so ties resolve the same way
+        proba = np.zeros((leaves.shape[0], len(self.classes_)), dtype=np.float64)
+        for tree_index in range(leaves.shape[1]):
+            proba += self.leaf_value[leaves[:, tree_index]]
+        proba /= leaves.shape[1]
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Export the pickled compliment model to the compact memory-mapped format")
+    parser.add_argument("--model", default="model.pkl", help="Path of the pickled sklearn model")
+    parser.add_argument("--out", default="model_compact", help="Directory to write the arrays and meta.json to")
+    args = parser.parse_args()
+    with open(args.model, "rb") as f:
+        model = pickle.load(f)
+    export_model(model, args.out)
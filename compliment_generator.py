@@ -1,93 +1,214 @@
 import json
-import random
+import time
 import logging
 import pickle
+from functools import cached_property
+from types import MappingProxyType
+import numpy as np
 import pandas as pd
-from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Mapping, NamedTuple
 from fastapi import  HTTPException
 from datetime import datetime
+from compact_model import CompactForest
+from student_model import StudentModel
+from early_exit import EarlyExitEnsemble
+from template_registry import template_store
+from prediction_cache import PredictionCache
+from config_store import config_store
+from tag_index import TagIndex, apply_tag_delta
+from metrics import timed, stage_timer, COMPLIMENTS, COOLDOWN_SKIPS, COMPLIMENT_STAGES
+from nudge_engine import Buddy, History, BuddyPayload
 
 # Constants
 CONFIG_PATH = "config.json"
 
-# Setup Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s"
-)
 logger = logging.getLogger(__name__)
 
-# Load compliment and nudge templates
-_json_path = Path(__file__).parent / "templates.json"
+# Feature statistics and thresholds from one config snapshot. prepare_settings builds a new one per snapshot and
+# publishes it by rebinding compliment_settings, so a request that reads it once (ComplimentContext does) keeps
+# one consistent version even if a reload lands while it runs.
+class ComplimentSettings(NamedTuple):
+    config: Mapping
+    feature_averages: Mapping
+    feature_high_marks: Mapping
+    feature_low_marks: Mapping
+    feature_base_factors: Mapping
+    feature_importances: Mapping
+    compliment_cooldown_days: int
+    # Averages handed to identify_compliment_feature, keyed by feature name
+    compliment_averages: Mapping
 
-with open(_json_path, "r", encoding="utf-8") as f:
-    _compliment_data = json.load(f)
-    logger.info(f"Loaded compliment templates from {_json_path}")
-    
-# Load the compliment prediction model
-try:
-    with open("model.pkl", "rb") as file:
-        loaded_model = pickle.load(file)
-        logger.info("Compliment model loaded successfully.")
-except FileNotFoundError:
-    logger.error("Model file not found: compliment_model.pkl")
-    raise RuntimeError("Model file not found: compliment_model.pkl")
-except pickle.UnpicklingError:
-    logger.error("Error unpickling model file")
-    raise RuntimeError("Error unpickling model file")
-except Exception as e:
-    logger.exception("Unexpected error loading model")
-    raise RuntimeError(f"Unexpected error loading model: {e}")
+    # Raises KeyError when the snapshot lacks a setting
+    @classmethod
+    def from_snapshot(cls, config):
+        feature_averages = {
+            "average_upvotes": config["average_upvotes"],
+            "average_helpful_answers": config["average_helpful_answers"],
+            "average_quizzes_attempted": config["average_quizzes_attempted"],
+            "average_karma_growth": config["average_karma"],
+            "average_consecutive_active_days": config["average_consecutive_active_days"],
+        }
+        return cls(
+            config=config,
+            feature_averages=MappingProxyType(feature_averages),
+            feature_high_marks=MappingProxyType({
+                "karma": config["high_karma_mark"],
+                "helpful_answers": config["high_helpful_answers_mark"],
+                "quizzes": config["high_quiz_mark"],
+                "upvotes": config["high_upvotes_mark"],
+                "consecutive_days": config["high_consecutive_days_mark"],
+            }),
+            feature_low_marks=config["feature_low_marks"],
+            feature_base_factors=config["feature_base_factors"],
+            feature_importances=config["feature_importances"],
+            compliment_cooldown_days=config["compliment_cooldown_days"],
+            compliment_averages=MappingProxyType({
+                "karma_growth": feature_averages["average_karma_growth"],
+                "helpful_answers": feature_averages["average_helpful_answers"],
+                "quizzes_attempted": feature_averages["average_quizzes_attempted"],
+                "upvotes": feature_averages["average_upvotes"],
+                "consecutive_active_days": feature_averages["average_consecutive_active_days"],
+                "tag_match": 0,
+            }),
+        )
 
+# Filled by load_templates/load_settings/load_model during application startup
+compliment_settings = None
+loaded_model = None
+model_feature_order = ()
+popular_tag_index = TagIndex({})
+
+# Predictions keyed by the exact feature tuple; sized from prediction_cache_size and emptied on model reload
+prediction_cache = PredictionCache(maxsize=0)
+
+# Metric children used on every request
+generate_compliment_timer = stage_timer("generate_compliment")
+compliment_cooldown_skips = COOLDOWN_SKIPS.labels("compliment")
+
+# Load compliment and nudge templates
+def load_templates():
+    template_store.load()
+    
 #load the config.json to access all the configuration properties
 def load_config():
     try:
         with open(CONFIG_PATH, "r") as f:
-            logger.info(f"Loading config from {CONFIG_PATH}")
+            logger.info("Loading config from %s", CONFIG_PATH)
             return json.load(f)
     except FileNotFoundError:
         logging.warning("Config file not found!")
         return {}
     
-#save changes to config.json (used to save most popular tags recieved through json)
-def save_config(config_data):
+
+# Load the compliment prediction model: the pickled ensemble, its compact memory-mapped export, or the
+# distilled student tree. The student falls back to the ensemble when its file is missing, and keeps the
+# ensemble loaded to re-score unsure rows when student_fallback_confidence is above 0.
+def load_compliment_model(engine="pickle", model_path="model.pkl", compact_model_dir="model_compact",
+                          student_model_path="model_student.pkl", student_fallback_confidence=0.0):
+    if engine == "student":
+        try:
+            with open(student_model_path, "rb") as file:
+                tree = pickle.load(file)
+        except FileNotFoundError:
+            logger.warning("Student model not found: %s. Serving the full model instead", student_model_path)
+            return load_compliment_model("pickle", model_path)
+        teacher = load_compliment_model("pickle", model_path) if student_fallback_confidence > 0 else None
+        logger.info("Student compliment model loaded from %s.", student_model_path)
+        return StudentModel(tree, teacher, student_fallback_confidence)
+    if engine == "compact":
+        try:
+            model = CompactForest.load(compact_model_dir)
+            logger.info("Compact compliment model memory-mapped from %s.", compact_model_dir)
+            return model
+        except FileNotFoundError:
+            logger.error("Compact model not found: %s", compact_model_dir)
+            raise RuntimeError(f"Compact model not found: {compact_model_dir}. Export it with compact_model.py")
+    if engine != "pickle":
+        raise RuntimeError(f"Unknown model_engine: {engine}")
     try:
-        with open(CONFIG_PATH, "w") as f:
-            json.dump(config_data, f, indent=4)
-            logger.info(f"Saved config to {CONFIG_PATH}")
+        with open(model_path, "rb") as file:
+            model = pickle.load(file)
+            logger.info("Compliment model loaded successfully.")
+            return model
+    except FileNotFoundError:
+        logger.error("Model file not found: compliment_model.pkl")
+        raise RuntimeError("Model file not found: compliment_model.pkl")
+    except pickle.UnpicklingError:
+        logger.error("Error unpickling model file")
+        raise RuntimeError("Error unpickling model file")
     except Exception as e:
-        logger.error(f"Failed to save config: {e}")
+        logger.exception("Unexpected error loading model")
+        raise RuntimeError(f"Unexpected error loading model: {e}")
+
+# Load the model selected by model_engine in config.json
+def load_model():
+    global loaded_model, model_feature_order
+    config = compliment_settings.config
+    model = load_compliment_model(
+        engine=config.get("model_engine", "pickle"),
+        compact_model_dir=config.get("compact_model_dir", "model_compact"),
+        student_model_path=config.get("student_model_path", "model_student.pkl"),
+        student_fallback_confidence=config.get("student_fallback_confidence", 0.0),
+    )
+    if config.get("ensemble_early_exit", False):
+        if EarlyExitEnsemble.supports(model):
+            model = EarlyExitEnsemble(model, config.get("ensemble_chunk_trees", 16), config.get("ensemble_time_budget_ms", 0))
+        else:
+            logger.warning("ensemble_early_exit ignored: %s is not a random or extra-trees forest", type(model).__name__)
+    model_feature_order = tuple(model.feature_names_in_)
+    loaded_model = model
+    prediction_cache.clear()
 
-config = load_config()
+# Derive the feature statistics used by the compliment rules from the shared config snapshot
+def load_settings():
+    prepare_settings(config_store.snapshot())()
 
-# Feature statistics
-feature_averages = {
-    "average_upvotes": config["average_upvotes"],
-    "average_helpful_answers": config["average_helpful_answers"],
-    "average_quizzes_attempted": config["average_quizzes_attempted"],
-    "average_karma_growth": config["average_karma"],
-    "average_consecutive_active_days": config["average_consecutive_active_days"],
-}
+# Builds the settings and tag index for a new config snapshot and returns the function that publishes them.
+# Subscribed to the config store, so also called on every hot reload and update; a snapshot missing a
+# setting raises here, before anything is published.
+def prepare_settings(snapshot):
+    settings = ComplimentSettings.from_snapshot(snapshot)
+    tag_index = prepare_tag_index(snapshot.get("popular_tags", {}))
 
-feature_high_marks = {
-    "karma": config["high_karma_mark"],
-    "helpful_answers": config["high_helpful_answers_mark"],
-    "quizzes": config["high_quiz_mark"],
-    "upvotes": config["high_upvotes_mark"],
-    "consecutive_days": config["high_consecutive_days_mark"],
-}
+    def publish():
+        global compliment_settings, popular_tag_index
+        compliment_settings = settings
+        popular_tag_index = tag_index
+        prediction_cache.resize(snapshot.get("prediction_cache_size", 4096))
 
-feature_low_marks=config["feature_low_marks"]
+    return publish
 
-feature_base_factors = config["feature_base_factors"]
+config_store.subscribe(prepare_settings)
 
-feature_importances = config["feature_importances"]
+# (popular_tags it was computed from, changed tags) of the tag delta being swapped in by update_tags_delta;
+# only set and read under the config store lock
+_pending_tag_delta = None
 
-compliment_cooldown_days=config["compliment_cooldown_days"]
+# Index for a new popular_tags mapping: the current one when the mapping is unchanged, the current one with the
+# pending delta applied when the mapping is its result, and a full rebuild otherwise (file reload, /update-popular-tags)
+def prepare_tag_index(popular_tags):
+    global _pending_tag_delta
+    current, pending, _pending_tag_delta = popular_tag_index, _pending_tag_delta, None
+    if current.source is popular_tags:
+        return current
+    if pending is not None and current.source is pending[0] and delta_applied(pending[0], pending[1], popular_tags):
+        return current.with_delta(pending[1], popular_tags)
+    return TagIndex(popular_tags)
 
-popular_tags = config.get("popular_tags", {})
+# True when popular_tags is base with changed applied; looks at the changed tags only
+def delta_applied(base, changed, popular_tags):
+    added = sum(1 for tag in changed if tag not in base and changed[tag] is not None)
+    removed = sum(1 for tag in changed if tag in base and changed[tag] is None)
+    return len(popular_tags) == len(base) + added - removed and all(
+        popular_tags.get(tag) == weight for tag, weight in changed.items()
+    )
+
+# Load everything generate_compliment needs; the app does this in its lifespan warm-up instead of at import
+def load_resources():
+    load_templates()
+    load_settings()
+    load_model()
 
 # Pydantic models for validation
 class social_metrics(BaseModel):
@@ -102,19 +223,26 @@ class social_metrics(BaseModel):
     
 class TagUpdate(BaseModel):
     popular_tags: Dict[str, int]
+
+# Incremental tag change: positive increments raise a weight, negative ones lower it, expire drops the tag
+class TagDelta(BaseModel):
+    increments: Dict[str, int] = Field(default_factory=dict)
+    expire: List[str] = Field(default_factory=list)
     
-class BuddyMetrics(BaseModel):
+# The request models extend nudge_engine's with stricter fields, so a validated SocialNudgeRequest
+# is also a BuddyPayload and goes to process_buddies as is, without being validated a second time
+class BuddyMetrics(Buddy):
     buddy_id: str
     last_interaction_days: int
     messages_sent: int
     karma_change_7d: int
     quizzes_attempted: int
 
-class UserHistory(BaseModel):
+class UserHistory(History):
     last_compliment_generated: Optional[str] = None
     last_buddy_nudge: Optional[str] = None
 
-class SocialNudgeRequest(BaseModel): 
+class SocialNudgeRequest(BuddyPayload): 
     user_id: str
     buddies: List[BuddyMetrics]
     social_metrics: social_metrics 
@@ -126,7 +254,9 @@ class OutputCompliment(BaseModel):
     priority:str=None
 
 # Determine priority level for compliments
-def calculate_priority(feature: str, metrics: social_metrics, matched_tags: List[str], profile_improvement: int) -> str:
+def calculate_priority(feature: str, metrics: social_metrics, matched_tags: List[str], profile_improvement: int,
+                       settings: ComplimentSettings = None) -> str:
+    feature_averages = (settings or compliment_settings).feature_averages
     if feature in {"helpful_answers", "upvotes"} and matched_tags:
         return "emotional"
     if feature == "profile_completeness" and profile_improvement > 25:
@@ -149,33 +279,38 @@ def calculate_priority(feature: str, metrics: social_metrics, matched_tags: List
     return "gentle"
 
 # Check cooldown before issuing another compliment
-def check_compliment_cooldown(last_compliment_generated: str) -> bool:
+def check_compliment_cooldown(last_compliment_generated: str, settings: ComplimentSettings = None) -> bool:
     if last_compliment_generated:
         try:
             last_compliment_date = datetime.strptime(last_compliment_generated, "%Y-%m-%d")
-            return (datetime.today() - last_compliment_date).days >= compliment_cooldown_days
+            allowed = (datetime.today() - last_compliment_date).days >= (settings or compliment_settings).compliment_cooldown_days
+            if not allowed:
+                compliment_cooldown_skips.inc()
+            return allowed
         except ValueError:
             logger.warning("Invalid date format for last_compliment_generated")
             return False  
     return True  
 
 # Generate compliment message using template
+@timed("render_compliment")
 def compliment_generator(feature: str, tag: str = None) -> str:
-    entry = next((item for item in _compliment_data if item["trigger"] == feature), None)
+    entry = template_store.registry.get(feature)
     if not entry:
-        logger.warning(f"No compliment template found for feature: {feature}")
+        logger.warning("No compliment template found for feature: %s", feature)
         return "Great job! Keep contributing."
-    compliment = random.choice(entry.get("template", ["Great job! Keep contributing."]))
+    template = entry.pick(default="Great job! Keep contributing.")
     if feature == "helpful_answers":
-        if tag:
-            compliment = compliment.replace("{tag}", tag)
-        else:
-            compliment = compliment.replace("{tag}", "this space") 
-    emoji = random.choice(entry.get("emojis", ["✨"]))
+        compliment = template.render("{tag}", tag if tag else "this space")
+    else:
+        compliment = template.text
+    emoji = entry.pick_emoji()
     return f"{compliment} {emoji}" 
 
 # Override model prediction if high individual feature      
-def override_prediction_if_important_feature_high(df, prediction):
+def override_prediction_if_important_feature_high(df, prediction, settings: ComplimentSettings = None):
+    settings = settings or compliment_settings
+    feature_averages, feature_high_marks = settings.feature_averages, settings.feature_high_marks
     if int(prediction) == 0:
         high_features = {}
         if int(df["karma_growth"].iloc[0]) >= feature_averages["average_karma_growth"] * feature_high_marks["karma"]:
@@ -203,18 +338,25 @@ def override_prediction_if_important_feature_high(df, prediction):
                     "consecutive_active_days": feature_averages["average_consecutive_active_days"],
                     "tag_match": 0,
                 },
-                base_factors=feature_base_factors ,
-                feature_importances=feature_importances,
+                base_factors=settings.feature_base_factors ,
+                feature_importances=settings.feature_importances,
+                settings=settings,
             )
             return 1, complimented_feature
         
     return prediction, None
 
 # Determine top feature based on z-score and importance
-def identify_compliment_feature(user_df, averages, base_factors , feature_importances):
+def identify_compliment_feature(user_df, averages, base_factors , feature_importances, settings: ComplimentSettings = None):
+    user_values = {feature: user_df[feature].values[0] for feature in user_df.columns}
+    return identify_compliment_feature_from_values(user_values, averages, base_factors, feature_importances, settings)
+
+# Same scoring as identify_compliment_feature on a {feature: value} mapping
+def identify_compliment_feature_from_values(user_values, averages, base_factors, feature_importances, settings: ComplimentSettings = None):
+    settings = settings or compliment_settings
+    feature_averages, feature_low_marks = settings.feature_averages, settings.feature_low_marks
     scores = {}
-    for feature in user_df.columns:
-        user_value = user_df[feature].values[0]
+    for feature, user_value in user_values.items():
         if user_value < feature_averages[f"average_{feature}"] * feature_low_marks[feature] :
             continue
         avg = averages.get(feature, 1)
@@ -230,36 +372,272 @@ def identify_compliment_feature(user_df, averages, base_factors , feature_import
         logger.warning("No significant feature found for compliment generation.")
         return None
 
+# Model input columns in the order the payload lists them
+FEATURE_COLUMNS = [
+    "karma_growth",
+    "helpful_answers",
+    "quizzes_attempted",
+    "upvotes",
+    "consecutive_active_days",
+]
+
+# feature_high_marks key for each feature
+high_mark_keys = {
+    "karma_growth": "karma",
+    "helpful_answers": "helpful_answers",
+    "quizzes_attempted": "quizzes",
+    "upvotes": "upvotes",
+    "consecutive_active_days": "consecutive_days",
+}
+
+# Multipliers of the average below which a feature counts as low when the model predicts a compliment
+low_feature_factors = {
+    "karma_growth": 0.4,
+    "helpful_answers": 0.4,
+    "quizzes_attempted": 0.4,
+    "upvotes": 0.14,
+    "consecutive_active_days": 0.3,
+}
+
+# Feature values of one user as plain ints, in FEATURE_COLUMNS order
+def extract_feature_values(metrics: social_metrics) -> Dict[str, int]:
+    return {
+        "karma_growth": metrics.karma_growth,
+        "helpful_answers": metrics.helpful_answers,
+        "quizzes_attempted": metrics.quizzes_attempted,
+        "upvotes": metrics.upvotes,
+        "consecutive_active_days": metrics.consecutive_active_days,
+    }
+
+# Model input matrix with columns ordered like feature_names_in_
+def build_feature_matrix(values_list: List[Dict[str, int]]) -> np.ndarray:
+    return np.array(
+        [[values[name] for name in model_feature_order] for values in values_list],
+        dtype=np.int64,
+    )
+
+# Same rule as override_prediction_if_important_feature_high on a {feature: value} mapping
+def override_prediction_from_values(values: Dict[str, int], prediction, settings: ComplimentSettings = None):
+    settings = settings or compliment_settings
+    if int(prediction) == 0:
+        feature_averages, feature_high_marks = settings.feature_averages, settings.feature_high_marks
+        high_features = {
+            feature: int(values[feature])
+            for feature in FEATURE_COLUMNS
+            if int(values[feature]) >= feature_averages[f"average_{feature}"] * feature_high_marks[high_mark_keys[feature]]
+        }
+        if high_features:
+            for feature in FEATURE_COLUMNS:
+                high_features.setdefault(feature, 0)
+            complimented_feature = identify_compliment_feature_from_values(
+                high_features,
+                averages=settings.compliment_averages,
+                base_factors=settings.feature_base_factors,
+                feature_importances=settings.feature_importances,
+                settings=settings,
+            )
+            return 1, complimented_feature
+
+    return prediction, None
+
+# Number of features below their low factor of the average
+def count_low_features(values: Dict[str, int], settings: ComplimentSettings = None) -> int:
+    feature_averages = (settings or compliment_settings).feature_averages
+    return sum(
+        1 for feature in FEATURE_COLUMNS
+        if int(values[feature]) < feature_averages[f"average_{feature}"] * low_feature_factors[feature]
+    )
+
+# Cache lookups for each feature mapping: model-ordered keys, cached predictions (None if missing) and the missing positions
+def lookup_cached_predictions(values_list: List[Dict[str, int]]):
+    keys = [tuple(values[name] for name in model_feature_order) for values in values_list]
+    predictions = [prediction_cache.get(key) for key in keys]
+    missing = [index for index, prediction in enumerate(predictions) if prediction is None]
+    return keys, predictions, missing
+
+# Fills in the scored (prediction, truncated) pairs; rows cut off by ensemble_time_budget_ms are not cached,
+# so a later request for the same features gets the full forest's answer
+def store_predictions(keys, predictions, missing, scored):
+    for index, (prediction, truncated) in zip(missing, scored):
+        predictions[index] = prediction
+        if not truncated:
+            prediction_cache.put(keys[index], prediction)
+    return predictions
+
+# Model input for rows already in model_feature_order. The compact, student and early-exit models take the plain
+# array; a scikit-learn estimator fitted on a DataFrame checks column names, so it gets a DataFrame with them.
+def model_input(X):
+    if isinstance(loaded_model, (CompactForest, StudentModel, EarlyExitEnsemble)):
+        return X
+    return pd.DataFrame(X, columns=model_feature_order)
+
+# (prediction, truncated) for feature rows already in model_feature_order; truncated is True only for rows the
+# early-exit ensemble answered from a partial vote
+@timed("model_predict")
+def predict_rows_with_truncation(rows):
+    X = np.asarray(rows, dtype=np.int64)
+    if isinstance(loaded_model, EarlyExitEnsemble):
+        predictions, truncated = loaded_model.predict_with_truncation(X)
+        return list(zip(predictions.tolist(), truncated.tolist()))
+    return [(prediction, False) for prediction in loaded_model.predict(model_input(X)).tolist()]
+
+# Raw model predictions for feature rows already in model_feature_order
+def predict_rows(rows):
+    return [prediction for prediction, _ in predict_rows_with_truncation(rows)]
+
+# Model predictions for each feature mapping, served from the LRU cache where possible
+def predict_compliments(values_list: List[Dict[str, int]], use_cache=True):
+    if not use_cache:
+        return predict_rows([[values[name] for name in model_feature_order] for values in values_list])
+    keys, predictions, missing = lookup_cached_predictions(values_list)
+    if missing:
+        store_predictions(keys, predictions, missing, predict_rows_with_truncation([keys[index] for index in missing]))
+    return predictions
+
+# Same as predict_compliments, with cache misses scored by an awaitable returning (prediction, truncated) pairs
+# such as InferencePool.predict
+async def predict_compliments_async(values_list: List[Dict[str, int]], predict_rows):
+    keys, predictions, missing = lookup_cached_predictions(values_list)
+    if missing:
+        store_predictions(keys, predictions, missing, await predict_rows([keys[index] for index in missing]))
+    return predictions
+
 # Main compliment generator logic
-def generate_compliment(request_data:SocialNudgeRequest):
+@timed("generate_compliment")
+def generate_compliment(request_data:SocialNudgeRequest, use_cache=True):
+    values = extract_feature_values(request_data.social_metrics)
+    context = ComplimentContext(request_data, values)
+    result = decide_without_model(context)
+    if result is None:
+        prediction = predict_compliments([values], use_cache)[0]
+        result = apply_compliment_rules(request_data, values, prediction, context)
+    return count_compliment(result)
+
+# generate_compliment for the async request path; only the model call leaves the event loop
+async def generate_compliment_async(request_data: SocialNudgeRequest, predict_rows):
+    started = time.perf_counter()
+    values = extract_feature_values(request_data.social_metrics)
+    context = ComplimentContext(request_data, values)
+    result = decide_without_model(context)
+    if result is None:
+        prediction = (await predict_compliments_async([values], predict_rows))[0]
+        result = apply_compliment_rules(request_data, values, prediction, context)
+    result = count_compliment(result)
+    generate_compliment_timer.observe(time.perf_counter() - started)
+    return result
+
+# Compliments for many users with a single model call for the users the rule stages leave open, returned in request order
+def generate_compliments_batch(requests_data: List[SocialNudgeRequest]):
+    if not requests_data:
+        return []
+    values_list = [extract_feature_values(request_data.social_metrics) for request_data in requests_data]
+    contexts = [ComplimentContext(request_data, values) for request_data, values in zip(requests_data, values_list)]
+    results = [decide_without_model(context) for context in contexts]
+    undecided = [index for index, result in enumerate(results) if result is None]
+    if undecided:
+        predictions = predict_compliments([values_list[index] for index in undecided])
+        for index, prediction in zip(undecided, predictions):
+            results[index] = apply_compliment_rules(requests_data[index], values_list[index], prediction, contexts[index])
+    return [count_compliment(result) for result in results]
+
+# Count a compliment result by reason ("none" when no compliment was given)
+def count_compliment(result):
+    reason = result["compliment"]["reason"]
+    # The profile-improvement branch stores its reason as a one-element tuple
+    if isinstance(reason, tuple):
+        reason = reason[0] if reason else None
+    COMPLIMENTS.labels(reason or "none").inc()
+    return result
+
+# Values the compliment rules need for one request, each computed on first use and reused by later stages
+class ComplimentContext:
+    def __init__(self, request_data: SocialNudgeRequest, values: Dict[str, int]):
+        self.request_data = request_data
+        self.values = values
+        # Bound once so every stage of this request sees the same settings and tag snapshot
+        self.settings = compliment_settings
+        self.tag_index = popular_tag_index
+
+    @cached_property
+    def profile_improvement(self):
+        metrics = self.request_data.social_metrics
+        return metrics.profile_completeness - metrics.previous_profile_completeness
+
+    # check_compliment_cooldown, so last_compliment_generated is parsed once per request
+    @cached_property
+    def cooldown_allowed(self):
+        return check_compliment_cooldown(self.request_data.history.last_compliment_generated, self.settings)
+
+    # (1, feature) when a high feature overrides a 0 prediction, otherwise (0, None)
+    @cached_property
+    def override(self):
+        return override_prediction_from_values(self.values, 0, self.settings)
+
+    @cached_property
+    def low_feature_count(self):
+        return count_low_features(self.values, self.settings)
+
+    # True when identify_compliment_feature_from_values would find no feature at all
+    @cached_property
+    def all_below_low_marks(self):
+        feature_averages, feature_low_marks = self.settings.feature_averages, self.settings.feature_low_marks
+        return all(
+            self.values[feature] < feature_averages[f"average_{feature}"] * feature_low_marks[feature]
+            for feature in FEATURE_COLUMNS
+        )
+
+    @cached_property
+    def matched_tags(self):
+        return self.tag_index.matched(self.request_data.social_metrics.tags_followed)
+
+def empty_compliment():
+    return {"compliment": {"message": None, "reason": None, "priority": None}}
+
+# Every branch of apply_compliment_rules returns an empty compliment during the cooldown (or for an unreadable date)
+def cooldown_active(context: ComplimentContext) -> bool:
+    return not context.cooldown_allowed
+
+# No high feature to override a 0 and no profile improvement worth a compliment; a 1 then hits either the
+# three-low-features rule or finds no feature above its low mark. Either prediction ends without a compliment.
+def nothing_to_compliment(context: ComplimentContext) -> bool:
+    return (
+        context.override[0] == 0
+        and context.profile_improvement <= 10
+        and (context.low_feature_count >= 3 or context.all_below_low_marks)
+    )
+
+# Rule stages that settle a request without the model, cheapest first
+RULE_STAGES = (
+    ("cooldown", cooldown_active),
+    ("nothing_to_compliment", nothing_to_compliment),
+)
+compliment_stage_counters = {name: COMPLIMENT_STAGES.labels(name) for name in [name for name, _ in RULE_STAGES] + ["model"]}
+
+# The response when a rule stage settles it, otherwise None and the model has to be asked.
+# Counts each request under the stage that decided it ("model" when none did).
+def decide_without_model(context: ComplimentContext):
+    for name, stage in RULE_STAGES:
+        if stage(context):
+            compliment_stage_counters[name].inc()
+            return empty_compliment()
+    compliment_stage_counters["model"].inc()
+    return None
+
+# Apply the override, low-mark, tag and cooldown rules to one user's prediction
+def apply_compliment_rules(request_data: SocialNudgeRequest, values: Dict[str, int], prediction, context: ComplimentContext = None):
+    context = context or ComplimentContext(request_data, values)
     metrics = request_data.social_metrics
-    last_compliment_generated = request_data.history.last_compliment_generated
-    social_metrics_received = [[
-        metrics.karma_growth,
-        metrics.helpful_answers,
-        metrics.quizzes_attempted,
-        metrics.upvotes,
-        metrics.consecutive_active_days,
-    ]]
-    df = pd.DataFrame(social_metrics_received, columns=[
-        "karma_growth",
-        "helpful_answers",
-        "quizzes_attempted",
-        "upvotes",
-        "consecutive_active_days",
-    ])
-    
-    filtered_df = df[loaded_model.feature_names_in_]
-    prediction = loaded_model.predict(filtered_df)[0]
+    settings = context.settings
     complimented_feature = None
     high_feature = None
-    profile_improvement = metrics.profile_completeness - metrics.previous_profile_completeness
-    matched_tags = [tag for tag in metrics.tags_followed if tag in popular_tags]
+    profile_improvement = context.profile_improvement
+    tag_index = context.tag_index
+    matched_tags = context.matched_tags
     compliment=OutputCompliment()
 
     if prediction == 0:
-        prediction, high_feature = override_prediction_if_important_feature_high(df, prediction)      
-        if prediction==1 and not check_compliment_cooldown(last_compliment_generated):
+        prediction, high_feature = context.override
+        if prediction==1 and not context.cooldown_allowed:
             return{
                 "compliment":{
                     "message":compliment.message,
@@ -267,10 +645,10 @@ def generate_compliment(request_data:SocialNudgeRequest):
                     "priority":compliment.priority
                 }
             }
-        elif prediction==1 and check_compliment_cooldown(last_compliment_generated):
+        elif prediction==1 and context.cooldown_allowed:
             compliment.message=compliment_generator(high_feature)
             compliment.reason=high_feature
-            compliment.priority=calculate_priority(high_feature,metrics,matched_tags,profile_improvement)
+            compliment.priority=calculate_priority(high_feature,metrics,matched_tags,profile_improvement,settings)
             return {
                 "compliment": {
                     "message":compliment.message, 
@@ -279,10 +657,10 @@ def generate_compliment(request_data:SocialNudgeRequest):
                 }
             }
         elif prediction==0 and  profile_improvement > 10:
-            if check_compliment_cooldown(last_compliment_generated):
+            if context.cooldown_allowed:
                 compliment.message=compliment_generator("profile_completeness")
                 compliment.reason="profile improvement"
-                compliment.priority = calculate_priority("profile_completeness", metrics, matched_tags, profile_improvement)
+                compliment.priority = calculate_priority("profile_completeness", metrics, matched_tags, profile_improvement, settings)
                 return {
                     "compliment": {
                         "message": compliment.message,
@@ -290,7 +668,7 @@ def generate_compliment(request_data:SocialNudgeRequest):
                         "priority":compliment.priority
                     }
                 }
-            elif not check_compliment_cooldown(last_compliment_generated):
+            elif not context.cooldown_allowed:
                 return{
                 "compliment":{
                     "message":compliment.message,
@@ -308,22 +686,12 @@ def generate_compliment(request_data:SocialNudgeRequest):
             }
                           
     if prediction == 1:
-        low_features=0
-        if int(df["karma_growth"][0]) < feature_averages["average_karma_growth"] * 0.4 :
-            low_features+=1
-        if int(df["helpful_answers"][0]) < feature_averages["average_helpful_answers"] * 0.4:
-            low_features+=1
-        if int(df["quizzes_attempted"][0]) < feature_averages["average_quizzes_attempted"] * 0.4 :
-            low_features+=1
-        if int(df["upvotes"][0]) < feature_averages["average_upvotes"] * 0.14 :
-            low_features+=1
-        if int(df["consecutive_active_days"][0]) < feature_averages["average_consecutive_active_days"] * 0.3:
-            low_features+=1
+        low_features=context.low_feature_count
         if low_features>=3:
-            if profile_improvement>10 and check_compliment_cooldown(last_compliment_generated):
+            if profile_improvement>10 and context.cooldown_allowed:
                 compliment.message=compliment_generator("profile_completeness")
                 compliment.reason="Profile improvement"
-                compliment.priority=calculate_priority("profile_completeness", metrics, matched_tags, profile_improvement)
+                compliment.priority=calculate_priority("profile_completeness", metrics, matched_tags, profile_improvement, settings)
                 return {
                 "compliment": {
                     "message": compliment.message,
@@ -342,24 +710,18 @@ def generate_compliment(request_data:SocialNudgeRequest):
                     }
             
           
-        complimented_feature= identify_compliment_feature(
-            user_df=df,
-            averages={
-                "karma_growth": feature_averages["average_karma_growth"],
-                "helpful_answers": feature_averages["average_helpful_answers"],
-                "quizzes_attempted": feature_averages["average_quizzes_attempted"],
-                "upvotes": feature_averages["average_upvotes"],
-                "consecutive_active_days": feature_averages["average_consecutive_active_days"],
-                "tag_match": 0,
-            },
-            base_factors =feature_base_factors ,
-            feature_importances=feature_importances,
+        complimented_feature= identify_compliment_feature_from_values(
+            values,
+            averages=settings.compliment_averages,
+            base_factors =settings.feature_base_factors ,
+            feature_importances=settings.feature_importances,
+            settings=settings,
         )
         if profile_improvement > 40 :
             complimented_feature = "profile_completeness"
             compliment.message=compliment_generator(complimented_feature)
             compliment.reason="Profile improvement",
-            compliment.priority= calculate_priority(complimented_feature, metrics, matched_tags, profile_improvement)
+            compliment.priority= calculate_priority(complimented_feature, metrics, matched_tags, profile_improvement, settings)
         result = {
                 "compliment": {
                     "message": compliment.message,
@@ -369,12 +731,11 @@ def generate_compliment(request_data:SocialNudgeRequest):
             }
         if complimented_feature:
             if complimented_feature == "helpful_answers" and metrics.tags_followed:
-                matched_tags = [tag for tag in metrics.tags_followed if tag in popular_tags]
                 if matched_tags:
-                    top_tag = max(matched_tags, key=lambda t: popular_tags[t])
+                    top_tag = tag_index.best(matched_tags)
                     compliment.message=compliment_generator(complimented_feature, tag=top_tag)
                     compliment.reason=f"{complimented_feature} + tag match"
-                    compliment.priority=calculate_priority(complimented_feature, metrics, matched_tags, profile_improvement)
+                    compliment.priority=calculate_priority(complimented_feature, metrics, matched_tags, profile_improvement, settings)
                     result["compliment"] = {
                         "message": compliment.message,
                         "reason": compliment.reason ,
@@ -383,7 +744,7 @@ def generate_compliment(request_data:SocialNudgeRequest):
                 else:
                     compliment.message=compliment_generator("helpful_answers_but_no_tag_match")
                     compliment.reason=complimented_feature
-                    compliment.priority=calculate_priority(complimented_feature, metrics, matched_tags, profile_improvement)
+                    compliment.priority=calculate_priority(complimented_feature, metrics, matched_tags, profile_improvement, settings)
                     result["compliment"]={
                         
                         "message":compliment.message,
@@ -402,7 +763,7 @@ def generate_compliment(request_data:SocialNudgeRequest):
                 if complimented_feature in compliment_features:
                     compliment.message=compliment_generator(complimented_feature)
                     compliment.reason=complimented_feature
-                    compliment.priority=calculate_priority(complimented_feature, metrics, matched_tags, profile_improvement)
+                    compliment.priority=calculate_priority(complimented_feature, metrics, matched_tags, profile_improvement, settings)
                     result["compliment"] = {
                         "message": compliment.message,
                         "reason": compliment.reason,
@@ -410,7 +771,7 @@ def generate_compliment(request_data:SocialNudgeRequest):
                     }
                 
 
-            return result if check_compliment_cooldown(last_compliment_generated) else  {"compliment":{"message":None,"reason":None,"priority":None}}
+            return result if context.cooldown_allowed else  {"compliment":{"message":None,"reason":None,"priority":None}}
         return {
             "compliment":{
                 "message":compliment.message,
@@ -421,19 +782,41 @@ def generate_compliment(request_data:SocialNudgeRequest):
         
 # Update tags in config
 def update_tags(data: TagUpdate):
-    global popular_tags, config
     try:
-        logger.debug(f"Received request to update tags: {data.popular_tags}")
-        previous_popular_tags = popular_tags.copy()
-        popular_tags = data.popular_tags
-        config["popular_tags"] = popular_tags
-        save_config(config)
-        logger.info("Popular tags updated and saved to config.json.")
+        logger.debug("Received request to update tags: %s", data.popular_tags)
+        previous_popular_tags = dict(config_store.snapshot().get("popular_tags", {}))
+        # Takes effect immediately through prepare_settings; config.json is written in the background
+        snapshot = config_store.update({"popular_tags": data.popular_tags})
+        logger.info("Popular tags updated in config version %s.", snapshot.version)
         return {
             "status": "updated",
             "previous_popular_tags": previous_popular_tags,
-            "updated_popular_tags": popular_tags,
+            "updated_popular_tags": data.popular_tags,
+        }
+    except Exception as e:
+        logging.error("Error while updating popular tags: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to update popular tags due to internal error.")
+
+# Apply a TagDelta to the current popular tags without resending the whole map
+def update_tags_delta(data: TagDelta):
+    changed = {}
+    def apply_delta(snapshot):
+        global _pending_tag_delta
+        popular_tags = snapshot.get("popular_tags", {})
+        updated, delta_changed = apply_tag_delta(popular_tags, data.increments, data.expire)
+        changed.update(delta_changed)
+        # prepare_tag_index applies just these changes to the current index instead of rebuilding it
+        _pending_tag_delta = (popular_tags, delta_changed)
+        return {"popular_tags": updated}
+    try:
+        # Only popular_tags is copied into the new version; config.json is rewritten once per burst of deltas
+        snapshot = config_store.update_from(apply_delta)
+        logger.info("Applied tag delta to %s tags in config version %s.", len(changed), snapshot.version)
+        return {
+            "status": "updated",
+            "changed_tags": changed,
+            "tag_count": len(popular_tag_index),
         }
     except Exception as e:
-        logging.error(f"Error while updating popular tags: {str(e)}")
+        logger.error("Error while applying popular tag delta: %s", e)
         raise HTTPException(status_code=500, detail="Failed to update popular tags due to internal error.")
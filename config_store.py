@@ -0,0 +1,223 @@
+import os
+import json
+import copy
+import logging
+import threading
+from pathlib import Path
+from types import MappingProxyType
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+# One immutable version of config.json; handlers keep the reference they read for the whole request
+class ConfigSnapshot:
+    __slots__ = ("version", "data", "_raw")
+
+    def __init__(self, version, data):
+        self.version = version
+        self._raw = copy.deepcopy(data)
+        self.data = _freeze(self._raw)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __bool__(self):
+        return bool(self.data)
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    # Mutable deep copy, e.g. as the base of the next version
+    def to_dict(self):
+        return copy.deepcopy(self._raw)
+
+    # Next version with the top-level keys in changes replaced. Only the new values are copied and frozen;
+    # the others are shared with this snapshot, which is safe because neither version is ever mutated.
+    def replace(self, version, changes):
+        raw = dict(self._raw)
+        data = dict(self.data)
+        for key, value in changes.items():
+            raw[key] = copy.deepcopy(value)
+            data[key] = _freeze(raw[key])
+        snapshot = object.__new__(ConfigSnapshot)
+        snapshot.version = version
+        snapshot._raw = raw
+        snapshot.data = MappingProxyType(data)
+        return snapshot
+
+# Holds the current config snapshot. Edits to config.json are picked up by a watcher thread, and
+# update() swaps in a new version immediately while a writer thread persists it with an atomic rename.
+# The writer waits write_delay_seconds after the first unsaved update, so a burst of updates costs one write.
+class ConfigStore:
+    def __init__(self, path, write_delay_seconds=0.5):
+        self.path = Path(path)
+        self.write_delay_seconds = write_delay_seconds
+        self.current = None
+        self.persisted_version = 0
+        self._mtime = None
+        self._subscribers = []
+        self._lock = threading.RLock()
+        self._write_requested = threading.Condition()
+        self._pending_write = False
+        self._flush_requested = False
+        self._writer = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # prepare(snapshot) is called with every new snapshot before it becomes current, on the thread swapping it in.
+    # It builds (and so validates) whatever it derives from the snapshot and returns a function that publishes
+    # the result, or None. Nothing is published unless every subscriber prepared successfully, so a snapshot
+    # one of them rejects, e.g. for a missing key, leaves the current version and all derived settings in place.
+    def subscribe(self, prepare):
+        self._subscribers.append(prepare)
+
+    # Current snapshot, reading config.json on first use
+    def snapshot(self):
+        current = self.current
+        return current if current is not None else self.load()
+
+    @timed("config_load")
+    def load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path, "r") as f:
+                logger.info("Loading config from %s", self.path)
+                data = json.load(f)
+        except FileNotFoundError:
+            logger.error("Config file not found: %s", self.path)
+            raise FileNotFoundError(f"Config file not found: {self.path}")
+        except json.JSONDecodeError:
+            logger.error("Invalid JSON format in config file: %s", self.path)
+            raise ValueError(f"Invalid JSON format in config file: {self.path}")
+        with self._lock:
+            self._mtime = mtime
+            snapshot = self._swap(ConfigSnapshot(self.current.version + 1 if self.current else 1, data))
+            self.persisted_version = snapshot.version
+        return snapshot
+
+    def _swap(self, snapshot):
+        publishers = [prepare(snapshot) for prepare in self._subscribers]
+        self.current = snapshot
+        for publish in publishers:
+            if publish is not None:
+                publish()
+        return snapshot
+
+    # New snapshot with the top-level keys in changes replaced; written to disk in the background
+    def update(self, changes):
+        return self.update_from(lambda snapshot: changes)
+
+    # Like update, with the changes computed by function from the current snapshot under the lock, so
+    # concurrent calls never lose each other's edits. Unchanged keys are shared with the previous version.
+    def update_from(self, function):
+        with self._lock:
+            current = self.snapshot()
+            snapshot = self._swap(current.replace(current.version + 1, function(current)))
+        self._request_write()
+        return snapshot
+
+    # Like update_from, with function editing a mutable deep copy of the current data
+    def modify(self, function):
+        with self._lock:
+            data = self.snapshot().to_dict()
+            function(data)
+            snapshot = self._swap(ConfigSnapshot(self.current.version + 1, data))
+        self._request_write()
+        return snapshot
+
+    def _request_write(self):
+        with self._write_requested:
+            self._pending_write = True
+            self._write_requested.notify_all()
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._write_behind, name="config-writer", daemon=True)
+            self._writer.start()
+
+    def _write_behind(self):
+        while True:
+            with self._write_requested:
+                while not self._pending_write:
+                    self._write_requested.wait()
+                # Updates arriving during the delay are saved by the same write; flush() cuts the delay short
+                self._write_requested.wait_for(lambda: self._flush_requested, self.write_delay_seconds)
+                self._pending_write = False
+                self._flush_requested = False
+            self.persist(self.current)
+
+    # Write snapshot to a temp file next to config.json and rename it over the original
+    @timed("config_persist")
+    def persist(self, snapshot):
+        temp_path = self.path.with_name(f".{self.path.name}.tmp")
+        try:
+            with open(temp_path, "w") as f:
+                # Snapshots never change, so the raw data is dumped without copying it first
+                json.dump(snapshot._raw, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            # Rename and record the new mtime under the lock the watcher checks with, so it can never see our own
+            # write as an external edit and reload this (possibly already superseded) version over the current one
+            with self._lock:
+                os.replace(temp_path, self.path)
+                self._mtime = os.stat(self.path).st_mtime_ns
+                self.persisted_version = max(self.persisted_version, snapshot.version)
+        except OSError as e:
+            logger.error("Failed to save config version %s: %s", snapshot.version, e)
+            return False
+        with self._write_requested:
+            self._write_requested.notify_all()
+        logger.info("Saved config version %s to %s", snapshot.version, self.path)
+        return True
+
+    # Block until every update so far is on disk (used on shutdown and in tests)
+    def flush(self, timeout=5):
+        with self._write_requested:
+            if self._pending_write:
+                self._flush_requested = True
+                self._write_requested.notify_all()
+            return self._write_requested.wait_for(
+                lambda: self.current is None or self.persisted_version >= self.current.version, timeout
+            )
+
+    def reload_if_changed(self):
+        try:
+            with self._lock:
+                if os.stat(self.path).st_mtime_ns == self._mtime:
+                    return False
+                self.load()
+            return True
+        # KeyError and TypeError come from a subscriber rejecting the new snapshot
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error("Failed to reload config from %s, keeping version %s: %s", self.path, self.current.version if self.current else None, e)
+            return False
+
+    def _watch(self, interval_seconds):
+        while not self._stop.wait(interval_seconds):
+            # Anything reload_if_changed does not expect is logged, not allowed to end the watcher
+            try:
+                self.reload_if_changed()
+            except Exception:
+                logger.exception("Config watcher failed to check %s", self.path)
+
+    def start_watching(self, interval_seconds=5):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, args=(interval_seconds,), name="config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+config_store = ConfigStore(Path(__file__).parent / "config.json")
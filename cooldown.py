@@ -0,0 +1,15 @@
+from datetime import datetime, timedelta
+
+# End of the window in which both the compliment and the nudge cooldown are active, as a timestamp,
+# or None when either is not active now. Matches check_compliment_cooldown and nudge_cooldown_active:
+# a cooldown of n days that started on date d is active while today < d + n days.
+def cooldown_window_end(last_compliment, last_nudge, compliment_days, nudge_days, today=None):
+    today = today or datetime.today()
+    try:
+        end = min(
+            datetime.strptime(last_compliment, "%Y-%m-%d") + timedelta(days=compliment_days),
+            datetime.strptime(last_nudge, "%Y-%m-%d") + timedelta(days=nudge_days),
+        )
+    except (TypeError, ValueError):
+        return None
+    return end.timestamp() if today < end else None
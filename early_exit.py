@@ -0,0 +1,90 @@
+import time
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier
+from compact_model import CompactForest
+from metrics import ENSEMBLE_TREES, ENSEMBLE_BUDGET_EXHAUSTED
+
+# A row is decided only when its lead beats the remaining trees by more than this, so float rounding in the sums cannot flip it
+DECISION_EPSILON = 1e-9
+
+# Metric children used on every predict call
+trees_evaluated = ENSEMBLE_TREES.labels()
+budget_exhausted = ENSEMBLE_BUDGET_EXHAUSTED.labels()
+
+# Wraps a forest (sklearn or CompactForest) and evaluates its trees chunk_trees at a time, in order, summing class
+# probabilities the way predict_proba does. Each tree adds at most 1 to the gap between two classes, so a row whose
+# leading class is ahead by more than the number of trees left is answered without evaluating them: the result is the
+# same as the full forest's. If time_budget_ms is set and runs out, open rows are answered from the trees evaluated so far.
+class EarlyExitEnsemble:
+    def __init__(self, model, chunk_trees=16, time_budget_ms=0):
+        self.model = model
+        self.chunk_trees = max(1, int(chunk_trees))
+        self.time_budget_ms = time_budget_ms
+        self.feature_names_in_ = model.feature_names_in_
+        self.classes_ = model.classes_
+        self.n_trees = len(model.tree_offsets) if isinstance(model, CompactForest) else len(model.estimators_)
+
+    # Only forests whose predict_proba is the plain mean of their trees' probabilities give exact results here;
+    # boosting and bagging ensembles (AdaBoost, GradientBoosting, Bagging with feature subsets) do not
+    @staticmethod
+    def supports(model):
+        if isinstance(model, CompactForest):
+            return True
+        return isinstance(model, (RandomForestClassifier, ExtraTreesClassifier)) and getattr(model, "n_outputs_", 1) == 1
+
+    # Add the class probabilities of trees [start, stop) to sums, one tree at a time
+    def _add_trees(self, X, start, stop, sums):
+        if isinstance(self.model, CompactForest):
+            leaves = self.model.apply(X, slice(start, stop))
+            for column in range(leaves.shape[1]):
+                sums += self.model.leaf_value[leaves[:, column]]
+        else:
+            for estimator in self.model.estimators_[start:stop]:
+                sums += estimator.predict_proba(X, check_input=False)
+
+    # Predictions, trees evaluated per row, and a mask of the rows cut off by the time budget
+    def _predict(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        sums = np.zeros((X.shape[0], len(self.classes_)), dtype=np.float64)
+        evaluated = np.zeros(X.shape[0], dtype=np.int64)
+        open_rows = np.arange(X.shape[0])
+        deadline = time.perf_counter() + self.time_budget_ms / 1000 if self.time_budget_ms > 0 else None
+        for start in range(0, self.n_trees, self.chunk_trees):
+            stop = min(start + self.chunk_trees, self.n_trees)
+            open_sums = sums[open_rows]
+            self._add_trees(X[open_rows], start, stop, open_sums)
+            sums[open_rows] = open_sums
+            evaluated[open_rows] = stop
+            if len(self.classes_) > 1:
+                ordered = np.sort(open_sums, axis=1)
+                open_rows = open_rows[ordered[:, -1] - ordered[:, -2] <= self.n_trees - stop + DECISION_EPSILON]
+            else:
+                open_rows = open_rows[:0]
+            if not open_rows.size:
+                break
+            if deadline is not None and time.perf_counter() >= deadline and stop < self.n_trees:
+                break
+        # Rows still open after the last chunk were cut off unless every tree was evaluated for them
+        truncated = np.zeros(X.shape[0], dtype=bool)
+        truncated[open_rows] = evaluated[open_rows] < self.n_trees
+        # Divided like predict_proba so fully evaluated rows break ties exactly as the wrapped model does
+        predictions = self.classes_.take(np.argmax(sums / self.n_trees, axis=1), axis=0)
+        return predictions, evaluated, truncated
+
+    # Predictions, trees evaluated per row, and how many rows were cut off by the time budget
+    def predict_with_counts(self, X):
+        predictions, evaluated, truncated = self._predict(X)
+        return predictions, evaluated, int(np.count_nonzero(truncated))
+
+    # Predictions and a mask of the rows answered from a partial vote; those may differ from the full forest
+    def predict_with_truncation(self, X):
+        predictions, evaluated, truncated = self._predict(X)
+        for count in evaluated.tolist():
+            trees_evaluated.observe(count)
+        cut_off = int(np.count_nonzero(truncated))
+        if cut_off:
+            budget_exhausted.inc(cut_off)
+        return predictions, truncated
+
+    def predict(self, X):
+        return self.predict_with_truncation(X)[0]
@@ -0,0 +1,151 @@
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+from metrics import muted
+
+logger = logging.getLogger(__name__)
+
+# Sample request exercised by the compliment and nudge self-tests
+SELF_TEST_PAYLOAD = {
+    "user_id": "stu_8901",
+    "buddies": [
+        {
+            "buddy_id": "stu_7093",
+            "last_interaction_days": 7,
+            "messages_sent": 1,
+            "karma_change_7d": -10,
+            "quizzes_attempted": 0
+        },
+        {
+            "buddy_id": "stu_7220",
+            "last_interaction_days": 1,
+            "messages_sent": 4,
+            "karma_change_7d": 25,
+            "quizzes_attempted": 2
+        }
+    ],
+    "social_metrics": {
+        "karma_growth": 1666,
+        "profile_completeness": 85,
+        "previous_profile_completeness": 88,
+        "helpful_answers": 20888,
+        "tag_match": [],
+        "consecutive_active_days": 12,
+        "quizzes_attempted": 4,
+        "challenges_attempted": 4,
+        "upvotes": 121
+    },
+    "history": {
+        "last_compliment_generated": "2025-05-15",
+        "last_buddy_nudge": "2024-07-14"
+    }
+}
+
+# Runs the deep self-tests on a background interval and keeps the latest results for probes to read
+class SelfTestRunner:
+    def __init__(self, checks, interval_seconds=60):
+        self.checks = checks
+        self.interval_seconds = interval_seconds
+        self._results = None
+        self._checked_monotonic = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        checks = {}
+        status = "ok"
+        for name, check in self.checks.items():
+            started = time.perf_counter()
+            try:
+                # Probe traffic is not user traffic: keep it out of the request and compliment metrics
+                with muted():
+                    detail = check() or "works"
+                check_status = "ok"
+            except Exception as e:
+                detail = f"error: {str(e)}"
+                check_status = "fail"
+                status = "fail"
+                logger.warning("Self-test '%s' failed: %s", name, e)
+            checks[name] = {
+                "status": check_status,
+                "detail": detail,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            }
+        # Swap in the whole result at once so readers never see a half-finished run
+        self._results = {
+            "status": status,
+            "checked_at": datetime.now(timezone.utc).isoformat(),
+            "checks": checks,
+        }
+        self._checked_monotonic = time.monotonic()
+        return self._results
+
+    # Latest results with their age, or None before the first run has finished
+    def results(self):
+        results, checked = self._results, self._checked_monotonic
+        if results is None:
+            return None
+        return {**results, "age_seconds": round(time.monotonic() - checked, 1)}
+
+    # Results older than a few intervals mean the background thread is stuck or dead
+    def is_stale(self, results):
+        return results["age_seconds"] > self.interval_seconds * 3
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval_seconds)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="self-test", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+# Checks the in-memory snapshot; config.json itself is only read by the config store's watcher
+def check_config():
+    from config_store import config_store
+    if not config_store.current:
+        raise ValueError("Config is empty or has not been loaded")
+    return "loaded"
+
+def check_templates_file(template_path=Path(__file__).parent / "templates.json"):
+    with open(template_path, "r", encoding="utf-8") as f:
+        json.load(f)
+    return "loaded"
+
+def check_model():
+    from compliment_generator import loaded_model, build_feature_matrix, extract_feature_values, model_input, social_metrics
+    metrics = social_metrics(**SELF_TEST_PAYLOAD["social_metrics"])
+    loaded_model.predict(model_input(build_feature_matrix([extract_feature_values(metrics)])))
+    return "loaded"
+
+def check_complimenting_logic():
+    from compliment_generator import generate_compliment, SocialNudgeRequest
+    # Scored past the prediction cache so the probe neither fills it nor moves its hit and miss counts
+    generate_compliment(SocialNudgeRequest(**SELF_TEST_PAYLOAD), use_cache=False)
+    return "works"
+
+def check_nudging_logic():
+    from nudge_engine import process_buddies, BuddyPayload
+    process_buddies(BuddyPayload(**SELF_TEST_PAYLOAD))
+    return "works"
+
+# Deep checks run by the background self-test, keyed by the name reported in /health
+def default_self_tests():
+    return {
+        "config": check_config,
+        "templates": check_templates_file,
+        "model": check_model,
+        "complimenting_logic": check_complimenting_logic,
+        "nudging_logic": check_nudging_logic,
+    }
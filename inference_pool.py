@@ -0,0 +1,88 @@
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+# Includes the hand-off to and from the pool process, unlike the in-process model_predict stage
+pool_predict_timer = stage_timer("model_predict_pool")
+
+# The pool starts after warm-up, when the serving process already runs the event loop, the config and template
+# watchers, the log listener and the metrics writer. forkserver forks workers from a separate single-threaded
+# server instead, so they cannot inherit a lock one of those threads held at the time of the fork.
+DEFAULT_START_METHOD = "forkserver"
+
+# Imported once by the fork server; inference_worker_preload loads the model there, so pool processes share it
+FORKSERVER_PRELOAD = ["inference_worker_preload"]
+
+class PoolSaturated(Exception):
+    pass
+
+# True in a pool process that had to load its own copy of the model
+_loaded_own_model = False
+
+# Runs in each pool process. Children of the fork server or of a fork inherit the model already loaded; spawned
+# ones (or any, if the fork server failed to preload it) load their own copy.
+def _init_worker():
+    global _loaded_own_model
+    import compliment_generator
+    if compliment_generator.loaded_model is None:
+        compliment_generator.load_settings()
+        compliment_generator.load_model()
+        _loaded_own_model = True
+
+def _worker_loaded_own_model():
+    return _loaded_own_model
+
+def _predict_rows(rows):
+    import compliment_generator
+    return compliment_generator.predict_rows_with_truncation(rows)
+
+# Process pool for model scoring so CPU-heavy predict calls do not hold the GIL of the serving process
+class InferencePool:
+    def __init__(self, workers=0, queue_depth=0, start_method=DEFAULT_START_METHOD):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_depth = queue_depth
+        self.start_method = start_method
+        self.in_flight = 0
+        self._executor = None
+
+    @property
+    def enabled(self):
+        return self._executor is not None
+
+    def start(self):
+        if self._executor is not None:
+            return
+        method = self.start_method if self.start_method in multiprocessing.get_all_start_methods() else "spawn"
+        context = multiprocessing.get_context(method)
+        if method == "forkserver":
+            context.set_forkserver_preload(FORKSERVER_PRELOAD)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+        )
+        logger.info("Inference pool started with %s %s workers, queue depth %s", self.workers, method, self.queue_depth or 'unbounded')
+
+    # Score feature rows in a pool process; raises PoolSaturated when queue_depth requests are already waiting
+    async def predict(self, rows):
+        if self.queue_depth and self.in_flight >= self.queue_depth:
+            raise PoolSaturated(f"{self.in_flight} inference requests already queued")
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, _predict_rows, rows)
+        finally:
+            self.in_flight -= 1
+            pool_predict_timer.observe(time.perf_counter() - started)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
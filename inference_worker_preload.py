@@ -0,0 +1,18 @@
+import gc
+import logging
+import compliment_generator
+
+logger = logging.getLogger(__name__)
+
+# Imported once by the inference pool's fork server (FORKSERVER_PRELOAD). The settings and model are loaded here,
+# so every pool process forked from the server maps the same model pages copy-on-write instead of loading its own.
+try:
+    compliment_generator.load_settings()
+    compliment_generator.load_model()
+except Exception as e:
+    # An exception other than ImportError would stop the fork server; pool processes then load the model themselves
+    logger.error("Fork server could not preload the model, pool processes will load their own: %s", e)
+
+# Keep the collector from writing to the shared pages, as serve.py does before forking its workers
+gc.collect()
+gc.freeze()
@@ -0,0 +1,176 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import queue
+import random
+import atexit
+import logging
+import logging.handlers
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+# Set per request by main's RequestIdMiddleware; copied into every record logged while handling it
+request_id_var = ContextVar("request_id", default=None)
+
+# High-volume messages, keyed by their %-style template. Sampled messages are kept with that probability,
+# rate-limited ones at most that many times per second per process. log_sample_rates / log_rate_limits_per_second
+# in config.json override these.
+DEFAULT_SAMPLE_RATES = {
+    "Processing buddies for user: %s": 0.01,
+}
+DEFAULT_RATE_LIMITS = {
+    "Nudge cooldown active for user %s. Skipping...": 10,
+}
+
+# Attributes every LogRecord has; anything else on a record came in through extra= and is written as a field
+_STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id", "sample_rate"}
+
+def safe_request_id(value):
+    cleaned = re.sub(r"[^A-Za-z0-9_.-]", "", value or "")[:64]
+    return cleaned or uuid.uuid4().hex
+
+# One JSON object per line; the message is only formatted here, on the listener thread
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        sample_rate = getattr(record, "sample_rate", None)
+        if sample_rate is not None:
+            entry["sample_rate"] = sample_rate
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+# Drops most of the configured high-volume messages before they are queued. Matching is on record.msg,
+# the unformatted template, so rejected records are never formatted at all.
+class SamplingFilter(logging.Filter):
+    def __init__(self, sample_rates=None, rate_limits=None):
+        super().__init__()
+        self.sample_rates = dict(DEFAULT_SAMPLE_RATES if sample_rates is None else sample_rates)
+        self.rate_limits = dict(DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits)
+        self.dropped = 0
+        self._windows = {}
+        # Own generator so sampling does not shift the module-level random used for template picks
+        self._random = random.Random()
+
+    def filter(self, record):
+        template = record.msg
+        sample_rate = self.sample_rates.get(template)
+        if sample_rate is not None:
+            if self._random.random() >= sample_rate:
+                self.dropped += 1
+                return False
+            record.sample_rate = sample_rate
+        limit = self.rate_limits.get(template)
+        if limit is not None:
+            second = int(time.monotonic())
+            window = self._windows.get(template)
+            if window is None or window[0] != second:
+                self._windows[template] = [second, 1]
+            elif window[1] >= limit:
+                self.dropped += 1
+                return False
+            else:
+                window[1] += 1
+        return True
+
+# Queues records without formatting them; when the queue is full the record is dropped rather than blocking
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record.request_id = request_id_var.get()
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class LoggingPipeline:
+    def __init__(self, stream=None, queue_size=10000):
+        self.stream = stream
+        self.queue_size = queue_size
+        self.filter = SamplingFilter()
+        self.handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+        self.handler.addFilter(self.filter)
+        self.listener = None
+
+    def start(self):
+        output = logging.StreamHandler(self.stream or sys.stdout)
+        output.setFormatter(JsonFormatter())
+        self.listener = logging.handlers.QueueListener(self.handler.queue, output, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    # The listener thread does not survive fork; give the child a fresh queue and thread
+    def restart_after_fork(self):
+        self.listener = None
+        self.handler.queue = queue.Queue(maxsize=self.queue_size)
+        self.start()
+
+_pipeline = None
+
+# Route all logging through the queue to JSON lines on stdout (or stream). Safe to call more than once.
+def setup_logging(level="INFO", stream=None, queue_size=10000):
+    global _pipeline
+    root = logging.getLogger()
+    if _pipeline is None:
+        _pipeline = LoggingPipeline(stream, queue_size)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_pipeline.handler)
+        _pipeline.start()
+    root.setLevel(level)
+    return _pipeline
+
+# Apply level, sampling and rate-limit settings from a config snapshot
+def configure_logging(settings):
+    if _pipeline is None:
+        return
+    logging.getLogger().setLevel(settings.get("log_level", "INFO"))
+    _pipeline.filter.sample_rates = dict(settings.get("log_sample_rates", DEFAULT_SAMPLE_RATES))
+    _pipeline.filter.rate_limits = dict(settings.get("log_rate_limits_per_second", DEFAULT_RATE_LIMITS))
+
+# Config store subscriber: rejects an unknown log_level before the snapshot is published, then applies it
+def prepare_logging(settings):
+    level = settings.get("log_level", "INFO")
+    if not isinstance(level, int) and not isinstance(logging.getLevelName(level), int):
+        raise ValueError(f"Unknown log_level: {level}")
+    return lambda: configure_logging(settings)
+
+# Flush what is queued and detach the pipeline from the root logger
+def stop_logging():
+    global _pipeline
+    if _pipeline is None:
+        return
+    _pipeline.stop()
+    logging.getLogger().removeHandler(_pipeline.handler)
+    _pipeline = None
+
+def _restart_in_child():
+    if _pipeline is not None:
+        _pipeline.restart_after_fork()
+
+os.register_at_fork(after_in_child=_restart_in_child)
+atexit.register(stop_logging)
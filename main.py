@@ -1,35 +1,149 @@
-import json
-import pickle
+import os
+import time
 from pathlib import Path
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
-from nudge_engine import process_buddies,load_config
-from nudge_engine import BuddyPayload
-from compliment_generator import update_tags,generate_compliment
-from compliment_generator import SocialNudgeRequest,TagUpdate
+from contextlib import asynccontextmanager
+from typing import List
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from nudge_engine import process_buddies,nudge_cooldown_active
+from nudge_engine import BuddyStreamHeader,StreamingBuddySelector
+from compliment_generator import update_tags,update_tags_delta,generate_compliment,generate_compliments_batch,generate_compliment_async
+from compliment_generator import SocialNudgeRequest,TagUpdate,TagDelta,BuddyMetrics
+from memory_stats import process_memory
+from health import SelfTestRunner, default_self_tests
+from startup import warm_up
+from template_registry import template_store
+from config_store import config_store
+from inference_pool import InferencePool, PoolSaturated
+from micro_batcher import MicroBatcher
+from metrics import MultiProcessExporter, REQUEST_SECONDS, REQUESTS_IN_FLIGHT
+from profiling import RequestProfiler
+from cooldown import cooldown_window_end
+from logging_pipeline import setup_logging, prepare_logging, request_id_var, safe_request_id
+import compliment_generator
+import nudge_engine
 
 MODEL_VERSION="1.0.0"
 
-app = FastAPI()
+# JSON log lines written by a background thread; level and sampling follow config.json, including reloads
+setup_logging()
+config_store.subscribe(prepare_logging)
 
-@app.post("/generate-social-nudges")
-def generateSocialNudges(request_data: SocialNudgeRequest):
-    compliment_output = generate_compliment(request_data)
+# How long a request may wait for warm-up to finish before it is rejected with 503
+READINESS_WAIT_SECONDS = 5
 
-    # Converting each buddy to a dictionary
-    buddies_dicts = [buddy.model_dump() for buddy in request_data.buddies]
-    
-    # Converting history to dictionary
-    history_dict = request_data.history.model_dump()
+self_test_runner = SelfTestRunner(default_self_tests())
 
-    # Constructing BuddyPayload with plain dicts
-    buddy_payload = BuddyPayload(
-        user_id=request_data.user_id,
-        buddies=buddies_dicts,
-        history=history_dict
-    )
+# Started after warm-up when inference_mode is "process_pool"
+inference_pool = InferencePool()
+
+# Model scoring for the async path: the inference pool when running, otherwise a worker thread
+async def score_rows(rows):
+    if inference_pool.enabled:
+        return await inference_pool.predict(rows)
+    return await run_in_threadpool(compliment_generator.predict_rows_with_truncation, rows)
+
+# Merges rows from concurrent /generate-social-nudges requests into one score_rows call
+prediction_batcher = MicroBatcher(score_rows)
+
+# serve.py points METRICS_MULTIPROCESS_DIR at a directory shared by its workers; unset means this process only
+metrics_exporter = MultiProcessExporter(os.environ.get("METRICS_MULTIPROCESS_DIR"))
+
+# Profiles single /generate-social-nudges requests on X-Profile: 1 or at profiling_sample_rate
+request_profiler = RequestProfiler()
+
+def start_background_tasks():
+    settings = config_store.snapshot()
+    self_test_runner.interval_seconds = settings.get("health_check_interval_seconds", 60)
+    self_test_runner.start()
+    template_store.start_watching(settings.get("templates_reload_interval_seconds", 5))
+    config_store.write_delay_seconds = settings.get("config_write_delay_seconds", 0.5)
+    config_store.start_watching(settings.get("config_reload_interval_seconds", 5))
+    if settings.get("inference_mode", "inline") == "process_pool":
+        inference_pool.workers = settings.get("inference_pool_workers", 0) or inference_pool.workers
+        inference_pool.queue_depth = settings.get("inference_queue_depth", 0)
+        inference_pool.start_method = settings.get("inference_pool_start_method", "forkserver")
+        inference_pool.start()
+    prediction_batcher.max_rows = settings.get("micro_batch_max_rows", 64)
+    prediction_batcher.max_wait_ms = settings.get("micro_batch_max_wait_ms", 2)
+    metrics_exporter.start(settings.get("metrics_flush_interval_seconds", 5))
+    request_profiler.directory = Path(settings.get("profiling_dir", "profiles"))
+    request_profiler.sample_rate = settings.get("profiling_sample_rate", 0.0)
+    request_profiler.max_profiles = settings.get("profiling_max_profiles", 100)
+    request_profiler.allow_header = settings.get("profiling_allow_header", False)
+
+# Config, templates and model load in the background so the port opens immediately
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up.start(on_ready=start_background_tasks)
+    yield
+    self_test_runner.stop()
+    template_store.stop_watching()
+    config_store.stop_watching()
+    # Let a pending write-behind of config.json finish before the process exits
+    config_store.flush()
+    inference_pool.shutdown()
+    metrics_exporter.stop()
+
+app = FastAPI(lifespan=lifespan)
+
+# Records every HTTP request in REQUEST_SECONDS by route template, and the in-flight gauge
+class RequestMetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.in_flight = REQUESTS_IN_FLIGHT.labels()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        self.in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight.dec()
+            # The router stores the matched route in the shared scope; unmatched paths share one label
+            route = scope.get("route")
+            REQUEST_SECONDS.labels(route.path if route is not None else "unmatched").observe(time.perf_counter() - started)
+
+# Tags every log record written while handling a request with its id: the X-Request-ID header when sent,
+# otherwise a generated one. The id is echoed back in the X-Request-ID response header.
+class RequestIdMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        header = next((value for name, value in scope["headers"] if name == b"x-request-id"), b"")
+        request_id = safe_request_id(header.decode("latin-1"))
+        token = request_id_var.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", ()), (b"x-request-id", request_id.encode())]}
+            await send(message)
 
-    user_id, processed_buddies= process_buddies(buddy_payload)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
+
+app.add_middleware(RequestMetricsMiddleware)
+app.add_middleware(RequestIdMiddleware)
+
+# Hold requests briefly while the service warms up, then turn them away; waits on the event loop, not a worker thread
+async def require_ready():
+    if not await warm_up.wait_async(READINESS_WAIT_SECONDS):
+        raise HTTPException(status_code=503, detail=f"Service is {warm_up.state}", headers={"Retry-After": "1"})
+
+# Combine the compliment with the buddy nudges for one user
+def build_social_nudge_response(request_data: SocialNudgeRequest, compliment_output):
+    # SocialNudgeRequest is a BuddyPayload, so the validated request is used as is
+    user_id, processed_buddies= process_buddies(request_data)
     return {
         "user_id": request_data.user_id,
         "buddy_nudges": processed_buddies,
@@ -37,6 +151,129 @@ def generateSocialNudges(request_data: SocialNudgeRequest):
         "status": "generated"
     }
 
+# The whole request on one thread, without batching or the pool, so a profile covers only this request's work
+def handle_social_nudges(request_data: SocialNudgeRequest):
+    return build_social_nudge_response(request_data, generate_compliment(request_data))
+
+# Parse and validate the body in one pass straight from bytes, without building intermediate dicts;
+# errors come back as the same 422 body FastAPI gives for its own body validation
+async def decode_social_nudge_request(request: Request) -> SocialNudgeRequest:
+    body = await request.body()
+    try:
+        return SocialNudgeRequest.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)], body=body
+        )
+
+# The response for a user whose history puts them inside both cooldown windows, or None. Such a user always gets
+# an empty compliment and no nudges, so the request is answered here on the event loop after validation, without
+# building the compliment context, entering the buddy pipeline or handing work to a worker thread.
+def cooldown_response(request_data: SocialNudgeRequest):
+    history = request_data.history
+    window_end = cooldown_window_end(
+        history.last_compliment_generated,
+        history.last_buddy_nudge,
+        compliment_generator.compliment_settings.compliment_cooldown_days,
+        nudge_engine.nudge_settings.nudge_cooldown_days,
+    )
+    if window_end is None:
+        return None
+    compliment_generator.compliment_cooldown_skips.inc()
+    compliment_generator.compliment_stage_counters["cooldown"].inc()
+    nudge_engine.nudge_cooldown_skips.inc()
+    return {
+        "user_id": request_data.user_id,
+        "buddy_nudges": [],
+        "compliment": compliment_generator.count_compliment(compliment_generator.empty_compliment())["compliment"],
+        "status": "generated"
+    }
+
+# Documents the body read by decode_social_nudge_request; the schema is registered through the batch route
+SOCIAL_NUDGE_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {"$ref": "#/components/schemas/SocialNudgeRequest"}}},
+    }
+}
+
+# Validation runs on the event loop; model scoring is micro-batched across concurrent requests
+# and goes to the inference pool when enabled, the buddy work to worker threads.
+# The result holds only JSON types, so it is written out directly instead of through jsonable_encoder.
+@app.post("/generate-social-nudges", dependencies=[Depends(require_ready)], openapi_extra=SOCIAL_NUDGE_REQUEST_BODY)
+async def generateSocialNudges(request: Request):
+    request_data = await decode_social_nudge_request(request)
+    cooled_down = cooldown_response(request_data)
+    if cooled_down is not None:
+        return JSONResponse(content=cooled_down)
+    if request_profiler.wants_profile(request.headers):
+        # Saved under the request id that RequestIdMiddleware returns in X-Request-ID
+        result, _ = await run_in_threadpool(
+            request_profiler.run, request.headers, "/generate-social-nudges", handle_social_nudges, request_data
+        )
+        return JSONResponse(content=result)
+    predict = prediction_batcher.predict if prediction_batcher.enabled else score_rows
+    try:
+        compliment_output = await generate_compliment_async(request_data, predict)
+    except PoolSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    return JSONResponse(content=await run_in_threadpool(build_social_nudge_response, request_data, compliment_output))
+
+# Same output as calling /generate-social-nudges per user, with one model call for the whole batch
+@app.post("/generate-social-nudges/batch", dependencies=[Depends(require_ready)])
+def generateSocialNudgesBatch(requests_data: List[SocialNudgeRequest]):
+    compliment_outputs = generate_compliments_batch(requests_data)
+    return [
+        build_social_nudge_response(request_data, compliment_output)
+        for request_data, compliment_output in zip(requests_data, compliment_outputs)
+    ]
+
+
+# Split a request body stream into non-empty lines without holding more than one chunk
+async def iter_ndjson_lines(chunks):
+    buffer = b""
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield line_number, line
+    if buffer.strip():
+        yield line_number + 1, buffer
+
+# Buddies as newline-delimited JSON: a {"user_id", "history"} header line, then one buddy per line.
+# Each buddy is validated and scored as it arrives; only the best max_nudges_per_user are kept.
+@app.post("/generate-social-nudges/stream", dependencies=[Depends(require_ready)])
+async def generateSocialNudgesStream(request: Request):
+    header = None
+    selector = None
+    async for line_number, line in iter_ndjson_lines(request.stream()):
+        try:
+            if header is None:
+                header = BuddyStreamHeader.model_validate_json(line)
+                last_nudge_str = header.history.last_buddy_nudge if header.history else None
+                if nudge_cooldown_active(header.user_id, last_nudge_str):
+                    return {"user_id": header.user_id, "buddy_nudges": [], "buddies_received": 0, "status": "generated"}
+                selector = StreamingBuddySelector()
+            else:
+                # The same non-null schema as buddies sent to /generate-social-nudges
+                selector.add(BuddyMetrics.model_validate_json(line))
+        except ValidationError as e:
+            raise HTTPException(
+                status_code=422,
+                detail={"line": line_number, "errors": e.errors(include_url=False, include_context=False)},
+            )
+    if header is None:
+        raise HTTPException(status_code=422, detail="Missing header line with user_id and history")
+    return {
+        "user_id": header.user_id,
+        "buddy_nudges": selector.results(),
+        "buddies_received": selector.received,
+        "status": "generated"
+    }
+
 
 #@app.post("/generate-social-nudges")
 #def generateSocialNudges(request_data: SocialNudgeRequest):
@@ -46,130 +283,74 @@ def generateSocialNudges(request_data: SocialNudgeRequest):
 #def generateNudge(payload:BuddyPayload):
     #return process_buddies(payload)
 
-@app.post("/update-popular-tags")
+@app.post("/update-popular-tags", dependencies=[Depends(require_ready)])
 def updateTags(data: TagUpdate):
     return update_tags(data)
 
+@app.post("/update-popular-tags/delta", dependencies=[Depends(require_ready)])
+def updateTagsDelta(data: TagDelta):
+    return update_tags_delta(data)
 
-@app.get("/health")
-def health_check():
-    health_status = {"status": "ok", "checks": {}}
-    try:
-        config = load_config()
-        if not config:
-            raise ValueError("Config file is empty or missing critical keys")
-        health_status["checks"]["config"] = "loaded"
-    except Exception as e:
-        health_status["status"] = "fail"
-        health_status["checks"]["config"] = f"error: {str(e)}"
 
-    try:
-        with open("compliment_model.pkl", "rb") as f:
-            pickle.load(f)
-        health_status["checks"]["model"] = "loaded"
-    except Exception as e:
-        health_status["status"] = "fail"
-        health_status["checks"]["model"] = f"error: {str(e)}"
+# Liveness: the process is up and serving requests, and has not given up on warming up
+@app.get("/health/live")
+def liveness_check():
+    if warm_up.gave_up:
+        return JSONResponse(content={"status": "failed", "error": warm_up.error}, status_code=503)
+    return {"status": "alive"}
 
-    try:
-        template_path = Path(__file__).parent / "templates.json"
-        with open(template_path, "r", encoding="utf-8") as f:
-            json.load(f)
-        health_status["checks"]["templates"] = "loaded"
-    except Exception as e:
-        health_status["status"] = "fail"
-        health_status["checks"]["templates"] = f"error: {str(e)}"
-    
-    try:
-        payload = {
-        "user_id": "stu_8901",
-        "buddies": [
-            {
-                "buddy_id": "stu_7093",
-                "last_interaction_days": 7,
-                "messages_sent": 1,
-                "karma_change_7d": -10,
-                "quizzes_attempted": 0
-            },
-            {
-                "buddy_id": "stu_7220",
-                "last_interaction_days": 1,
-                "messages_sent": 4,
-                "karma_change_7d": 25,
-                "quizzes_attempted": 2
-            }
-        ],
-        "social_metrics": {
-            "karma_growth": 1666,
-            "profile_completeness": 85,
-            "previous_profile_completeness": 88,
-            "helpful_answers": 20888,
-            "tag_match": [],
-            "consecutive_active_days": 12,
-            "quizzes_attempted": 4,
-            "challenges_attempted": 4,
-            "upvotes": 121
-        },
-        "history": {
-            "last_compliment_generated": "2025-05-15",
-            "last_buddy_nudge": "2024-07-14"
-        }
-        }
-        request_model = SocialNudgeRequest(**payload)
-        result = generate_compliment(request_model)
-        health_status["checks"]["complimenting_logic"] = "works"
-    except Exception as e:
-        health_status["status"] = "fail"
-        health_status["checks"]["compliment generation in compliment_generator.py"] = f"error: {str(e)}"
-    
-    try:
-        payload = {
-        "user_id": "stu_8901",
-        "buddies": [
-            {
-                "buddy_id": "stu_7093",
-                "last_interaction_days": 7,
-                "messages_sent": 1,
-                "karma_change_7d": -10,
-                "quizzes_attempted": 0
-            },
-            {
-                "buddy_id": "stu_7220",
-                "last_interaction_days": 1,
-                "messages_sent": 4,
-                "karma_change_7d": 25,
-                "quizzes_attempted": 2
-            }
-        ],
-        "social_metrics": {
-            "karma_growth": 1666,
-            "profile_completeness": 85,
-            "previous_profile_completeness": 88,
-            "helpful_answers": 20888,
-            "tag_match": [],
-            "consecutive_active_days": 12,
-            "quizzes_attempted": 4,
-            "challenges_attempted": 4,
-            "upvotes": 121
-        },
-        "history": {
-            "last_compliment_generated": "2025-05-15",
-            "last_buddy_nudge": "2024-07-14"
-        }
-        }
-        request_model=BuddyPayload(**payload)
-        res=process_buddies(request_model)
-        health_status["checks"]["nudging_logic"] = "works"
-    except Exception as e:
-        health_status["status"] = "fail"
-        health_status["checks"]["nudge generation in nudge_engine.py"] = f"error: {str(e)}"
-        
+# Readiness: only reports what this process already holds in memory, no I/O
+@app.get("/health/ready")
+def readiness_check():
+    checks = {
+        "warm_up": warm_up.state,
+        "config": "loaded" if config_store.current else "missing",
+        "model": "loaded" if compliment_generator.loaded_model is not None else "missing",
+        "templates": "loaded" if template_store.registry is not None else "missing",
+    }
+    ready = warm_up.is_ready() and all(value == "loaded" for name, value in checks.items() if name != "warm_up")
+    return JSONResponse(content={"status": "ready" if ready else "not_ready", "checks": checks}, status_code=200 if ready else 503)
 
+# Deep self-test results, refreshed in the background every health_check_interval_seconds
+@app.get("/health")
+def health_check():
+    health_status = self_test_runner.results()
+    if health_status is None:
+        return JSONResponse(content={"status": "pending", "checks": {}}, status_code=503)
+    if self_test_runner.is_stale(health_status):
+        health_status["status"] = "stale"
     status_code = 200 if health_status["status"] == "ok" else 503
     return JSONResponse(content=health_status, status_code=status_code)
 
+
+# Hit, miss and eviction counters of this worker's prediction cache
+@app.get("/prediction-cache-stats")
+def prediction_cache_stats():
+    return compliment_generator.prediction_cache.stats()
+
+# Batch-size and queue-wait histograms of the micro-batcher in this worker
+@app.get("/batching-stats")
+def batching_stats():
+    return prediction_batcher.stats()
+
+# Stage and route histograms, compliment/nudge/cooldown counters and in-flight gauges, merged across workers
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics_exporter.render(), media_type="text/plain; version=0.0.4")
+
+# Startup phase timings of this worker
+@app.get("/startup-timings")
+def startup_timings():
+    return warm_up.report()
+
+# Memory of the worker answering this request; unique_mb is the cost of one more worker
+@app.get("/memory-usage")
+def memory_usage():
+    return process_memory()
+
 @app.get("/version")
 def get_version():
     return{
-        "model_version":MODEL_VERSION
+        "model_version":MODEL_VERSION,
+        "config_version":config_store.current.version if config_store.current else None
     }
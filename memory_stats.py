@@ -0,0 +1,40 @@
+import os
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# smaps_rollup fields summed into the report, all in kB
+_ROLLUP_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+# RSS, PSS and unique (private) memory of one process, read from /proc/<pid>/smaps_rollup
+def process_memory(pid=None):
+    pid = pid or os.getpid()
+    rollup_path = Path(f"/proc/{pid}/smaps_rollup")
+    values = dict.fromkeys(_ROLLUP_FIELDS, 0)
+    with open(rollup_path, "r") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in values:
+                values[key] = int(rest.split()[0])
+    return {
+        "pid": pid,
+        "rss_mb": round(values["Rss"] / 1024, 1),
+        "pss_mb": round(values["Pss"] / 1024, 1),
+        "shared_mb": round((values["Shared_Clean"] + values["Shared_Dirty"]) / 1024, 1),
+        "unique_mb": round((values["Private_Clean"] + values["Private_Dirty"]) / 1024, 1),
+    }
+
+# Per-process memory for a group of workers plus totals; unique_mb is what each extra worker costs
+def memory_report(pids):
+    processes = []
+    for pid in pids:
+        try:
+            processes.append(process_memory(pid))
+        except (FileNotFoundError, ProcessLookupError):
+            logger.warning("Process %s exited before its memory could be read", pid)
+    return {
+        "processes": processes,
+        "total_unique_mb": round(sum(p["unique_mb"] for p in processes), 1),
+        "total_pss_mb": round(sum(p["pss_mb"] for p in processes), 1),
+    }
@@ -0,0 +1,336 @@
+import os
+import json
+import time
+import functools
+import logging
+import threading
+from bisect import bisect_left
+from pathlib import Path
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Rows per predict call
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+# Milliseconds a request waited for its batch to be sent
+QUEUE_WAIT_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100)
+# Trees evaluated for one row by the early-exit ensemble
+TREE_COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+# Seconds spent in one stage or route
+LATENCY_BUCKETS_SECONDS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+# Threads whose metric updates are dropped, see muted(); checked before anything else so the common case is one test
+_muted_threads = set()
+
+# Drop every metric update made on this thread inside the block, so e.g. self-tests do not show up as traffic
+@contextmanager
+def muted():
+    ident = threading.get_ident()
+    _muted_threads.add(ident)
+    try:
+        yield
+    finally:
+        _muted_threads.discard(ident)
+
+def is_muted():
+    return bool(_muted_threads) and threading.get_ident() in _muted_threads
+
+# Fixed-bucket histogram; a value lands in the first bucket whose upper bound is >= value.
+# Recording takes no lock: an update is a couple of hundred nanoseconds under the GIL, at the cost of
+# very rarely losing a sample when two threads interleave mid-update, which is fine for monitoring.
+class Histogram:
+    __slots__ = ("buckets", "_counts", "_sum")
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+
+    def observe(self, value):
+        if _muted_threads and threading.get_ident() in _muted_threads:
+            return
+        self._counts[bisect_left(self.buckets, value)] += 1
+        self._sum += value
+
+    # Cumulative counts per upper bound, Prometheus style
+    def snapshot(self):
+        counts = list(self._counts)
+        count = sum(counts)
+        cumulative = {}
+        running = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            running += bucket_count
+            cumulative[str(bound)] = running
+        cumulative["+Inf"] = count
+        return {"buckets": cumulative, "count": count, "sum": round(self._sum, 3)}
+
+    # Per-bucket (not cumulative) counts, sum and count, for merging across processes
+    def raw(self):
+        counts = list(self._counts)
+        return {"counts": counts, "sum": self._sum, "count": sum(counts)}
+
+    def reset(self):
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+
+# Counter and gauge children are lock-free like Histogram
+class CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        if _muted_threads and threading.get_ident() in _muted_threads:
+            return
+        self.value += amount
+
+    def raw(self):
+        return self.value
+
+    def reset(self):
+        self.value = 0
+
+class GaugeValue(CounterValue):
+    __slots__ = ()
+
+    def dec(self, amount=1):
+        if _muted_threads and threading.get_ident() in _muted_threads:
+            return
+        self.value -= amount
+
+    def set(self, value):
+        if _muted_threads and threading.get_ident() in _muted_threads:
+            return
+        self.value = value
+
+# A named metric with one child per label-value tuple; hot paths should keep the child from labels()
+class MetricFamily:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def reset(self):
+        with self._lock:
+            for child in self._children.values():
+                child.reset()
+
+    def collect(self):
+        with self._lock:
+            children = list(self._children.items())
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "buckets": list(getattr(self, "buckets", ())),
+            "samples": [[list(values), child.raw()] for values, child in children],
+        }
+
+class Counter(MetricFamily):
+    type = "counter"
+
+    def _new_child(self):
+        return CounterValue()
+
+class Gauge(MetricFamily):
+    type = "gauge"
+
+    def _new_child(self):
+        return GaugeValue()
+
+class HistogramFamily(MetricFamily):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS_SECONDS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return Histogram(self.buckets)
+
+class MetricsRegistry:
+    def __init__(self):
+        self._families = {}
+
+    def register(self, family):
+        if family.name in self._families:
+            raise ValueError(f"Metric {family.name} is already registered")
+        self._families[family.name] = family
+
+    def collect(self):
+        return {name: family.collect() for name, family in self._families.items()}
+
+    # Zero every value in place; children already handed out keep working
+    def reset(self):
+        for family in self._families.values():
+            family.reset()
+
+REGISTRY = MetricsRegistry()
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+# Merge collected metrics from several processes. Counters and histograms are summed over every process
+# that ever wrote a file, so restarts do not make them go backwards; gauges only over live processes.
+def merge_collections(collections):
+    merged = {}
+    for pid, collection in collections:
+        alive = None
+        for name, family in collection.items():
+            target = merged.setdefault(name, {**family, "samples": {}})
+            if family["type"] == "gauge":
+                if alive is None:
+                    alive = _pid_alive(pid)
+                if not alive:
+                    continue
+            for labels, value in family["samples"]:
+                key = tuple(labels)
+                if family["type"] == "histogram":
+                    current = target["samples"].get(key)
+                    if current is None:
+                        target["samples"][key] = {"counts": list(value["counts"]), "sum": value["sum"], "count": value["count"]}
+                    else:
+                        current["counts"] = [a + b for a, b in zip(current["counts"], value["counts"])]
+                        current["sum"] += value["sum"]
+                        current["count"] += value["count"]
+                else:
+                    target["samples"][key] = target["samples"].get(key, 0) + value
+    return merged
+
+def _format_labels(names, values, extra=()):
+    pairs = [(name, value) for name, value in zip(names, values)] + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+# Prometheus text exposition format (version 0.0.4) for a merged collection
+def render_prometheus(merged):
+    lines = []
+    for name, family in sorted(merged.items()):
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        labelnames = family["labelnames"]
+        for labels, value in sorted(family["samples"].items()):
+            if family["type"] == "histogram":
+                running = 0
+                for bound, count in zip(family["buckets"], value["counts"]):
+                    running += count
+                    lines.append(f"{name}_bucket{_format_labels(labelnames, labels, [('le', bound)])} {running}")
+                lines.append(f"{name}_bucket{_format_labels(labelnames, labels, [('le', '+Inf')])} {value['count']}")
+                lines.append(f"{name}_sum{_format_labels(labelnames, labels)} {_format_number(value['sum'])}")
+                lines.append(f"{name}_count{_format_labels(labelnames, labels)} {value['count']}")
+            else:
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_number(value)}")
+    return "\n".join(lines) + "\n"
+
+# Shares metrics between pre-forked workers: each process writes its own collection to <directory>/<pid>.json
+# (periodically and before every scrape) and /metrics merges all files. Without a directory only this process is reported.
+class MultiProcessExporter:
+    def __init__(self, directory=None, registry=None):
+        self.directory = Path(directory) if directory else None
+        self.registry = registry if registry is not None else REGISTRY
+        self._stop = threading.Event()
+        self._thread = None
+
+    def write(self):
+        if self.directory is None:
+            return
+        pid = os.getpid()
+        temp_path = self.directory / f".{pid}.json.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(self.registry.collect(), f)
+            os.replace(temp_path, self.directory / f"{pid}.json")
+        except OSError as e:
+            logger.error("Failed to write metrics to %s: %s", self.directory, e)
+
+    def collections(self):
+        if self.directory is None:
+            return [(os.getpid(), self.registry.collect())]
+        self.write()
+        collections = []
+        for path in self.directory.glob("*.json"):
+            try:
+                with open(path, "r") as f:
+                    collections.append((int(path.stem), json.load(f)))
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping unreadable metrics file %s: %s", path, e)
+        return collections
+
+    def render(self):
+        return render_prometheus(merge_collections(self.collections()))
+
+    def _flush_periodically(self, interval_seconds):
+        while not self._stop.wait(interval_seconds):
+            self.write()
+
+    def start(self, interval_seconds=5):
+        if self.directory is None or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._flush_periodically, args=(interval_seconds,), name="metrics-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.write()
+
+# Metrics recorded on the request path. Keep the labels() children at module level where a path is hot.
+STAGE_SECONDS = HistogramFamily("social_vibe_stage_seconds", "Time spent in one stage of request handling", ["stage"])
+REQUEST_SECONDS = HistogramFamily("social_vibe_request_seconds", "Time to answer one HTTP request, by route", ["route"])
+REQUESTS_IN_FLIGHT = Gauge("social_vibe_requests_in_flight", "HTTP requests currently being handled")
+COMPLIMENTS = Counter("social_vibe_compliments_total", "Compliment decisions, by reason (none when no compliment was given)", ["reason"])
+NUDGES = Counter("social_vibe_nudges_total", "Buddy nudges returned, by priority", ["priority"])
+COOLDOWN_SKIPS = Counter("social_vibe_cooldown_skips_total", "Requests skipped because a cooldown was active", ["kind"])
+COMPLIMENT_STAGES = Counter("social_vibe_compliment_stage_total", "Compliment requests by the stage that decided them; every stage but model skipped the model call", ["stage"])
+ENSEMBLE_TREES = HistogramFamily("social_vibe_ensemble_trees_evaluated", "Trees evaluated per scored row with ensemble_early_exit", buckets=TREE_COUNT_BUCKETS)
+ENSEMBLE_BUDGET_EXHAUSTED = Counter("social_vibe_ensemble_budget_exhausted_total", "Rows answered from a partial vote because ensemble_time_budget_ms ran out")
+
+def stage_timer(stage):
+    return STAGE_SECONDS.labels(stage)
+
+# Decorator recording the wall time of each call in STAGE_SECONDS
+def timed(stage):
+    histogram = stage_timer(stage)
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+    return decorate
@@ -0,0 +1,77 @@
+import time
+import asyncio
+import logging
+from metrics import Histogram, BATCH_SIZE_BUCKETS, QUEUE_WAIT_BUCKETS_MS
+
+logger = logging.getLogger(__name__)
+
+# Collects feature rows from concurrent requests and scores them with one predict call.
+# A batch is sent once it holds max_rows rows or its oldest request has waited max_wait_ms.
+class MicroBatcher:
+    def __init__(self, predict_rows, max_rows=64, max_wait_ms=2.0):
+        self.predict_rows = predict_rows
+        self.max_rows = max_rows
+        self.max_wait_ms = max_wait_ms
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_BUCKETS_MS)
+        self._pending = []
+        self._pending_rows = 0
+        self._timer = None
+        self._running = set()
+
+    @property
+    def enabled(self):
+        return self.max_wait_ms > 0 and self.max_rows > 1
+
+    # Predictions for rows, in order; must be awaited on the event loop that owns the batcher
+    async def predict(self, rows):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((rows, future, time.perf_counter()))
+        self._pending_rows += len(rows)
+        if self._pending_rows >= self.max_rows:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_rows = self._pending, [], 0
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            # Batches may overlap, e.g. when the inference pool has several idle workers
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch):
+        started = time.perf_counter()
+        rows = [row for request_rows, _, _ in batch for row in request_rows]
+        for _, _, enqueued in batch:
+            self.queue_wait_ms.observe((started - enqueued) * 1000)
+        self.batch_size.observe(len(rows))
+        try:
+            predictions = await self.predict_rows(rows)
+        except Exception as e:
+            logger.error("Batched predict of %s rows failed: %s", len(rows), e)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        offset = 0
+        for request_rows, future, _ in batch:
+            # A cancelled request (client went away) just drops its slice
+            if not future.done():
+                future.set_result(predictions[offset:offset + len(request_rows)])
+            offset += len(request_rows)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "max_rows": self.max_rows,
+            "max_wait_ms": self.max_wait_ms,
+            "batch_size": self.batch_size.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+        }
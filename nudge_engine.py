@@ -1,40 +1,83 @@
 import json
-import random
+import heapq
 import logging
+import numpy as np
 from datetime import datetime
-from pathlib import Path
 from pydantic import BaseModel
-from typing import Optional,List
+from typing import Optional,List,NamedTuple
+from template_registry import template_store
+from config_store import config_store
+from metrics import timed, NUDGES, COOLDOWN_SKIPS
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
 def load_config(config_path="config.json"):
     try:
         with open(config_path, "r") as f:
-            logger.info(f"Loading config from {config_path}")
+            logger.info("Loading config from %s", config_path)
             return json.load(f)
     except FileNotFoundError:
-        logger.error(f"Config file not found: {config_path}")
+        logger.error("Config file not found: %s", config_path)
         raise FileNotFoundError(f"Config file not found: {config_path}")
     except json.JSONDecodeError:
-        logger.error(f"Invalid JSON format in config file: {config_path}")
+        logger.error("Invalid JSON format in config file: %s", config_path)
         raise ValueError(f"Invalid JSON format in config file: {config_path}")
 
-_json_path = Path(__file__).parent / "templates.json"
+# Thresholds and weights read from one config snapshot; replaced as a whole, never mutated
+class NudgeSettings(NamedTuple):
+    idle_days_threshold: int
+    karma_drop_threshold: int
+    score_threshold: int
+    quizzes_threshold: int
+    nudge_cooldown_days: int
+    max_nudges: int
+    vectorized_buddy_threshold: int
+    idle_days_weight: float
+    score_weight: float
+    karma_weight: float
 
-with open(_json_path, "r", encoding="utf-8") as f:
-    template_data = json.load(f) 
-    logger.info(f"Loaded templates from {_json_path}")
-    
-config = load_config()
+    # Raises KeyError when the snapshot lacks a setting
+    @classmethod
+    def from_snapshot(cls, config):
+        return cls(
+            idle_days_threshold=config["buddy_nudge_idle_days"],
+            karma_drop_threshold=config["karma_drop_threshold"],
+            score_threshold=config["buddy_score_threshold"],
+            quizzes_threshold=config["quizzes_attempted_threshold"],
+            nudge_cooldown_days=config["nudge_cooldown_days"],
+            max_nudges=config["max_nudges_per_user"],
+            vectorized_buddy_threshold=config.get("vectorized_buddy_threshold", 64),
+            idle_days_weight=config["last_interaction_days_weight_for_inactivity"],
+            score_weight=config["score_weight_for_inactivity"],
+            karma_weight=config["karma_weight_for_inactivity"],
+        )
+
+# Filled by load_templates/load_settings during application startup
+nudge_settings = None
+
+def load_templates():
+    template_store.load()
+
+def load_settings():
+    prepare_settings(config_store.snapshot())()
+
+# Builds the settings for a new config snapshot and returns the function that publishes them.
+# Subscribed to the config store, so also called on every hot reload and update.
+def prepare_settings(snapshot):
+    settings = NudgeSettings.from_snapshot(snapshot)
+
+    def publish():
+        global nudge_settings
+        nudge_settings = settings
+
+    return publish
 
-idle_days_threshold = config["buddy_nudge_idle_days"]
-karma_drop_threshold = config["karma_drop_threshold"]
-score_threshold = config["buddy_score_threshold"]
-quizzes_threshold=config["quizzes_attempted_threshold"]
-nudge_cooldown_days = config["nudge_cooldown_days"]
-max_nudges=config["max_nudges_per_user"]
+config_store.subscribe(prepare_settings)
+
+# Load everything process_buddies needs; the app does this in its lifespan warm-up instead of at import
+def load_resources():
+    load_templates()
+    load_settings()
 
 class Buddy(BaseModel):
     buddy_id: Optional[str]
@@ -51,77 +94,109 @@ class BuddyPayload(BaseModel):
     buddies: List[Buddy]
     history: Optional[History] = {}
 
+# First line of an NDJSON buddy stream; every following line is one Buddy
+class BuddyStreamHeader(BaseModel):
+    user_id: Optional[str]
+    history: Optional[History] = None
+
+@timed("render_nudge")
 def nudge_generator(reason: str, buddy_id: str = None) -> str:
-    entry = next((item for item in template_data if item["trigger"] == reason), None)   
+    entry = template_store.registry.get(reason)
     if not entry:
-        logger.warning(f"No template found for reason '{reason}' for buddy '{buddy_id}'")
+        logger.warning("No template found for reason '%s' for buddy '%s'", reason, buddy_id)
         return f"Looks like {buddy_id} has been quiet. Maybe send them a quick message?"
-    nudge = random.choice(entry.get("template", [f"Looks like {buddy_id} has been quiet. Maybe send them a quick message?"]))
-    nudge= nudge.replace("{buddy_id}", buddy_id)
-    logger.debug(f"Nudge generated for {buddy_id}: {nudge}")
+    nudge = entry.render("{buddy_id}", buddy_id, default=f"Looks like {buddy_id} has been quiet. Maybe send them a quick message?")
+    logger.debug("Nudge generated for %s: %s", buddy_id, nudge)
     return nudge  
 
-def determine_priority(reasons, buddy_score):
-    if len(reasons) == 3 or ("score" in reasons and buddy_score < (score_threshold - 5)):
+def determine_priority(reasons, buddy_score, settings: NudgeSettings = None):
+    settings = settings or nudge_settings
+    if len(reasons) == 3 or ("score" in reasons and buddy_score < (settings.score_threshold - 5)):
         return "urgent"
     elif len(reasons) == 2 or "karma_drop" in reasons:
         return "moderate"
     else:
         return "gentle"
 
-idle_days_weight=config["last_interaction_days_weight_for_inactivity"]
-score_weight=config["score_weight_for_inactivity"]
-karma_weight=config["karma_weight_for_inactivity"]
+# Reasons, buddy_score and inactivity_score for one buddy, or None when it needs no nudge
+def score_buddy(buddy: Buddy, settings: NudgeSettings = None):
+    settings = settings or nudge_settings
+    last_interaction_days = buddy.last_interaction_days
+    messages_sent = buddy.messages_sent
+    karma_change_7d = buddy.karma_change_7d
+    quizzes_attempted=buddy.quizzes_attempted
+    buddy_score = karma_change_7d + messages_sent + last_interaction_days
 
-def process_buddies(payload: BuddyPayload):
-    user_id = payload.user_id
-    buddies = payload.buddies
-    last_nudge_str = payload.history.last_buddy_nudge if payload.history else None
-    
-    logger.info(f"Processing buddies for user: {user_id}")
+    reasons = []
     
+    if last_interaction_days > settings.idle_days_threshold:
+        reasons.append("last_interaction_days")
+    if karma_change_7d < settings.karma_drop_threshold:
+        reasons.append("karma_drop")
+    if buddy_score < settings.score_threshold:
+        reasons.append("score")
+    if quizzes_attempted<settings.quizzes_threshold:
+        reasons.append("quizzes_attempted")
+
+    if not reasons:
+        return None
+    inactivity_score = (
+        (last_interaction_days * settings.idle_days_weight) +
+        (karma_change_7d * settings.karma_weight) +
+        (buddy_score * settings.score_weight)
+    )
+    return reasons, buddy_score, inactivity_score
+
+nudge_cooldown_skips = COOLDOWN_SKIPS.labels("nudge")
+nudge_counters = {priority: NUDGES.labels(priority) for priority in ("urgent", "moderate", "gentle")}
+
+# Count returned nudges by priority
+def count_nudges(processed_buddies):
+    for buddy in processed_buddies:
+        nudge_counters[buddy["priority"]].inc()
+    return processed_buddies
+
+# True when the user was nudged less than nudge_cooldown_days ago
+def nudge_cooldown_active(user_id, last_nudge_str, settings: NudgeSettings = None):
     if last_nudge_str:
         try:
             last_nudge_date = datetime.strptime(last_nudge_str, "%Y-%m-%d")
-            if (datetime.today() - last_nudge_date).days < nudge_cooldown_days:
-                logger.info(f"Nudge cooldown active for user {user_id}. Skipping...")
-                return user_id, []
+            if (datetime.today() - last_nudge_date).days < (settings or nudge_settings).nudge_cooldown_days:
+                logger.info("Nudge cooldown active for user %s. Skipping...", user_id)
+                nudge_cooldown_skips.inc()
+                return True
         except ValueError:
             pass  
+    return False
+
+@timed("process_buddies")
+def process_buddies(payload: BuddyPayload):
+    user_id = payload.user_id
+    buddies = payload.buddies
+    last_nudge_str = payload.history.last_buddy_nudge if payload.history else None
+    # Bound once so a reload mid-request cannot mix thresholds from two snapshots
+    settings = nudge_settings
+    max_nudges = settings.max_nudges
+    
+    if len(buddies) >= settings.vectorized_buddy_threshold:
+        return process_buddies_vectorized(payload, settings)
+
+    logger.info("Processing buddies for user: %s", user_id)
+    
+    if nudge_cooldown_active(user_id, last_nudge_str, settings):
+        return user_id, []
         
     processed_buddies = []
 
     for buddy in buddies:
-        buddy_id = buddy.buddy_id
-        last_interaction_days = buddy.last_interaction_days
-        messages_sent = buddy.messages_sent
-        karma_change_7d = buddy.karma_change_7d
-        quizzes_attempted=buddy.quizzes_attempted
-        buddy_score = karma_change_7d + messages_sent + last_interaction_days
-
-        reasons = []
-        
-        if last_interaction_days > idle_days_threshold:
-            reasons.append("last_interaction_days")
-        if karma_change_7d < karma_drop_threshold:
-            reasons.append("karma_drop")
-        if buddy_score < score_threshold:
-
-            reasons.append("score")
-        if quizzes_attempted<quizzes_threshold:
-            reasons.append("quizzes_attempted")
-
-        if reasons:
+        scored = score_buddy(buddy, settings)
+        if scored:
+            reasons, buddy_score, inactivity_score = scored
             primary_reason = reasons[0]
-            message = nudge_generator(primary_reason, buddy_id)
-            priority = determine_priority(reasons, buddy_score)  # NEW
-            inactivity_score = (
-                (last_interaction_days * idle_days_weight) +
-                (karma_change_7d * karma_weight) +
-                (buddy_score * score_weight)
-            )
+            message = nudge_generator(primary_reason, buddy.buddy_id)
+            priority = determine_priority(reasons, buddy_score, settings)  # NEW
             buddy_data = {
-                "buddy_id": buddy_id,
+                "buddy_id": buddy.buddy_id,
                 "reason": ", ".join(reasons),
                 "message": message,
                 "priority": priority,
@@ -130,10 +205,118 @@ def process_buddies(payload: BuddyPayload):
             processed_buddies.append(buddy_data)
 
     if processed_buddies and len(processed_buddies)<=max_nudges:
-        return user_id,processed_buddies
+        return user_id,count_nudges(processed_buddies)
     if len(processed_buddies)>max_nudges:
-        sorted_buddies = sorted(processed_buddies, key=lambda x: x["inactivity_score"], reverse=True)
-        top_buddies = sorted_buddies[::-1][:max_nudges]
-        return user_id,top_buddies
+        # Stable sort keeps earlier buddies first among equal scores
+        top_buddies = sorted(processed_buddies, key=lambda x: x["inactivity_score"], reverse=True)[:max_nudges]
+        return user_id,count_nudges(top_buddies)
     
-    return user_id,processed_buddies
\ No newline at end of file
+    return user_id,processed_buddies
+
+# Indices of the k highest scores, highest first and earlier index first among ties (same as a stable descending sort)
+def top_k_indices(scores, k):
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= len(scores):
+        return np.lexsort((np.arange(len(scores)), -scores))
+    kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[:k - len(above)]
+    selected = np.concatenate((above, ties))
+    return selected[np.lexsort((selected, -scores[selected]))]
+
+# Same result as process_buddies, scoring all buddies in one NumPy pass and rendering only the selected ones
+def process_buddies_vectorized(payload: BuddyPayload, settings: NudgeSettings = None):
+    settings = settings or nudge_settings
+    max_nudges = settings.max_nudges
+    user_id = payload.user_id
+    buddies = payload.buddies
+    last_nudge_str = payload.history.last_buddy_nudge if payload.history else None
+
+    logger.info("Processing buddies for user: %s", user_id)
+
+    if nudge_cooldown_active(user_id, last_nudge_str, settings):
+        return user_id, []
+
+    count = len(buddies)
+    last_interaction_days = np.fromiter((buddy.last_interaction_days for buddy in buddies), dtype=np.int64, count=count)
+    messages_sent = np.fromiter((buddy.messages_sent for buddy in buddies), dtype=np.int64, count=count)
+    karma_change_7d = np.fromiter((buddy.karma_change_7d for buddy in buddies), dtype=np.int64, count=count)
+    quizzes_attempted = np.fromiter((buddy.quizzes_attempted for buddy in buddies), dtype=np.int64, count=count)
+    buddy_score = karma_change_7d + messages_sent + last_interaction_days
+
+    # One boolean column per reason, in the order process_buddies lists them
+    reason_flags = (
+        ("last_interaction_days", last_interaction_days > settings.idle_days_threshold),
+        ("karma_drop", karma_change_7d < settings.karma_drop_threshold),
+        ("score", buddy_score < settings.score_threshold),
+        ("quizzes_attempted", quizzes_attempted < settings.quizzes_threshold),
+    )
+    flagged = np.flatnonzero(np.logical_or.reduce([flags for _, flags in reason_flags]))
+    inactivity_score = (
+        (last_interaction_days * settings.idle_days_weight) +
+        (karma_change_7d * settings.karma_weight) +
+        (buddy_score * settings.score_weight)
+    )
+
+    if len(flagged) > max_nudges:
+        selected = flagged[top_k_indices(inactivity_score[flagged], max_nudges)]
+    else:
+        selected = flagged
+
+    processed_buddies = []
+    for index in selected.tolist():
+        reasons = [reason for reason, flags in reason_flags if flags[index]]
+        score = int(buddy_score[index])
+        processed_buddies.append({
+            "buddy_id": buddies[index].buddy_id,
+            "reason": ", ".join(reasons),
+            "message": nudge_generator(reasons[0], buddies[index].buddy_id),
+            "priority": determine_priority(reasons, score, settings),
+            "inactivity_score": inactivity_score[index].item(),
+        })
+    return user_id, count_nudges(processed_buddies)
+
+# Scores buddies one at a time and keeps only the best max_nudges in a heap, so memory does not grow with the stream
+class StreamingBuddySelector:
+    def __init__(self, max_nudges_per_user=None):
+        # Bound once so the whole stream is scored against one snapshot
+        self.settings = nudge_settings
+        self.max_nudges = self.settings.max_nudges if max_nudges_per_user is None else max_nudges_per_user
+        self.received = 0
+        self.flagged = 0
+        self._heap = []
+
+    def add(self, buddy: Buddy):
+        self.received += 1
+        scored = score_buddy(buddy, self.settings)
+        if not scored:
+            return
+        position = self.flagged
+        self.flagged += 1
+        if self.max_nudges <= 0:
+            return
+        reasons, buddy_score, inactivity_score = scored
+        # (score, -position) orders like a stable descending sort; the smallest entry is evicted first
+        item = (inactivity_score, -position, buddy.buddy_id, reasons, buddy_score)
+        if len(self._heap) < self.max_nudges:
+            heapq.heappush(self._heap, item)
+        elif item[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, item)
+
+    # Same selection and order as process_buddies, rendering messages only for the kept buddies
+    def results(self):
+        if self.flagged <= self.max_nudges:
+            kept = sorted(self._heap, key=lambda item: -item[1])
+        else:
+            kept = sorted(self._heap, key=lambda item: (-item[0], -item[1]))
+        return count_nudges([
+            {
+                "buddy_id": buddy_id,
+                "reason": ", ".join(reasons),
+                "message": nudge_generator(reasons[0], buddy_id),
+                "priority": determine_priority(reasons, buddy_score, self.settings),
+                "inactivity_score": inactivity_score,
+            }
+            for inactivity_score, _, buddy_id, reasons, buddy_score in kept
+        ])
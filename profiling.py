@@ -0,0 +1,88 @@
+import json
+import time
+import random
+import pstats
+import logging
+import cProfile
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+from logging_pipeline import request_id_var, safe_request_id
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+REQUEST_ID_HEADER = "x-request-id"
+
+# Functions whose cumulative time is reported as the stages of a profiled request
+PROFILED_STAGES = (
+    "generate_compliment",
+    "predict_rows_with_truncation",
+    "apply_compliment_rules",
+    "compliment_generator",
+    "build_social_nudge_response",
+    "process_buddies",
+    "nudge_generator",
+)
+
+# Cumulative milliseconds per PROFILED_STAGES function, from a finished profile
+def stage_timings(stats):
+    timings = {}
+    for (filename, line, function_name), (_, _, _, cumulative, _) in stats.stats.items():
+        if function_name in PROFILED_STAGES:
+            timings[function_name] = round(timings.get(function_name, 0) + cumulative * 1000, 3)
+    return timings
+
+# Opt-in cProfile of single requests, chosen by the X-Profile header or by sample_rate.
+# Each profile is a .pstats file plus a .json summary in directory; at most max_profiles are written per process.
+class RequestProfiler:
+    def __init__(self, directory="profiles", sample_rate=0.0, max_profiles=100, allow_header=False):
+        self.directory = Path(directory)
+        self.sample_rate = sample_rate
+        self.max_profiles = max_profiles
+        self.allow_header = allow_header
+        self.written = 0
+        self._lock = threading.Lock()
+        # Own generator so sampling does not shift the module-level random used for template picks
+        self._random = random.Random()
+
+    def wants_profile(self, headers):
+        if self.written >= self.max_profiles:
+            return False
+        if self.allow_header and headers.get(PROFILE_HEADER, "").lower() in ("1", "true", "yes"):
+            return True
+        return self.sample_rate > 0 and self._random.random() < self.sample_rate
+
+    # Call function(*args) under cProfile and save the result; returns (result, request_id).
+    # The id is the one the request is logged under, or the X-Request-ID header outside a request.
+    def run(self, headers, route, function, *args):
+        request_id = request_id_var.get() or safe_request_id(headers.get(REQUEST_ID_HEADER))
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        result = profiler.runcall(function, *args)
+        total_ms = (time.perf_counter() - started) * 1000
+        try:
+            self.save(profiler, request_id, route, total_ms)
+        except OSError as e:
+            logger.error("Failed to write profile for request %s: %s", request_id, e)
+        return result, request_id
+
+    def save(self, profiler, request_id, route, total_ms):
+        with self._lock:
+            if self.written >= self.max_profiles:
+                return None
+            self.written += 1
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stem = self.directory / f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}-{request_id}"
+        profiler.dump_stats(f"{stem}.pstats")
+        summary = {
+            "request_id": request_id,
+            "route": route,
+            "total_ms": round(total_ms, 3),
+            "stages_ms": stage_timings(pstats.Stats(profiler)),
+            "pstats": f"{stem.name}.pstats",
+        }
+        with open(f"{stem}.json", "w") as f:
+            json.dump(summary, f, indent=2)
+        logger.info("Profiled request %s on %s in %s ms, written to %s.pstats", request_id, route, summary['total_ms'], stem)
+        return summary
@@ -0,0 +1,132 @@
+import os
+import gc
+import sys
+import time
+import signal
+import shutil
+import socket
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+import uvicorn
+from memory_stats import memory_report
+from logging_pipeline import setup_logging
+
+logger = logging.getLogger(__name__)
+
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+# Child process body: serve the already imported app on the shared listening socket
+def run_worker(app, sock, log_level):
+    # Respawned workers inherit the parent's handlers; uvicorn installs its own for SIGINT/SIGTERM
+    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    # Drop what the parent's warm-up recorded, or /metrics would count it once per worker
+    from metrics import REGISTRY
+    REGISTRY.reset()
+    # No uvicorn logging config: its loggers propagate to the root logger and go through the JSON pipeline
+    config = uvicorn.Config(app, log_level=log_level, log_config=None)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+def spawn_worker(app, sock, log_level):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(app, sock, log_level)
+        finally:
+            os._exit(0)
+    logger.info("Started worker %s", pid)
+    return pid
+
+def log_memory_report(workers):
+    report = memory_report([os.getpid()] + sorted(workers))
+    for process in report["processes"]:
+        role = "parent" if process["pid"] == os.getpid() else "worker"
+        logger.info(
+            "%s %s: rss=%sMB pss=%sMB shared=%sMB unique=%sMB",
+            role, process["pid"], process["rss_mb"], process["pss_mb"], process["shared_mb"], process["unique_mb"],
+        )
+    logger.info("Total unique=%sMB total pss=%sMB", report['total_unique_mb'], report['total_pss_mb'])
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the app from N forked workers sharing one preloaded model")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 1)))
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--memory-report-delay", type=float, default=10.0,
+                        help="Seconds after start to log the per-worker memory report (0 disables it)")
+    args = parser.parse_args()
+    setup_logging(args.log_level.upper())
+
+    # Workers write their metrics here so any of them can answer /metrics for all; must be set before main is imported
+    created_metrics_dir = None
+    if not os.environ.get("METRICS_MULTIPROCESS_DIR"):
+        created_metrics_dir = tempfile.mkdtemp(prefix="social-vibe-metrics-")
+        os.environ["METRICS_MULTIPROCESS_DIR"] = created_metrics_dir
+    for stale in Path(os.environ["METRICS_MULTIPROCESS_DIR"]).glob("*.json"):
+        stale.unlink()
+
+    # Warm up once here; forked workers map the same model pages copy-on-write and skip their own loading
+    from main import app
+    from startup import warm_up
+    if not warm_up.run():
+        logger.error("Warm-up failed: %s", warm_up.error)
+        return 1
+    # Move everything allocated so far out of the collector's reach so workers never write to those pages
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(args.host, args.port)
+    logger.info("Listening on %s:%s with %s workers", args.host, args.port, args.workers)
+    workers = {spawn_worker(app, sock, args.log_level) for _ in range(args.workers)}
+
+    shutting_down = False
+
+    def handle_shutdown(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, handle_shutdown)
+    signal.signal(signal.SIGINT, handle_shutdown)
+    # kill -USR1 <parent pid> logs a fresh memory report
+    signal.signal(signal.SIGUSR1, lambda signum, frame: log_memory_report(workers))
+
+    report_at = time.monotonic() + args.memory_report_delay if args.memory_report_delay > 0 else None
+    while workers:
+        if report_at and time.monotonic() >= report_at:
+            log_memory_report(workers)
+            report_at = None
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.5)
+            continue
+        workers.discard(pid)
+        if not shutting_down:
+            logger.warning("Worker %s exited with status %s, restarting", pid, status)
+            workers.add(spawn_worker(app, sock, args.log_level))
+    sock.close()
+    if created_metrics_dir:
+        shutil.rmtree(created_metrics_dir, ignore_errors=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
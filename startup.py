@@ -0,0 +1,155 @@
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+import nudge_engine
+import compliment_generator
+from health import SELF_TEST_PAYLOAD
+from template_registry import template_store
+
+logger = logging.getLogger(__name__)
+
+def load_config_phase():
+    nudge_engine.load_settings()
+    compliment_generator.load_settings()
+
+def load_templates_phase():
+    # nudge_engine and compliment_generator share one registry
+    template_store.load()
+
+def load_model_phase():
+    # Already loaded when serve.py preloaded it in the parent before forking
+    if compliment_generator.loaded_model is None:
+        compliment_generator.load_model()
+
+# Score one sample request so the first real request does not pay for lazy initialisation
+def warm_up_inference_phase():
+    compliment_generator.generate_compliment(compliment_generator.SocialNudgeRequest(**SELF_TEST_PAYLOAD))
+    nudge_engine.process_buddies(nudge_engine.BuddyPayload(**SELF_TEST_PAYLOAD))
+
+DEFAULT_PHASES = [
+    ("config", load_config_phase),
+    ("templates", load_templates_phase),
+    ("model", load_model_phase),
+    ("warm_up_inference", warm_up_inference_phase),
+]
+
+# Longest pause between two warm-up attempts started by WarmUp.start
+RETRY_DELAY_MAX_SECONDS = 30
+
+# Runs the startup phases once, records how long each took and releases requests waiting on readiness
+class WarmUp:
+    def __init__(self, phases=None):
+        self.phases = phases or DEFAULT_PHASES
+        self.state = "pending"
+        self.error = None
+        self.started_at = None
+        self.phase_timings_ms = {}
+        self.attempts = 0
+        self.gave_up = False
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._waiters = []
+        self._waiters_lock = threading.Lock()
+
+    def run(self):
+        with self._lock:
+            if self.state == "ready":
+                return True
+            self.attempts += 1
+            self.state = "warming"
+            self.error = None
+            self.started_at = datetime.now(timezone.utc).isoformat()
+            total_started = time.perf_counter()
+            for name, phase in self.phases:
+                started = time.perf_counter()
+                try:
+                    phase()
+                except Exception as e:
+                    self.state = "failed"
+                    self.error = f"{name}: {str(e)}"
+                    logger.exception("Startup phase '%s' failed", name)
+                    return False
+                finally:
+                    self.phase_timings_ms[name] = round((time.perf_counter() - started) * 1000, 2)
+                logger.info("Startup phase '%s' finished in %s ms", name, self.phase_timings_ms[name])
+            self.phase_timings_ms["total"] = round((time.perf_counter() - total_started) * 1000, 2)
+            self.state = "ready"
+            self._ready.set()
+            self._release_waiters()
+            return True
+
+    # Warm up on a background thread so the server can bind its port and answer probes meanwhile. A failed attempt
+    # is retried after retry_delay_seconds, doubling up to RETRY_DELAY_MAX_SECONDS; after max_attempts failures the
+    # warm-up gives up, and /health/live reports it so the process gets restarted.
+    def start(self, on_ready=None, max_attempts=5, retry_delay_seconds=1.0):
+        def target():
+            delay = retry_delay_seconds
+            while not self.run():
+                if self.attempts >= max_attempts:
+                    self.gave_up = True
+                    logger.error("Warm-up failed %s times, giving up: %s", self.attempts, self.error)
+                    return
+                logger.warning("Warm-up attempt %s failed, retrying in %s s: %s", self.attempts, delay, self.error)
+                time.sleep(delay)
+                delay = min(delay * 2, RETRY_DELAY_MAX_SECONDS)
+            if on_ready:
+                on_ready()
+        thread = threading.Thread(target=target, name="warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    # wait for the event loop: the request is parked on a future instead of holding a worker thread
+    async def wait_async(self, timeout=None):
+        if self._ready.is_set():
+            return True
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def release():
+            if not future.done():
+                future.set_result(True)
+
+        waiter = (loop, release)
+        with self._waiters_lock:
+            self._waiters.append(waiter)
+        try:
+            # Readiness may have been set between the first check and registering the waiter
+            if self._ready.is_set():
+                return True
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._waiters_lock:
+                self._waiters.remove(waiter)
+
+    def _release_waiters(self):
+        with self._waiters_lock:
+            waiters = list(self._waiters)
+        for loop, release in waiters:
+            try:
+                loop.call_soon_threadsafe(release)
+            except RuntimeError:
+                # The waiter's loop has already closed
+                pass
+
+    def report(self):
+        return {
+            "state": self.state,
+            "attempts": self.attempts,
+            "gave_up": self.gave_up,
+            "started_at": self.started_at,
+            "phases_ms": dict(self.phase_timings_ms),
+            "error": self.error,
+        }
+
+warm_up = WarmUp()
@@ -0,0 +1,131 @@
+import io
+import sys
+import json
+import time
+import pickle
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from sklearn.tree import DecisionTreeClassifier
+
+logger = logging.getLogger(__name__)
+
+# (low, mode, high) of a triangular distribution per model feature, centred on the sample users in the README;
+# benchmarks/payloads.py draws its request bodies from the same ranges
+FEATURE_RANGES = {
+    "karma_growth": (0, 70, 400),
+    "helpful_answers": (0, 7, 30),
+    "quizzes_attempted": (0, 7, 25),
+    "upvotes": (0, 30, 250),
+    "consecutive_active_days": (0, 8, 40),
+}
+
+# Serves a small decision tree distilled from the full ensemble. Rows where the tree's leaf is less pure than
+# min_confidence are re-scored by the teacher, when one is attached; without a teacher the tree answers alone.
+class StudentModel:
+    def __init__(self, tree, teacher=None, min_confidence=0.0):
+        self.tree = tree
+        self.teacher = teacher
+        self.min_confidence = min_confidence
+        self.feature_names_in_ = tree.feature_names_in_
+        self.classes_ = tree.classes_
+        self.deferred_rows = 0
+
+    # X holds plain rows ordered like feature_names_in_. The tree is called without input validation, so its
+    # check for the column names it was fitted with does not apply; the teacher gets the unsure rows as a named frame.
+    def predict(self, X):
+        X = np.asarray(X)
+        X_tree = np.ascontiguousarray(X, dtype=np.float32)
+        if self.teacher is None or self.min_confidence <= 0:
+            return self.tree.predict(X_tree, check_input=False)
+        proba = self.tree.predict_proba(X_tree, check_input=False)
+        predictions = self.classes_.take(np.argmax(proba, axis=1), axis=0)
+        unsure = proba.max(axis=1) < self.min_confidence
+        if unsure.any():
+            self.deferred_rows += int(unsure.sum())
+            predictions[unsure] = self.teacher.predict(pd.DataFrame(X[unsure], columns=self.feature_names_in_))
+        return predictions
+
+# Feature rows to distill on, in the teacher's feature order: half drawn around the typical users in
+# FEATURE_RANGES, half uniform up to twice their range so the tails are covered too
+def sample_features(feature_names, count, seed=0):
+    rng = np.random.default_rng(seed)
+    typical = count // 2
+    columns = []
+    for name in feature_names:
+        low, mode, high = FEATURE_RANGES[name]
+        columns.append(np.concatenate([
+            np.rint(rng.triangular(low, mode, high, typical)),
+            rng.integers(low, 2 * high + 1, count - typical),
+        ]))
+    return np.column_stack(columns).astype(np.int64)
+
+# Fit a decision tree to the teacher's predictions (not to ground truth labels) on rows
+def distill(teacher, rows, max_depth=10, min_samples_leaf=5):
+    X = pd.DataFrame(rows, columns=list(teacher.feature_names_in_))
+    return DecisionTreeClassifier(max_depth=max_depth, min_samples_leaf=min_samples_leaf, random_state=0).fit(X, teacher.predict(X))
+
+# Median microseconds of one predict call, for single rows and per row of a batch; rows is an array or a DataFrame
+def predict_latency(model, rows, single_calls=200):
+    single = []
+    for index in range(min(single_calls, len(rows))):
+        row = rows[index:index + 1]
+        started = time.perf_counter()
+        model.predict(row)
+        single.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    model.predict(rows)
+    batch = time.perf_counter() - started
+    return {"single_row_us": round(float(np.median(single)) * 1e6, 2), "batch_per_row_us": round(batch / len(rows) * 1e6, 3)}
+
+# Size of the pickled model, i.e. of the file the student engine loads; not the memory it takes once loaded
+def pickle_bytes(model):
+    buffer = io.BytesIO()
+    pickle.dump(model, buffer, protocol=pickle.HIGHEST_PROTOCOL)
+    return buffer.tell()
+
+# Agreement with the teacher on held-out rows, the confusion of student against teacher, latency and pickle size.
+# The student is scored through StudentModel on plain rows, as it is served; the teacher on a frame with its column names.
+def parity_report(teacher, tree, rows):
+    student = StudentModel(tree)
+    frame = pd.DataFrame(rows, columns=list(teacher.feature_names_in_))
+    teacher_predictions = np.asarray(teacher.predict(frame))
+    student_predictions = np.asarray(student.predict(rows))
+    classes = [value.item() if hasattr(value, "item") else value for value in np.union1d(teacher.classes_, tree.classes_)]
+    confusion = {
+        str(expected): {str(actual): int(np.sum((teacher_predictions == expected) & (student_predictions == actual))) for actual in classes}
+        for expected in classes
+    }
+    return {
+        "rows": int(len(rows)),
+        "agreement": round(float(np.mean(teacher_predictions == student_predictions)), 6),
+        # confusion[teacher class][student class]
+        "confusion": confusion,
+        "student": {"max_depth": int(tree.get_depth()), "leaves": int(tree.get_n_leaves()), "pickle_bytes": pickle_bytes(tree), **predict_latency(student, rows)},
+        "teacher": {"pickle_bytes": pickle_bytes(teacher), **predict_latency(teacher, frame)},
+    }
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Distill the compliment model into a small decision tree and report parity")
+    parser.add_argument("--model", default="model.pkl", help="Path of the pickled teacher model")
+    parser.add_argument("--out", default="model_student.pkl", help="Where to write the pickled student tree")
+    parser.add_argument("--report", default="model_student_report.json", help="Where to write the parity report")
+    parser.add_argument("--rows", type=int, default=200000, help="Sampled feature rows to distill on")
+    parser.add_argument("--holdout-rows", type=int, default=50000, help="Separately sampled rows for the report")
+    parser.add_argument("--max-depth", type=int, default=10)
+    parser.add_argument("--min-samples-leaf", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    with open(args.model, "rb") as f:
+        teacher = pickle.load(f)
+    feature_names = list(teacher.feature_names_in_)
+    tree = distill(teacher, sample_features(feature_names, args.rows, args.seed), args.max_depth, args.min_samples_leaf)
+    report = parity_report(teacher, tree, sample_features(feature_names, args.holdout_rows, args.seed + 1))
+    with open(args.out, "wb") as f:
+        pickle.dump(tree, f, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info("Student written to %s: agreement %s with %s leaves", args.out, report["agreement"], report["student"]["leaves"])
+    json.dump(report, sys.stdout, indent=2)
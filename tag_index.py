@@ -0,0 +1,73 @@
+from types import MappingProxyType
+
+def _is_weight(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+# Immutable popular-tag index: the numeric weights of popular_tags plus the highest weight.
+# source is the popular_tags mapping it was built from, so an unchanged mapping can reuse the index.
+class TagIndex:
+    __slots__ = ("weights", "top_weight", "source")
+
+    def __init__(self, popular_tags):
+        # Non-numeric entries such as "_comment1" in config.json are notes, not tags
+        self._set({tag: weight for tag, weight in popular_tags.items() if _is_weight(weight)}, popular_tags)
+
+    def _set(self, weights, source):
+        self.weights = MappingProxyType(weights)
+        self.top_weight = max(weights.values(), default=None)
+        self.source = source
+
+    # Next index with changed ({tag: weight, or None when removed}, as returned by apply_tag_delta) applied to
+    # a copy of these weights; only the changed tags are looked at, the rest are not filtered again
+    def with_delta(self, changed, source):
+        weights = dict(self.weights)
+        for tag, weight in changed.items():
+            if weight is None:
+                weights.pop(tag, None)
+            else:
+                weights[tag] = weight
+        index = object.__new__(TagIndex)
+        index._set(weights, source)
+        return index
+
+    def __len__(self):
+        return len(self.weights)
+
+    def __contains__(self, tag):
+        return tag in self.weights
+
+    def matched(self, tags):
+        weights = self.weights
+        return [tag for tag in tags if tag in weights]
+
+    # Most popular of tags, or None when none of them is popular; same pick as max() by weight (first tag among ties)
+    def best(self, tags):
+        weights = self.weights
+        best_tag, best_weight = None, None
+        for tag in tags:
+            weight = weights.get(tag)
+            if weight is not None and (best_weight is None or weight > best_weight):
+                best_tag, best_weight = tag, weight
+                if weight == self.top_weight:
+                    break
+        return best_tag
+
+# New popular_tags mapping with increments added (negative values decrement) and expired tags removed.
+# A tag whose weight drops to zero or below is removed as well. Returns (new mapping, changed tags).
+def apply_tag_delta(popular_tags, increments=None, expire=None):
+    updated = dict(popular_tags)
+    changed = {}
+    for tag, amount in (increments or {}).items():
+        current = updated.get(tag, 0)
+        weight = (current if _is_weight(current) else 0) + amount
+        if weight > 0:
+            updated[tag] = weight
+            changed[tag] = weight
+        elif tag in updated:
+            del updated[tag]
+            changed[tag] = None
+    for tag in expire or ():
+        if tag in updated:
+            del updated[tag]
+            changed[tag] = None
+    return updated, changed
@@ -0,0 +1,117 @@
+import os
+import json
+import random
+import logging
+import threading
+from pathlib import Path
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Placeholders templates.json may contain; each template is pre-split on the ones it uses
+PLACEHOLDERS = ("{buddy_id}", "{tag}")
+
+# One template string, pre-split so rendering is a single join
+class CompiledTemplate:
+    __slots__ = ("text", "fragments")
+
+    def __init__(self, text):
+        self.text = text
+        self.fragments = {placeholder: tuple(text.split(placeholder)) for placeholder in PLACEHOLDERS if placeholder in text}
+
+    # Same result as text.replace(placeholder, value)
+    def render(self, placeholder, value):
+        fragments = self.fragments.get(placeholder)
+        if fragments is None:
+            return self.text
+        return value.join(fragments)
+
+# All templates and emojis for one trigger
+class TriggerTemplates:
+    __slots__ = ("trigger", "templates", "emojis")
+
+    def __init__(self, entry):
+        self.trigger = entry["trigger"]
+        self.templates = tuple(CompiledTemplate(text) for text in entry["template"]) if "template" in entry else None
+        self.emojis = tuple(entry["emojis"]) if "emojis" in entry else None
+
+    # Random template, falling back to default when the trigger has no "template" list
+    def pick(self, default=None):
+        if self.templates is None:
+            return CompiledTemplate(random.choice([default]))
+        return random.choice(self.templates)
+
+    def pick_emoji(self, default="✨"):
+        return random.choice(self.emojis if self.emojis is not None else (default,))
+
+    def render(self, placeholder, value, default=None):
+        return self.pick(default).render(placeholder, value)
+
+    def render_many(self, placeholder, values, default=None):
+        return [self.pick(default).render(placeholder, value) for value in values]
+
+# Immutable trigger -> templates index built once from the templates.json list
+class TemplateRegistry:
+    def __init__(self, entries):
+        triggers = {}
+        for entry in entries:
+            # The first entry wins for duplicated triggers, like the old linear scan
+            triggers.setdefault(entry["trigger"], TriggerTemplates(entry))
+        self._triggers = triggers
+
+    def get(self, trigger):
+        return self._triggers.get(trigger)
+
+    def __len__(self):
+        return len(self._triggers)
+
+    def __contains__(self, trigger):
+        return trigger in self._triggers
+
+# Holds the current registry and swaps in a freshly built one whenever templates.json changes
+class TemplateStore:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.registry = None
+        self._mtime = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @timed("templates_load")
+    def load(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, "r", encoding="utf-8") as f:
+            registry = TemplateRegistry(json.load(f))
+        # Readers keep whichever registry they already fetched; new lookups see the new one
+        self.registry = registry
+        self._mtime = mtime
+        logger.info("Loaded %s template triggers from %s", len(registry), self.path)
+        return registry
+
+    def reload_if_changed(self):
+        try:
+            if os.stat(self.path).st_mtime_ns == self._mtime:
+                return False
+            self.load()
+            return True
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error("Failed to reload templates from %s, keeping the previous set: %s", self.path, e)
+            return False
+
+    def _watch(self, interval_seconds):
+        while not self._stop.wait(interval_seconds):
+            self.reload_if_changed()
+
+    def start_watching(self, interval_seconds=5):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, args=(interval_seconds,), name="template-watcher", daemon=True)
+        self._thread.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+template_store = TemplateStore(Path(__file__).parent / "templates.json")
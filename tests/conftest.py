@@ -0,0 +1,6 @@
+import compliment_generator
+import nudge_engine
+
+# The app loads these in its lifespan warm-up; tests call the modules directly, so load them up front
+nudge_engine.load_resources()
+compliment_generator.load_resources()
@@ -0,0 +1,17 @@
+from benchmarks.payloads import generate_payloads
+from benchmarks.run import run_stages
+from compliment_generator import SocialNudgeRequest
+
+def test_payloads_are_seeded_and_valid():
+    """The same seed should give the same payloads, and every payload should validate."""
+    payloads = generate_payloads(20, seed=4, buddies=(1, 3))
+    assert payloads == generate_payloads(20, seed=4, buddies=(1, 3))
+    for payload in payloads:
+        SocialNudgeRequest(**payload)
+        assert 1 <= len(payload["buddies"]) <= 3
+
+def test_run_stages_reports_every_stage():
+    """Each in-process stage should be timed once per payload per pass."""
+    stages = run_stages(generate_payloads(5, seed=1), repeat=2, include_endpoint=False)
+    assert set(stages) >= {"validation", "predict", "identify_compliment_feature", "process_buddies"}
+    assert all(stage["count"] == 10 for stage in stages.values())
@@ -0,0 +1,65 @@
+import csv
+import json
+from benchmarks.payloads import generate_payloads
+from bulk_score import score_file, score_chunk
+from compliment_generator import SocialNudgeRequest, generate_compliment
+from nudge_engine import process_buddies
+
+def write_jsonl(path, payloads):
+    path.write_text("".join(json.dumps(payload) + "\n" for payload in payloads))
+
+def read_results(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+def test_results_match_per_user_scoring(tmp_path):
+    """Bulk results should give each user the same compliment reason and nudged buddies as the request path."""
+    payloads = generate_payloads(30, seed=3)
+    write_jsonl(tmp_path / "users.jsonl", payloads)
+    summary = score_file(tmp_path / "users.jsonl", tmp_path / "out.jsonl", chunk_size=7)
+    assert summary["records_done"] == 30 and summary["invalid"] == 0
+    for payload, result in zip(payloads, read_results(tmp_path / "out.jsonl")):
+        request_data = SocialNudgeRequest(**payload)
+        assert result["user_id"] == payload["user_id"]
+        expected = generate_compliment(request_data)["compliment"]["reason"]
+        # Tuple reasons come back from JSON as lists
+        assert result["compliment"]["reason"] == json.loads(json.dumps(expected))
+        assert [nudge["buddy_id"] for nudge in result["buddy_nudges"]] == [nudge["buddy_id"] for nudge in process_buddies(request_data)[1]]
+
+def test_process_pool_keeps_input_order(tmp_path):
+    """Chunks scored in pool processes should be written in input order."""
+    payloads = generate_payloads(40, seed=5)
+    write_jsonl(tmp_path / "users.jsonl", payloads)
+    score_file(tmp_path / "users.jsonl", tmp_path / "out.jsonl", chunk_size=6, workers=2)
+    assert [result["user_id"] for result in read_results(tmp_path / "out.jsonl")] == [payload["user_id"] for payload in payloads]
+
+def test_flat_csv_rows_and_invalid_records(tmp_path):
+    """CSV rows with flat metric and history columns should score; a row that fails validation is reported, not fatal."""
+    payload = generate_payloads(1, seed=2)[0]
+    metrics, history = payload["social_metrics"], payload["history"]
+    with open(tmp_path / "users.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, ["user_id", "buddies", *metrics, *history])
+        writer.writeheader()
+        writer.writerow({"user_id": payload["user_id"], "buddies": json.dumps(payload["buddies"]), **metrics,
+                         "tags_followed": json.dumps(metrics["tags_followed"]), **history})
+        writer.writerow({"user_id": "broken", "buddies": "[]", "upvotes": "many"})
+    summary = score_file(tmp_path / "users.csv", tmp_path / "out.jsonl")
+    good, bad = read_results(tmp_path / "out.jsonl")
+    assert good["status"] == "generated" and good["user_id"] == payload["user_id"]
+    assert bad["status"] == "invalid" and bad["user_id"] == "broken"
+    assert summary["invalid"] == 1
+
+def test_resume_continues_after_last_checkpoint(tmp_path):
+    """A resumed run should drop output written after the checkpoint and score only the remaining users."""
+    payloads = generate_payloads(25, seed=8)
+    write_jsonl(tmp_path / "users.jsonl", payloads)
+    output = tmp_path / "out.jsonl"
+    checkpoint = tmp_path / "out.jsonl.checkpoint"
+    lines, _ = score_chunk([json.dumps(payload) for payload in payloads[:10]])
+    output.write_text("\n".join(lines) + "\n")
+    checkpoint.write_text(json.dumps({"input": str(tmp_path / "users.jsonl"), "records_done": 10, "invalid": 0, "output_bytes": output.stat().st_size}))
+    with open(output, "a") as f:
+        f.write('{"user_id": "half-written')
+    summary = score_file(tmp_path / "users.jsonl", output, chunk_size=4, resume=True)
+    assert summary["records_scored"] == 15 and summary["records_done"] == 25
+    assert [result["user_id"] for result in read_results(output)] == [payload["user_id"] for payload in payloads]
+    assert score_file(tmp_path / "users.jsonl", output, resume=True)["records_scored"] == 0
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier
+from compact_model import CompactForest, export_model
+
+FEATURES = ["karma_growth", "helpful_answers", "quizzes_attempted", "upvotes", "consecutive_active_days"]
+
+def make_training_data(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({
+        "karma_growth": rng.integers(0, 500, n),
+        "helpful_answers": rng.integers(0, 30, n),
+        "quizzes_attempted": rng.integers(0, 30, n),
+        "upvotes": rng.integers(0, 300, n),
+        "consecutive_active_days": rng.integers(0, 40, n),
+    })
+    y = ((X.karma_growth > 120) & (X.upvotes > 50) | (X.helpful_answers > 20)).astype(int)
+    return X, y
+
+def test_compact_forest_matches_sklearn(tmp_path):
+    """Exported forest should predict exactly like the sklearn model it came from."""
+    X, y = make_training_data()
+    model = RandomForestClassifier(n_estimators=15, random_state=0).fit(X, y)
+    meta = export_model(model, tmp_path)
+    compact = CompactForest.load(tmp_path)
+
+    X_test, _ = make_training_data(n=2000, seed=1)
+    assert meta["n_trees"] == 15
+    assert list(compact.feature_names_in_) == FEATURES
+    assert np.array_equal(compact.predict(X_test.to_numpy()), model.predict(X_test))
+    assert np.allclose(compact.predict_proba(X_test.to_numpy()), model.predict_proba(X_test))
+
+def test_compact_forest_is_memory_mapped(tmp_path):
+    """Loaded arrays should be backed by the files on disk, not private copies."""
+    X, y = make_training_data()
+    export_model(RandomForestClassifier(n_estimators=3, random_state=0).fit(X, y), tmp_path)
+    compact = CompactForest.load(tmp_path)
+    assert isinstance(compact.threshold, np.memmap)
+
+def test_export_single_decision_tree(tmp_path):
+    """A lone decision tree should export as a one-tree ensemble."""
+    X, y = make_training_data()
+    model = DecisionTreeClassifier(max_depth=4, random_state=0).fit(X, y)
+    export_model(model, tmp_path)
+    compact = CompactForest.load(tmp_path)
+    assert np.array_equal(compact.predict(X.to_numpy()), model.predict(X))
+
+def test_export_unsupported_model(tmp_path):
+    """Models without fitted trees should be rejected."""
+    with pytest.raises(ValueError):
+        export_model(object(), tmp_path)
+
+def test_predict_rejects_wrong_feature_count(tmp_path):
+    """Inputs with the wrong number of columns should raise ValueError."""
+    X, y = make_training_data()
+    export_model(RandomForestClassifier(n_estimators=2, random_state=0).fit(X, y), tmp_path)
+    with pytest.raises(ValueError):
+        CompactForest.load(tmp_path).predict(np.zeros((1, 3)))
@@ -10,6 +10,15 @@ from compliment_generator import (
     identify_compliment_feature,
     load_config,
     generate_compliment,
+    generate_compliments_batch,
+    override_prediction_from_values,
+    count_low_features,
+    extract_feature_values,
+    build_feature_matrix,
+    model_input,
+    loaded_model,
+    FEATURE_COLUMNS,
+    compliment_settings,
     update_tags,
     CONFIG_PATH,
     social_metrics,
@@ -171,6 +180,163 @@ def test_generate_compliment():
     result = generate_compliment(request)
     assert "compliment" in result
 
+def test_generate_compliments_batch_matches_single():
+    """Batch scoring should give the same result as scoring each user on its own."""
+    import random
+    requests_data = [
+        SocialNudgeRequest(
+            user_id=f"stu_{i}",
+            buddies=[],
+            social_metrics=social_metrics(
+                karma_growth=i * 37 % 500,
+                helpful_answers=i * 7 % 30,
+                quizzes_attempted=i * 3 % 25,
+                upvotes=i * 29 % 300,
+                consecutive_active_days=i * 5 % 40,
+                profile_completeness=(i * 11) % 100,
+                previous_profile_completeness=(i * 13) % 60,
+                tags_followed=["python"] if i % 2 else []
+            ),
+            history=UserHistory(last_compliment_generated=None)
+        )
+        for i in range(40)
+    ]
+
+    random.seed(7)
+    batch_results = generate_compliments_batch(requests_data)
+    random.seed(7)
+    single_results = [generate_compliment(request_data) for request_data in requests_data]
+
+    assert batch_results == single_results
+    assert generate_compliments_batch([]) == []
+
+def test_fast_path_matches_dataframe_path():
+    """Array/scalar helpers should agree with the DataFrame based helpers."""
+    import random
+    rng = random.Random(3)
+    for _ in range(300):
+        metrics = social_metrics(
+            karma_growth=rng.randint(0, 600),
+            helpful_answers=rng.randint(0, 40),
+            quizzes_attempted=rng.randint(0, 40),
+            upvotes=rng.randint(0, 400),
+            consecutive_active_days=rng.randint(0, 45)
+        )
+        values = extract_feature_values(metrics)
+        df = pd.DataFrame([values], columns=FEATURE_COLUMNS)
+
+        assert loaded_model.predict(model_input(build_feature_matrix([values])))[0] == \
+            loaded_model.predict(df[loaded_model.feature_names_in_])[0]
+        assert override_prediction_from_values(values, 0) == \
+            override_prediction_if_important_feature_high(df, 0)
+
+        feature_averages = compliment_settings.feature_averages
+        low_features = 0
+        if int(df["karma_growth"][0]) < feature_averages["average_karma_growth"] * 0.4:
+            low_features += 1
+        if int(df["helpful_answers"][0]) < feature_averages["average_helpful_answers"] * 0.4:
+            low_features += 1
+        if int(df["quizzes_attempted"][0]) < feature_averages["average_quizzes_attempted"] * 0.4:
+            low_features += 1
+        if int(df["upvotes"][0]) < feature_averages["average_upvotes"] * 0.14:
+            low_features += 1
+        if int(df["consecutive_active_days"][0]) < feature_averages["average_consecutive_active_days"] * 0.3:
+            low_features += 1
+        assert count_low_features(values) == low_features
+
+def test_sklearn_model_is_scored_without_feature_name_warnings(monkeypatch):
+    """A scikit-learn forest fitted on named columns should be scored without a missing-feature-names warning."""
+    import warnings
+    import compliment_generator
+    from benchmarks.stand_in_model import train_stand_in_model
+    monkeypatch.setattr(compliment_generator, "loaded_model", train_stand_in_model(trees=5))
+    rows = [[10, 2, 1, 5, 3], [400, 25, 20, 250, 35]]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        compliment_generator.predict_rows(rows)
+
+def test_predictions_are_served_from_cache():
+    """Repeated feature vectors should be answered from the prediction cache."""
+    import compliment_generator
+    values = {"karma_growth": 123, "helpful_answers": 4, "quizzes_attempted": 5, "upvotes": 67, "consecutive_active_days": 8}
+    expected = loaded_model.predict(model_input(build_feature_matrix([values])))[0]
+    compliment_generator.prediction_cache.clear()
+    hits = compliment_generator.prediction_cache.stats()["hits"]
+    assert compliment_generator.predict_compliments([values, values]) == [expected, expected]
+    assert compliment_generator.predict_compliments([values]) == [expected]
+    assert compliment_generator.prediction_cache.stats()["hits"] == hits + 1
+
+def test_rule_stages_skip_the_model(monkeypatch):
+    """Cooldown and nothing-to-compliment requests should be answered without calling the model."""
+    import compliment_generator
+    def fail(rows):
+        raise AssertionError("model should not be called")
+    monkeypatch.setattr(compliment_generator, "predict_rows_with_truncation", fail)
+    compliment_generator.prediction_cache.clear()
+    recent = datetime.date.today().isoformat()
+    cooling_down = SocialNudgeRequest(
+        user_id="cool", buddies=[],
+        social_metrics=social_metrics(karma_growth=900, upvotes=500, profile_completeness=90, previous_profile_completeness=10),
+        history=UserHistory(last_compliment_generated=recent),
+    )
+    quiet = SocialNudgeRequest(
+        user_id="quiet", buddies=[], social_metrics=social_metrics(), history=UserHistory(last_compliment_generated=None)
+    )
+    for request_data in (cooling_down, quiet):
+        assert generate_compliment(request_data)["compliment"] == {"message": None, "reason": None, "priority": None}
+    assert [result["compliment"]["reason"] for result in generate_compliments_batch([cooling_down, quiet])] == [None, None]
+
+def test_rule_stages_only_settle_prediction_independent_requests():
+    """Whenever a rule stage answers, the rules must give an empty compliment for both predictions."""
+    import random
+    import compliment_generator
+    rng = random.Random(5)
+    today = datetime.date.today()
+    settled = 0
+    for i in range(400):
+        completeness = rng.randint(0, 100)
+        request_data = SocialNudgeRequest(
+            user_id=f"stu_{i}",
+            buddies=[],
+            social_metrics=social_metrics(
+                karma_growth=rng.randint(0, 300),
+                helpful_answers=rng.randint(0, 20),
+                quizzes_attempted=rng.randint(0, 20),
+                upvotes=rng.randint(0, 200),
+                consecutive_active_days=rng.randint(0, 30),
+                profile_completeness=completeness,
+                previous_profile_completeness=max(0, completeness - rng.choice([0, 5, 20, 50])),
+                tags_followed=["python"] if i % 3 else [],
+            ),
+            history=UserHistory(last_compliment_generated=rng.choice([None, "not-a-date", (today - datetime.timedelta(days=rng.randint(0, 20))).isoformat()])),
+        )
+        values = extract_feature_values(request_data.social_metrics)
+        if compliment_generator.decide_without_model(compliment_generator.ComplimentContext(request_data, values)) is None:
+            continue
+        settled += 1
+        for prediction in (0, 1):
+            result = compliment_generator.apply_compliment_rules(request_data, values, prediction)
+            assert result["compliment"] == {"message": None, "reason": None, "priority": None}
+    assert settled > 0
+
+def test_tag_delta_is_applied_to_the_current_index(monkeypatch):
+    """A snapshot produced by a tag delta should get the current index with the changes applied, not a rebuilt one."""
+    import compliment_generator
+    from tag_index import TagIndex, apply_tag_delta
+    base = {"_comment1": "note", "ml": 8, "opencv": 4}
+    monkeypatch.setattr(compliment_generator, "popular_tag_index", TagIndex(base))
+    updated, changed = apply_tag_delta(base, {"ml": 3, "opencv": -4, "rust": 2})
+    monkeypatch.setattr(compliment_generator, "_pending_tag_delta", (base, changed))
+    def rebuild(popular_tags):
+        raise AssertionError("index should not be rebuilt")
+    monkeypatch.setattr(compliment_generator, "TagIndex", rebuild)
+    index = compliment_generator.prepare_tag_index(updated)
+    assert index.source is updated and dict(index.weights) == {"ml": 11, "rust": 2}
+    assert compliment_generator._pending_tag_delta is None
+    monkeypatch.setattr(compliment_generator, "TagIndex", TagIndex)
+    monkeypatch.setattr(compliment_generator, "_pending_tag_delta", (base, changed))
+    assert "go" in compliment_generator.prepare_tag_index(dict(updated, go=1))
+
 #After running the test scripts the popular tags in config get updated by these tags so it is commented
 '''def test_update_tags():
     """Simple test for update_tags with dummy data."""
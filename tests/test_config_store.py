@@ -0,0 +1,113 @@
+import json
+import os
+import pytest
+from config_store import ConfigStore
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"max_nudges_per_user": 3, "popular_tags": {"python": 1}}))
+    return ConfigStore(path)
+
+def touch_later(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+def test_snapshots_are_immutable(store):
+    """Snapshots should reject writes, including to nested mappings."""
+    snapshot = store.snapshot()
+    assert snapshot.version == 1
+    with pytest.raises(TypeError):
+        snapshot.data["max_nudges_per_user"] = 5
+    with pytest.raises(TypeError):
+        snapshot["popular_tags"]["java"] = 2
+
+def test_update_swaps_immediately_and_persists_in_background(store):
+    """update() should publish a new version at once and write it with an atomic rename."""
+    old = store.snapshot()
+    seen = []
+    store.subscribe(seen.append)
+    new = store.update({"popular_tags": {"java": 2}})
+    assert store.current is new and new.version == old.version + 1
+    assert old["popular_tags"] == {"python": 1}
+    assert seen == [new]
+    assert store.flush(timeout=5)
+    assert json.loads(store.path.read_text())["popular_tags"] == {"java": 2}
+    assert not store.path.with_name(f".{store.path.name}.tmp").exists()
+    # Persisting our own write must not look like an external edit
+    assert store.reload_if_changed() is False
+
+def test_reload_picks_up_file_edits(store):
+    """An edited config.json should become the next snapshot version."""
+    store.snapshot()
+    store.path.write_text(json.dumps({"max_nudges_per_user": 5}))
+    touch_later(store.path)
+    assert store.reload_if_changed() is True
+    assert store.current.version == 2
+    assert store.current["max_nudges_per_user"] == 5
+
+def test_invalid_edit_keeps_previous_snapshot(store):
+    """A config.json that fails to parse should leave the current snapshot in place."""
+    snapshot = store.snapshot()
+    store.path.write_text("{not json")
+    touch_later(store.path)
+    assert store.reload_if_changed() is False
+    assert store.current is snapshot
+
+def test_rejected_snapshot_publishes_nothing(store):
+    """A subscriber rejecting a snapshot should keep the current version and every derived value, and later updates should still work."""
+    store.snapshot()
+    published = []
+    def prepare(snapshot):
+        limit = snapshot["max_nudges_per_user"]
+        return lambda: published.append(limit)
+    store.subscribe(prepare)
+    snapshot = store.update({"max_nudges_per_user": 4})
+    assert published == [4]
+    store.path.write_text(json.dumps({"popular_tags": {}}))
+    touch_later(store.path)
+    assert store.reload_if_changed() is False
+    assert store.current is snapshot and published == [4]
+    with pytest.raises(KeyError):
+        store.modify(lambda data: data.pop("max_nudges_per_user"))
+    assert store.current is snapshot
+    assert store.update({"max_nudges_per_user": 6}).version == snapshot.version + 1
+    assert published == [4, 6]
+
+def test_watcher_never_reloads_our_own_write_over_newer_updates(store):
+    """Reload checks racing with background writes should leave the latest update in place."""
+    import threading
+    store.snapshot()
+    # Write after every update so reload checks race with as many renames as possible
+    store.write_delay_seconds = 0
+    stop = threading.Event()
+
+    def watch():
+        while not stop.is_set():
+            store.reload_if_changed()
+
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    try:
+        for number in range(50):
+            store.update({"max_nudges_per_user": number})
+        assert store.flush(timeout=5)
+    finally:
+        stop.set()
+        watcher.join()
+    assert store.current["max_nudges_per_user"] == 49
+    assert json.loads(store.path.read_text())["max_nudges_per_user"] == 49
+
+def test_burst_of_updates_shares_values_and_is_written_once(store):
+    """Updates inside the write delay should be saved by one write, and unchanged settings should be shared, not copied."""
+    store.write_delay_seconds = 0.2
+    written = []
+    persist = store.persist
+    store.persist = lambda snapshot: written.append(snapshot.version) or persist(snapshot)
+    old = store.snapshot()
+    for number in range(20):
+        new = store.update({"max_nudges_per_user": number})
+    assert new.data["popular_tags"] is old.data["popular_tags"]
+    assert store.flush(timeout=5)
+    assert written == [new.version]
+    assert json.loads(store.path.read_text())["max_nudges_per_user"] == 19
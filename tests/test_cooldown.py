@@ -0,0 +1,25 @@
+import datetime
+import compliment_generator
+import nudge_engine
+from cooldown import cooldown_window_end
+
+def test_window_matches_cooldown_checks():
+    """The window should be open exactly when both cooldown checks say the cooldown is active."""
+    today = datetime.date.today()
+    for compliment_age in range(0, 12):
+        for nudge_age in range(0, 6):
+            last_compliment = (today - datetime.timedelta(days=compliment_age)).isoformat()
+            last_nudge = (today - datetime.timedelta(days=nudge_age)).isoformat()
+            both_active = (
+                not compliment_generator.check_compliment_cooldown(last_compliment)
+                and nudge_engine.nudge_cooldown_active("stu", last_nudge)
+            )
+            window_end = cooldown_window_end(
+                last_compliment,
+                last_nudge,
+                compliment_generator.compliment_settings.compliment_cooldown_days,
+                nudge_engine.nudge_settings.nudge_cooldown_days,
+            )
+            assert (window_end is not None) == both_active
+    assert cooldown_window_end(None, today.isoformat(), 7, 3) is None
+    assert cooldown_window_end("bad-date", today.isoformat(), 7, 3) is None
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+from benchmarks.stand_in_model import train_stand_in_model
+from student_model import sample_features
+from compact_model import CompactForest, export_model
+from early_exit import EarlyExitEnsemble
+
+def test_matches_full_forest_with_fewer_trees():
+    """Early exit should give exactly the forest's predictions while skipping trees on clear-cut rows."""
+    forest = train_stand_in_model(seed=0, trees=60)
+    rows = sample_features(list(forest.feature_names_in_), 3000, seed=4)
+    ensemble = EarlyExitEnsemble(forest, chunk_trees=8)
+    predictions, evaluated, cut_off = ensemble.predict_with_counts(rows)
+    assert np.array_equal(predictions, forest.predict(pd.DataFrame(rows, columns=forest.feature_names_in_)))
+    assert cut_off == 0
+    assert evaluated.mean() < 60 and evaluated.max() <= 60
+
+def test_matches_compact_forest(tmp_path):
+    """The compact engine should be evaluated in chunks with the same result as its full predict."""
+    forest = train_stand_in_model(seed=1, trees=30)
+    export_model(forest, tmp_path)
+    compact = CompactForest.load(tmp_path)
+    rows = sample_features(list(forest.feature_names_in_), 2000, seed=5)
+    assert np.array_equal(EarlyExitEnsemble(compact, chunk_trees=5).predict(rows), compact.predict(rows))
+
+def test_time_budget_cuts_off_open_rows():
+    """With an exhausted budget only the first chunk is evaluated and open rows are counted as cut off."""
+    forest = train_stand_in_model(seed=0, trees=40)
+    rows = sample_features(list(forest.feature_names_in_), 200, seed=6)
+    ensemble = EarlyExitEnsemble(forest, chunk_trees=4, time_budget_ms=1e-9)
+    predictions, evaluated, cut_off = ensemble.predict_with_counts(rows)
+    assert evaluated.max() == 4
+    assert cut_off == 200
+    assert len(predictions) == 200
+
+def test_only_averaging_forests_are_supported():
+    """Boosting and bagging ensembles should not be wrapped, since early exit would change their predictions."""
+    from sklearn.ensemble import AdaBoostClassifier, BaggingClassifier, ExtraTreesClassifier, GradientBoostingClassifier
+    forest = train_stand_in_model(seed=0, trees=5)
+    rows = sample_features(list(forest.feature_names_in_), 300, seed=7)
+    labels = forest.predict(pd.DataFrame(rows, columns=forest.feature_names_in_))
+    assert EarlyExitEnsemble.supports(forest)
+    assert EarlyExitEnsemble.supports(ExtraTreesClassifier(n_estimators=5, random_state=0).fit(rows, labels))
+    for model in (
+        AdaBoostClassifier(n_estimators=5, random_state=0),
+        BaggingClassifier(n_estimators=5, max_features=0.5, random_state=0),
+        GradientBoostingClassifier(n_estimators=5, random_state=0),
+    ):
+        assert not EarlyExitEnsemble.supports(model.fit(rows, labels))
+
+def test_truncated_predictions_are_not_cached(monkeypatch):
+    """Rows answered from a partial vote should be returned but left out of the prediction cache."""
+    import compliment_generator
+    forest = train_stand_in_model(seed=0, trees=40)
+    monkeypatch.setattr(compliment_generator, "loaded_model", EarlyExitEnsemble(forest, chunk_trees=4, time_budget_ms=1e-9))
+    monkeypatch.setattr(compliment_generator, "model_feature_order", tuple(forest.feature_names_in_))
+    values = {name: 5 for name in forest.feature_names_in_}
+    compliment_generator.prediction_cache.clear()
+    assert len(compliment_generator.predict_compliments([values])) == 1
+    assert compliment_generator.prediction_cache.stats()["size"] == 0
+    monkeypatch.setattr(compliment_generator, "loaded_model", EarlyExitEnsemble(forest, chunk_trees=4))
+    assert compliment_generator.predict_compliments([values]) == compliment_generator.predict_rows([[5] * len(values)])
+    assert compliment_generator.prediction_cache.stats()["size"] == 1
+    compliment_generator.prediction_cache.clear()
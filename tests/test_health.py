@@ -0,0 +1,55 @@
+import time
+from health import SelfTestRunner, check_config, check_templates_file
+
+def failing_check():
+    raise ValueError("boom")
+
+def test_run_once_records_each_check():
+    """Should record status and detail per check and fail overall if any check fails."""
+    runner = SelfTestRunner({"ok": lambda: "works", "broken": failing_check})
+    results = runner.run_once()
+    assert results["status"] == "fail"
+    assert results["checks"]["ok"]["status"] == "ok"
+    assert results["checks"]["broken"]["detail"] == "error: boom"
+    assert "checked_at" in results
+
+def test_results_are_cached_until_next_run():
+    """Probes should read the cached run instead of re-running the checks."""
+    calls = []
+    runner = SelfTestRunner({"counted": lambda: calls.append(1)})
+    assert runner.results() is None
+    runner.run_once()
+    runner.results()
+    runner.results()
+    assert len(calls) == 1
+    assert runner.results()["status"] == "ok"
+    assert not runner.is_stale(runner.results())
+
+def test_background_thread_runs_checks():
+    """Started runner should produce results without being asked."""
+    runner = SelfTestRunner({"ok": lambda: "works"}, interval_seconds=60)
+    runner.start()
+    try:
+        deadline = time.monotonic() + 5
+        while runner.results() is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert runner.results()["status"] == "ok"
+    finally:
+        runner.stop()
+
+def test_file_checks_pass_on_repo_files():
+    """Config snapshot and templates shipped with the repo should load."""
+    assert check_config() == "loaded"
+    assert check_templates_file() == "loaded"
+
+def test_self_tests_leave_metrics_and_prediction_cache_alone():
+    """Self-test runs should not count as compliments, nudges or stage timings, nor fill the prediction cache."""
+    import compliment_generator
+    from health import default_self_tests
+    from metrics import REGISTRY
+    compliment_generator.prediction_cache.clear()
+    before = REGISTRY.collect()
+    cache_before = compliment_generator.prediction_cache.stats()
+    assert SelfTestRunner(default_self_tests()).run_once()["status"] == "ok"
+    assert REGISTRY.collect() == before
+    assert compliment_generator.prediction_cache.stats() == cache_before
@@ -0,0 +1,52 @@
+import asyncio
+import random
+import pytest
+import compliment_generator
+from compliment_generator import SocialNudgeRequest, UserHistory, social_metrics
+from inference_pool import InferencePool, PoolSaturated, _worker_loaded_own_model
+
+ROWS = [[10, 2, 1, 5, 3], [400, 25, 20, 250, 35], [67, 8, 8, 60, 10]]
+
+@pytest.fixture
+def pool():
+    pool = InferencePool(workers=2)
+    pool.start()
+    yield pool
+    pool.shutdown()
+
+def test_pool_predictions_match_model(pool):
+    """Pool processes should score rows exactly like the in-process model."""
+    expected = [(prediction, False) for prediction in compliment_generator.loaded_model.predict(compliment_generator.model_input(compliment_generator.np.asarray(ROWS))).tolist()]
+    assert asyncio.run(pool.predict(ROWS)) == expected
+    assert pool.in_flight == 0
+
+def test_forkserver_workers_share_the_preloaded_model(pool):
+    """Pool processes forked from the fork server should inherit its model instead of loading their own."""
+    asyncio.run(pool.predict(ROWS))
+    assert pool._executor.submit(_worker_loaded_own_model).result(timeout=30) is False
+
+def test_queue_depth_rejects_extra_requests(pool):
+    """Requests beyond queue_depth should be rejected instead of queued."""
+    pool.queue_depth = 1
+
+    async def run_two():
+        return await asyncio.gather(pool.predict(ROWS), pool.predict(ROWS), return_exceptions=True)
+
+    results = asyncio.run(run_two())
+    assert isinstance(results[1], PoolSaturated)
+    assert not isinstance(results[0], Exception)
+
+def test_generate_compliment_async_matches_sync(pool):
+    """Async path through the pool should give the same compliment as the sync path."""
+    request = SocialNudgeRequest(
+        user_id='stu_1',
+        buddies=[],
+        social_metrics=social_metrics(karma_growth=350, helpful_answers=3, upvotes=180, consecutive_active_days=20),
+        history=UserHistory()
+    )
+    compliment_generator.prediction_cache.clear()
+    random.seed(9)
+    expected = compliment_generator.generate_compliment(request)
+    compliment_generator.prediction_cache.clear()
+    random.seed(9)
+    assert asyncio.run(compliment_generator.generate_compliment_async(request, pool.predict)) == expected
@@ -0,0 +1,46 @@
+import asyncio
+from datetime import date
+import httpx
+from benchmarks.loadtest import build_user_payloads, build_tag_updates, request_stream, run_load, compare_to_baseline
+from compliment_generator import SocialNudgeRequest
+
+def test_user_payloads_follow_the_mix():
+    """Buddy counts should stay inside their buckets, and the cooldown and tag-heavy shares should be close to the rates."""
+    today = date(2026, 1, 15)
+    payloads = build_user_payloads(400, seed=2, buddy_buckets=((0, 2, 50), (20, 30, 50)), cooldown_rate=0.5, tag_heavy_rate=0.25, today=today)
+    assert payloads == build_user_payloads(400, seed=2, buddy_buckets=((0, 2, 50), (20, 30, 50)), cooldown_rate=0.5, tag_heavy_rate=0.25, today=today)
+    assert len({payload["user_id"] for payload in payloads}) == 400
+    for payload in payloads:
+        SocialNudgeRequest(**payload)
+        assert len(payload["buddies"]) <= 2 or 20 <= len(payload["buddies"]) <= 30
+    cooled_down = sum(payload["history"]["last_buddy_nudge"] == today.isoformat() for payload in payloads)
+    tag_heavy = sum(len(payload["social_metrics"]["tags_followed"]) >= 20 for payload in payloads)
+    assert 160 < cooled_down < 240
+    assert 60 < tag_heavy < 140
+
+def test_run_load_records_latencies_and_errors():
+    """Every endpoint should be counted, and error responses should count as errors, not latencies."""
+    def handler(request):
+        return httpx.Response(503 if request.url.path == "/health" else 200, json={})
+
+    requests = request_stream({"nudges": 6, "tags": 1, "health": 3}, build_user_payloads(20, seed=1), build_tag_updates(3), seed=1)
+    summary = asyncio.run(run_load("http://loadtest", requests, rate=0, concurrency=4, duration=0.3, transport=httpx.MockTransport(handler)))
+    endpoints = summary["endpoints"]
+    assert set(endpoints) == {"/generate-social-nudges", "/update-popular-tags", "/health"}
+    assert endpoints["/health"]["errors"] == endpoints["/health"]["requests"] > 0
+    assert endpoints["/generate-social-nudges"]["errors"] == 0
+    assert sum(endpoints["/generate-social-nudges"]["histogram"]["counts"]) == endpoints["/generate-social-nudges"]["requests"]
+    assert summary["overall"]["requests"] == sum(endpoint["requests"] for endpoint in endpoints.values())
+
+def test_compare_to_baseline_flags_regressions():
+    """A slower p99, lower throughput, errors or a different scenario should each fail the run."""
+    def result(p99_ms, throughput_rps, errors=0, rate=100):
+        summary = {"requests": 1000, "errors": errors, "error_rate": errors / 1000, "throughput_rps": throughput_rps, "p99_ms": p99_ms}
+        return {"meta": {"rate": rate, "concurrency": 8}, "overall": summary, "endpoints": {"/health": summary}}
+
+    baseline = result(10.0, 100.0)
+    assert compare_to_baseline(result(11.0, 95.0), baseline) == []
+    assert len(compare_to_baseline(result(13.0, 100.0), baseline)) == 2
+    assert ["throughput" in failure for failure in compare_to_baseline(result(10.0, 80.0), baseline)] == [True]
+    assert compare_to_baseline(result(10.0, 100.0, errors=50), baseline)
+    assert "rate" in compare_to_baseline(result(10.0, 100.0, rate=200), baseline)[0]
@@ -0,0 +1,79 @@
+import io
+import json
+import queue
+import logging
+import pytest
+from logging_pipeline import (
+    SamplingFilter,
+    NonBlockingQueueHandler,
+    setup_logging,
+    configure_logging,
+    stop_logging,
+    request_id_var,
+)
+
+@pytest.fixture
+def log_output():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    stop_logging()
+    stream = io.StringIO()
+    setup_logging("INFO", stream=stream)
+    yield stream
+    stop_logging()
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+def lines(stream):
+    stop_logging()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+def record(message, *args):
+    return logging.LogRecord("test", logging.INFO, __file__, 1, message, args, None)
+
+def test_records_are_written_as_json_with_request_id(log_output):
+    """Each record should become one JSON line with the formatted message, extras and the current request id."""
+    token = request_id_var.set("req-7")
+    try:
+        logging.getLogger("test").info("Scored %s rows", 3, extra={"route": "/generate-social-nudges"})
+    finally:
+        request_id_var.reset(token)
+    logging.getLogger("test").warning("No request")
+    first, second = lines(log_output)
+    assert first["message"] == "Scored 3 rows"
+    assert first["request_id"] == "req-7"
+    assert first["route"] == "/generate-social-nudges"
+    assert first["level"] == "INFO" and first["logger"] == "test"
+    assert "request_id" not in second
+
+def test_config_changes_level_and_sampling(log_output):
+    """configure_logging should apply the level and sample rates from a config snapshot."""
+    configure_logging({"log_level": "WARNING", "log_sample_rates": {"Noisy %s": 0.0}, "log_rate_limits_per_second": {}})
+    logging.getLogger("test").info("Dropped by level")
+    logging.getLogger("test").warning("Noisy %s", 1)
+    logging.getLogger("test").warning("Kept")
+    assert [line["message"] for line in lines(log_output)] == ["Kept"]
+
+def test_sampling_matches_template_and_marks_rate():
+    """Sampled templates should keep about the configured fraction and record the rate on kept records."""
+    sampler = SamplingFilter(sample_rates={"Processing buddies for user: %s": 0.1}, rate_limits={})
+    kept = [r for r in (record("Processing buddies for user: %s", i) for i in range(5000)) if sampler.filter(r)]
+    assert 300 < len(kept) < 700
+    assert all(r.sample_rate == 0.1 for r in kept)
+    assert sampler.filter(record("Other message %s", 1))
+
+def test_rate_limit_caps_per_second():
+    """A rate-limited template should pass at most its limit within one second."""
+    sampler = SamplingFilter(sample_rates={}, rate_limits={"Cooldown for %s": 3})
+    passed = sum(sampler.filter(record("Cooldown for %s", i)) for i in range(10))
+    assert passed == 3
+    assert sampler.dropped == 7
+
+def test_full_queue_drops_instead_of_blocking():
+    """Enqueueing onto a full queue should drop the record and count it."""
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(record("first"))
+    handler.handle(record("second"))
+    assert handler.dropped == 1
+    assert handler.queue.get_nowait().msg == "first"
@@ -0,0 +1,18 @@
+import json
+from fastapi.testclient import TestClient
+import main
+
+def post_stream(lines):
+    main.warm_up.run()
+    body = "\n".join(json.dumps(line) for line in lines)
+    return TestClient(main.app).post("/generate-social-nudges/stream", content=body)
+
+def test_stream_rejects_null_buddy_fields():
+    """A buddy line with a null field should get the per-line 422, not fail while scoring."""
+    header = {"user_id": "stu_1", "history": {"last_buddy_nudge": None}}
+    buddy = {"buddy_id": "stu_2", "last_interaction_days": 12, "messages_sent": 2, "karma_change_7d": -13, "quizzes_attempted": 1}
+    assert post_stream([header, buddy]).status_code == 200
+    for field in ("buddy_id", "last_interaction_days"):
+        response = post_stream([header, buddy, {**buddy, field: None}])
+        assert response.status_code == 422
+        assert response.json()["detail"]["line"] == 3
@@ -0,0 +1,18 @@
+import os
+import pytest
+from memory_stats import process_memory, memory_report
+
+pytestmark = pytest.mark.skipif(not os.path.exists("/proc/self/smaps_rollup"), reason="needs Linux /proc")
+
+def test_process_memory_current_process():
+    """Should report memory for the calling process."""
+    usage = process_memory()
+    assert usage["pid"] == os.getpid()
+    assert usage["rss_mb"] > 0
+    assert usage["unique_mb"] <= usage["rss_mb"]
+
+def test_memory_report_skips_exited_processes():
+    """Processes that are gone should be left out of the report."""
+    report = memory_report([os.getpid(), 2 ** 22 + 1])
+    assert [p["pid"] for p in report["processes"]] == [os.getpid()]
+    assert report["total_unique_mb"] == report["processes"][0]["unique_mb"]
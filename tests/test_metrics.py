@@ -0,0 +1,59 @@
+import os
+from metrics import MetricsRegistry, Counter, Gauge, HistogramFamily, MultiProcessExporter, merge_collections, render_prometheus
+
+def make_registry():
+    registry = MetricsRegistry()
+    counter = Counter("test_events_total", "Events", ["kind"], registry=registry)
+    gauge = Gauge("test_in_flight", "In flight", registry=registry)
+    histogram = HistogramFamily("test_seconds", "Latency", ["stage"], buckets=(0.1, 1), registry=registry)
+    return registry, counter, gauge, histogram
+
+def test_render_prometheus_text():
+    """Counters, gauges and cumulative histogram buckets should render in the text format."""
+    registry, counter, gauge, histogram = make_registry()
+    counter.labels("nudge").inc(2)
+    gauge.labels().inc()
+    histogram.labels("predict").observe(0.05)
+    histogram.labels("predict").observe(0.5)
+    text = render_prometheus(merge_collections([(os.getpid(), registry.collect())]))
+    assert "# TYPE test_events_total counter" in text
+    assert 'test_events_total{kind="nudge"} 2' in text
+    assert "test_in_flight 1" in text
+    assert 'test_seconds_bucket{stage="predict",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{stage="predict",le="1"} 2' in text
+    assert 'test_seconds_bucket{stage="predict",le="+Inf"} 2' in text
+    assert 'test_seconds_count{stage="predict"} 2' in text
+
+def test_merge_sums_workers_and_drops_gauges_of_dead_ones():
+    """Counters and histograms should add up across processes; gauges only count live processes."""
+    registry, counter, gauge, histogram = make_registry()
+    counter.labels("nudge").inc(3)
+    gauge.labels().set(4)
+    histogram.labels("predict").observe(0.5)
+    collection = registry.collect()
+    dead_pid = 2 ** 22 + 12345
+    merged = merge_collections([(os.getpid(), collection), (dead_pid, collection)])
+    assert merged["test_events_total"]["samples"][("nudge",)] == 6
+    assert merged["test_in_flight"]["samples"][()] == 4
+    assert merged["test_seconds"]["samples"][("predict",)]["count"] == 2
+
+def test_exporter_reads_other_workers_files(tmp_path):
+    """render() should include metrics written by other processes to the shared directory."""
+    registry, counter, _, _ = make_registry()
+    counter.labels("compliment").inc()
+    MultiProcessExporter(tmp_path, registry).write()
+    os.rename(tmp_path / f"{os.getpid()}.json", tmp_path / "1.json")
+    counter.labels("compliment").inc()
+    text = MultiProcessExporter(tmp_path, registry).render()
+    assert 'test_events_total{kind="compliment"} 3' in text
+
+def test_registry_reset_keeps_children_usable():
+    """reset() should zero values without invalidating children held by callers."""
+    registry, counter, _, histogram = make_registry()
+    child = counter.labels("nudge")
+    child.inc(5)
+    histogram.labels("predict").observe(0.5)
+    registry.reset()
+    child.inc()
+    assert counter.labels("nudge").raw() == 1
+    assert histogram.labels("predict").raw()["count"] == 0
@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+from metrics import Histogram
+from micro_batcher import MicroBatcher
+
+class RecordingPredictor:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, rows):
+        self.calls.append(list(rows))
+        return [sum(row) for row in rows]
+
+def test_concurrent_requests_share_one_predict_call():
+    """Rows from concurrent requests should be scored together and routed back to each caller."""
+    predictor = RecordingPredictor()
+    batcher = MicroBatcher(predictor, max_rows=64, max_wait_ms=5)
+
+    async def run():
+        return await asyncio.gather(*(batcher.predict([[i, i]]) for i in range(5)))
+
+    assert asyncio.run(run()) == [[0], [2], [4], [6], [8]]
+    assert len(predictor.calls) == 1
+    assert batcher.batch_size.snapshot()["sum"] == 5
+    assert batcher.queue_wait_ms.snapshot()["count"] == 5
+
+def test_full_batch_is_sent_without_waiting():
+    """Reaching max_rows should flush immediately and start a new batch."""
+    predictor = RecordingPredictor()
+    batcher = MicroBatcher(predictor, max_rows=2, max_wait_ms=1000)
+
+    async def run():
+        return await asyncio.wait_for(asyncio.gather(*(batcher.predict([[i]]) for i in range(4))), timeout=1)
+
+    assert asyncio.run(run()) == [[0], [1], [2], [3]]
+    assert predictor.calls == [[[0], [1]], [[2], [3]]]
+
+def test_predict_errors_reach_every_request_in_the_batch():
+    """A failing predict call should raise in each request that was batched into it."""
+    async def failing(rows):
+        raise RuntimeError("model unavailable")
+    batcher = MicroBatcher(failing, max_rows=64, max_wait_ms=1)
+
+    async def run():
+        return await asyncio.gather(batcher.predict([[1]]), batcher.predict([[2]]), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(run()))
+
+def test_histogram_buckets_are_cumulative():
+    """Each bucket should count values up to and including its bound."""
+    histogram = Histogram((1, 5, 10))
+    for value in (0.5, 1, 3, 7, 50):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"1": 2, "5": 3, "10": 4, "+Inf": 5}
+    assert snapshot["count"] == 5
+    assert snapshot["sum"] == pytest.approx(61.5)
@@ -6,6 +6,9 @@ from nudge_engine import (
     nudge_generator,
     determine_priority,
     process_buddies,
+    process_buddies_vectorized,
+    top_k_indices,
+    StreamingBuddySelector,
     Buddy,
     BuddyPayload,
     History,
@@ -101,7 +104,7 @@ def test_process_buddies_max_nudge():
         history=None
     )
     user, processed = process_buddies(buddy_payload)
-    assert len(processed) <= nudge_engine.max_nudges
+    assert len(processed) <= nudge_engine.nudge_settings.max_nudges
 
 def test_process_buddies_invalid_history():
     """Should  handle invalid last buddy nudge format.""" 
@@ -135,3 +138,88 @@ def test_process_buddies_no_reasons():
     )
     user, processed = process_buddies(buddy_payload)
     assert processed == []
+
+def test_process_buddies_keeps_most_inactive():
+    """Should keep the buddies with the highest inactivity scores, highest first."""
+    buddies = [
+        Buddy(buddy_id=f'stu_{i}', last_interaction_days=8 + i, messages_sent=0, karma_change_7d=-20, quizzes_attempted=0)
+        for i in range(10)
+    ]
+    buddy_payload = BuddyPayload(user_id='stu_1000', buddies=buddies, history=None)
+    user, processed = process_buddies(buddy_payload)
+    expected = [f'stu_{i}' for i in range(9, 9 - nudge_engine.nudge_settings.max_nudges, -1)]
+    assert [buddy["buddy_id"] for buddy in processed] == expected
+
+def test_top_k_indices_matches_stable_sort():
+    """Should pick the same indices, in the same order, as a stable descending sort."""
+    import numpy as np
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        scores = rng.integers(-5, 5, rng.integers(1, 30)).astype(float)
+        k = int(rng.integers(0, 35))
+        expected = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
+        assert top_k_indices(scores, k).tolist() == expected
+
+def test_process_buddies_vectorized_matches_loop(monkeypatch):
+    """Vectorized engine should select and score buddies exactly like the loop."""
+    import random
+    monkeypatch.setattr(nudge_engine, "nudge_settings", nudge_engine.nudge_settings._replace(vectorized_buddy_threshold=10 ** 9))
+    rng = random.Random(1)
+    for size in (0, 1, 2, 5, 50, 300):
+        buddies = [
+            Buddy(
+                buddy_id=f'stu_{i}',
+                last_interaction_days=rng.randint(0, 20),
+                messages_sent=rng.randint(0, 5),
+                karma_change_7d=rng.randint(-30, 30),
+                quizzes_attempted=rng.randint(0, 3)
+            )
+            for i in range(size)
+        ]
+        buddy_payload = BuddyPayload(user_id='stu_1000', buddies=buddies, history=None)
+        fields = ("buddy_id", "reason", "priority", "inactivity_score")
+        loop_result = [tuple(b[f] for f in fields) for b in process_buddies(buddy_payload)[1]]
+        vector_result = [tuple(b[f] for f in fields) for b in process_buddies_vectorized(buddy_payload)[1]]
+        assert vector_result == loop_result
+
+def test_streaming_selector_matches_process_buddies(monkeypatch):
+    """Streaming heap selection should keep the same buddies in the same order as process_buddies."""
+    import random
+    rng = random.Random(2)
+    monkeypatch.setattr(nudge_engine, "nudge_settings", nudge_engine.nudge_settings._replace(vectorized_buddy_threshold=10 ** 9))
+    for size in (0, 1, 2, 3, 40, 500):
+        buddies = [
+            Buddy(
+                buddy_id=f'stu_{i}',
+                last_interaction_days=rng.randint(0, 20),
+                messages_sent=rng.randint(0, 5),
+                karma_change_7d=rng.randint(-30, 30),
+                quizzes_attempted=rng.randint(0, 3)
+            )
+            for i in range(size)
+        ]
+        selector = StreamingBuddySelector()
+        for buddy in buddies:
+            selector.add(buddy)
+        fields = ("buddy_id", "reason", "priority", "inactivity_score")
+        expected = [tuple(b[f] for f in fields) for b in process_buddies(BuddyPayload(user_id='stu_1000', buddies=buddies, history=None))[1]]
+        assert [tuple(b[f] for f in fields) for b in selector.results()] == expected
+        assert selector.received == size
+        assert len(selector._heap) <= nudge_engine.nudge_settings.max_nudges
+
+def test_social_nudge_request_goes_to_process_buddies_as_is():
+    """A validated SocialNudgeRequest should be a BuddyPayload and give the same nudges as a re-validated one."""
+    import random
+    from compliment_generator import SocialNudgeRequest
+    from health import SELF_TEST_PAYLOAD
+    request = SocialNudgeRequest(**SELF_TEST_PAYLOAD)
+    assert isinstance(request, BuddyPayload)
+    random.seed(5)
+    direct = process_buddies(request)
+    random.seed(5)
+    revalidated = process_buddies(BuddyPayload(
+        user_id=request.user_id,
+        buddies=[buddy.model_dump() for buddy in request.buddies],
+        history=request.history.model_dump(),
+    ))
+    assert direct == revalidated
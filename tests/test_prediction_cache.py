@@ -0,0 +1,39 @@
+from prediction_cache import PredictionCache
+
+def test_hit_and_miss_counters():
+    """Should count misses for unseen keys and hits for cached ones."""
+    cache = PredictionCache(maxsize=2)
+    assert cache.get((1, 2, 3, 4, 5)) is None
+    cache.put((1, 2, 3, 4, 5), 1)
+    assert cache.get((1, 2, 3, 4, 5)) == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+
+def test_least_recently_used_is_evicted():
+    """The entry used longest ago should be evicted first."""
+    cache = PredictionCache(maxsize=2)
+    cache.put("a", 0)
+    cache.put("b", 1)
+    cache.get("a")
+    cache.put("c", 1)
+    assert cache.get("b") is None
+    assert cache.get("a") == 0
+    assert cache.stats()["evictions"] == 1
+
+def test_zero_size_disables_caching():
+    """maxsize 0 should never store anything."""
+    cache = PredictionCache(maxsize=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+def test_resize_and_clear():
+    """Shrinking should evict down to the new size and clear should empty the cache."""
+    cache = PredictionCache(maxsize=3)
+    for key in "abc":
+        cache.put(key, 1)
+    cache.resize(1)
+    assert cache.stats()["size"] == 1
+    assert cache.get("c") == 1
+    cache.clear()
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,46 @@
+import json
+import random
+from profiling import RequestProfiler, safe_request_id
+
+def work(n):
+    return sum(i * i for i in range(n))
+
+def test_header_triggers_profile_and_writes_files(tmp_path):
+    """A profiled call should return the function's result and write .pstats plus a JSON summary."""
+    profiler = RequestProfiler(directory=tmp_path, max_profiles=5, allow_header=True)
+    headers = {"x-profile": "1", "x-request-id": "req-42"}
+    assert profiler.wants_profile(headers)
+    result, request_id = profiler.run(headers, "/test", work, 1000)
+    assert result == work(1000)
+    assert request_id == "req-42"
+    summary = json.loads(next(tmp_path.glob("*-req-42.json")).read_text())
+    assert summary["route"] == "/test"
+    assert (tmp_path / summary["pstats"]).exists()
+
+def test_cap_stops_profiling(tmp_path):
+    """No more profiles should be taken or written once max_profiles is reached."""
+    profiler = RequestProfiler(directory=tmp_path, max_profiles=1, allow_header=True)
+    headers = {"x-profile": "1"}
+    profiler.run(headers, "/test", work, 10)
+    assert not profiler.wants_profile(headers)
+    profiler.run(headers, "/test", work, 10)
+    assert len(list(tmp_path.glob("*.pstats"))) == 1
+
+def test_sampling_does_not_disturb_global_random(tmp_path):
+    """Sampling decisions should not consume values from the module-level random generator."""
+    profiler = RequestProfiler(directory=tmp_path, sample_rate=0.5, allow_header=False)
+    random.seed(7)
+    expected = random.random()
+    random.seed(7)
+    for _ in range(10):
+        profiler.wants_profile({"x-profile": "1"})
+    assert random.random() == expected
+
+def test_request_id_is_made_filename_safe():
+    """Request ids from headers should be stripped to safe characters, or generated when empty."""
+    assert safe_request_id("../../etc/passwd") == "....etcpasswd"
+    assert len(safe_request_id("")) == 32
+
+def test_header_is_ignored_by_default(tmp_path):
+    """Without allow_header an X-Profile header from a client should not start a profile."""
+    assert not RequestProfiler(directory=tmp_path).wants_profile({"x-profile": "1"})
@@ -0,0 +1,75 @@
+import time
+import asyncio
+from startup import WarmUp
+
+def failing_phase():
+    raise RuntimeError("model missing")
+
+def test_run_records_phase_timings():
+    """Should run phases in order, time each one and become ready."""
+    calls = []
+    warm_up = WarmUp([("first", lambda: calls.append("first")), ("second", lambda: calls.append("second"))])
+    assert not warm_up.is_ready()
+    assert warm_up.run()
+    assert calls == ["first", "second"]
+    assert warm_up.is_ready()
+    report = warm_up.report()
+    assert report["state"] == "ready"
+    assert set(report["phases_ms"]) == {"first", "second", "total"}
+
+def test_run_is_idempotent():
+    """A second run after success should not repeat the phases."""
+    calls = []
+    warm_up = WarmUp([("only", lambda: calls.append(1))])
+    warm_up.run()
+    warm_up.run()
+    assert calls == [1]
+
+def test_failed_phase_keeps_service_unready():
+    """A failing phase should stop warm-up and report the error."""
+    warm_up = WarmUp([("model", failing_phase), ("never", lambda: None)])
+    assert not warm_up.run()
+    assert warm_up.state == "failed"
+    assert "model missing" in warm_up.error
+    assert "never" not in warm_up.phase_timings_ms
+    assert not warm_up.wait(timeout=0.01)
+
+def test_start_runs_in_background_and_calls_on_ready():
+    """start should warm up on a thread and call on_ready when done."""
+    ready_calls = []
+    warm_up = WarmUp([("quick", lambda: None)])
+    warm_up.start(on_ready=lambda: ready_calls.append(True)).join(timeout=5)
+    assert warm_up.wait(timeout=1)
+    assert ready_calls == [True]
+
+def test_start_retries_failed_warm_up():
+    """A phase that fails once should be retried, and the warm-up should still become ready."""
+    failures = [RuntimeError("config not mounted yet")]
+
+    def flaky_phase():
+        if failures:
+            raise failures.pop()
+
+    warm_up = WarmUp([("config", flaky_phase)])
+    warm_up.start(retry_delay_seconds=0.01).join(timeout=5)
+    assert warm_up.is_ready()
+    assert warm_up.attempts == 2 and not warm_up.gave_up
+
+def test_start_gives_up_after_max_attempts():
+    """A warm-up that keeps failing should stop after max_attempts and say so."""
+    warm_up = WarmUp([("model", failing_phase)])
+    warm_up.start(max_attempts=3, retry_delay_seconds=0.01).join(timeout=5)
+    assert warm_up.gave_up and warm_up.attempts == 3
+    assert warm_up.report()["state"] == "failed"
+
+def test_wait_async_is_released_when_ready():
+    """wait_async should return True once another thread finishes the warm-up, and False on timeout."""
+    warm_up = WarmUp([("slow", lambda: time.sleep(0.05))])
+
+    async def wait_for_warm_up():
+        assert not await warm_up.wait_async(timeout=0.01)
+        thread = warm_up.start()
+        assert await warm_up.wait_async(timeout=5)
+        thread.join(timeout=5)
+
+    asyncio.run(wait_for_warm_up())
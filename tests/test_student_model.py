@@ -0,0 +1,38 @@
+import pickle
+import numpy as np
+import pandas as pd
+from benchmarks.stand_in_model import train_stand_in_model
+from student_model import StudentModel, sample_features, distill, parity_report
+from compliment_generator import load_compliment_model
+
+def test_student_agrees_with_teacher():
+    """A distilled tree should mostly reproduce the teacher and the report should count every held-out row."""
+    teacher = train_stand_in_model(seed=0, trees=20)
+    names = list(teacher.feature_names_in_)
+    tree = distill(teacher, sample_features(names, 20000, seed=0), max_depth=8)
+    report = parity_report(teacher, tree, sample_features(names, 5000, seed=1))
+    assert report["agreement"] > 0.95
+    assert sum(sum(row.values()) for row in report["confusion"].values()) == 5000
+    assert report["student"]["pickle_bytes"] < report["teacher"]["pickle_bytes"]
+
+def test_unsure_rows_fall_back_to_teacher():
+    """With min_confidence above every leaf purity, every row should be scored by the teacher."""
+    teacher = train_stand_in_model(seed=0, trees=20)
+    names = list(teacher.feature_names_in_)
+    rows = sample_features(names, 500, seed=2)
+    tree = distill(teacher, sample_features(names, 2000, seed=0), max_depth=2)
+    student = StudentModel(tree, teacher, min_confidence=1.01)
+    assert np.array_equal(student.predict(rows), teacher.predict(pd.DataFrame(rows, columns=names)))
+    assert student.deferred_rows == 500
+
+def test_student_engine_loads_and_falls_back(tmp_path):
+    """The student engine should load the pickled tree, and serve the full model when the tree file is missing."""
+    teacher = train_stand_in_model(seed=0, trees=5)
+    tree = distill(teacher, sample_features(list(teacher.feature_names_in_), 2000, seed=0))
+    (tmp_path / "teacher.pkl").write_bytes(pickle.dumps(teacher))
+    (tmp_path / "student.pkl").write_bytes(pickle.dumps(tree))
+    student = load_compliment_model("student", tmp_path / "teacher.pkl", student_model_path=tmp_path / "student.pkl")
+    assert isinstance(student, StudentModel) and student.teacher is None
+    fallback = load_compliment_model("student", tmp_path / "teacher.pkl", student_model_path=tmp_path / "missing.pkl")
+    assert list(fallback.feature_names_in_) == list(teacher.feature_names_in_)
+    assert not isinstance(fallback, StudentModel)
@@ -0,0 +1,45 @@
+import random
+from tag_index import TagIndex, apply_tag_delta
+
+def test_best_matches_max_by_weight():
+    """best() should pick the same tag as max() over the followed tags, including ties."""
+    rng = random.Random(3)
+    popular = {f"tag{i}": rng.randint(1, 20) for i in range(200)}
+    index = TagIndex(popular)
+    for _ in range(200):
+        followed = [f"tag{rng.randint(0, 400)}" for _ in range(rng.randint(0, 8))]
+        matched = [tag for tag in followed if tag in popular]
+        expected = max(matched, key=lambda t: popular[t]) if matched else None
+        assert index.matched(followed) == matched
+        assert index.best(followed) == expected
+
+def test_non_numeric_entries_are_not_tags():
+    """Comment entries in popular_tags should be ignored by the index."""
+    index = TagIndex({"_comment1": "note", "python": 3})
+    assert "_comment1" not in index
+    assert len(index) == 1
+
+def test_apply_tag_delta():
+    """Increments, decrements to zero and expiry should each be reported as changes."""
+    updated, changed = apply_tag_delta(
+        {"_comment1": "note", "ml": 8, "opencv": 4, "AR VR": 2},
+        increments={"ml": 3, "opencv": -4, "rust": 2},
+        expire=["AR VR", "missing"],
+    )
+    assert updated == {"_comment1": "note", "ml": 11, "rust": 2}
+    assert changed == {"ml": 11, "opencv": None, "rust": 2, "AR VR": None}
+
+def test_with_delta_matches_a_rebuilt_index():
+    """Applying a delta's changes to an index should give the same weights and picks as building one from the result."""
+    rng = random.Random(4)
+    popular = {"_comment1": "note", **{f"tag{i}": rng.randint(1, 20) for i in range(100)}}
+    index = TagIndex(popular)
+    for _ in range(50):
+        increments = {f"tag{rng.randint(0, 150)}": rng.randint(-20, 20) for _ in range(5)}
+        expire = [f"tag{rng.randint(0, 150)}" for _ in range(2)]
+        updated, changed = apply_tag_delta(popular, increments, expire)
+        index, popular = index.with_delta(changed, updated), updated
+        rebuilt = TagIndex(updated)
+        assert dict(index.weights) == dict(rebuilt.weights) and index.top_weight == rebuilt.top_weight
+        followed = [f"tag{rng.randint(0, 150)}" for _ in range(6)]
+        assert index.best(followed) == rebuilt.best(followed)
@@ -0,0 +1,66 @@
+import json
+import os
+import random
+from pathlib import Path
+from template_registry import CompiledTemplate, TemplateRegistry, TemplateStore, template_store
+from nudge_engine import nudge_generator
+from compliment_generator import compliment_generator
+
+TEMPLATES_PATH = Path(__file__).parent.parent / "templates.json"
+
+def test_compiled_template_matches_str_replace():
+    """Rendering should give the same text as str.replace."""
+    text = "Hey {buddy_id}, {buddy_id} is missed!"
+    assert CompiledTemplate(text).render("{buddy_id}", "stu_1") == text.replace("{buddy_id}", "stu_1")
+    assert CompiledTemplate("No placeholder").render("{tag}", "python") == "No placeholder"
+
+def test_first_duplicate_trigger_wins():
+    """Duplicated triggers should resolve to the first entry like the old linear scan."""
+    registry = TemplateRegistry([
+        {"trigger": "karma_drop", "template": ["first"]},
+        {"trigger": "karma_drop", "template": ["second"]},
+    ])
+    assert registry.get("karma_drop").render("{buddy_id}", "x") == "first"
+    assert registry.get("missing") is None
+
+def test_generators_match_linear_scan():
+    """Registry based rendering should match the old scan-and-replace for every trigger."""
+    with open(TEMPLATES_PATH, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    for entry in entries:
+        trigger = entry["trigger"]
+        random.seed(11)
+        nudge = random.choice(entry["template"]).replace("{buddy_id}", "stu_42")
+        random.seed(11)
+        assert nudge_generator(trigger, "stu_42") == nudge
+
+        random.seed(5)
+        compliment = random.choice(entry["template"])
+        if trigger == "helpful_answers":
+            compliment = compliment.replace("{tag}", "python")
+        compliment = f"{compliment} {random.choice(entry.get('emojis', ['✨']))}"
+        random.seed(5)
+        assert compliment_generator(trigger, "python") == compliment
+
+def test_store_reloads_when_file_changes(tmp_path):
+    """The store should swap in a new registry after the file changes and keep the old one on bad JSON."""
+    path = tmp_path / "templates.json"
+    path.write_text(json.dumps([{"trigger": "a", "template": ["one"]}]))
+    store = TemplateStore(path)
+    first = store.load()
+    assert not store.reload_if_changed()
+
+    path.write_text(json.dumps([{"trigger": "b", "template": ["two"]}]))
+    os.utime(path, ns=(1, 1))
+    assert store.reload_if_changed()
+    assert "b" in store.registry and "a" in first
+
+    path.write_text("not json")
+    os.utime(path, ns=(2, 2))
+    assert not store.reload_if_changed()
+    assert "b" in store.registry
+
+def test_shared_store_is_loaded():
+    """The app-wide store should be populated once resources are loaded."""
+    assert template_store.registry is not None
+    assert "helpful_answers" in template_store.registry